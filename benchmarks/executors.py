@@ -0,0 +1,67 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from yt_chapter_extractor.executors import (
+    create_executor,
+    resolve_executor_kind,
+)
+from yt_chapter_extractor.measure import measure_files
+
+from .fixtures import generate_library
+
+
+def run(paths: list[Path], kind: str, workers: int) -> dict:
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+
+    with create_executor(kind, workers, uses_numpy=True) as pool:
+        results = [
+            r
+            for batch in pool.map(
+                measure_files, ["native"] * len(paths), [(p,) for p in paths]
+            )
+            for r in batch
+        ]
+
+    return {
+        "kind": kind,
+        "resolved": resolve_executor_kind(kind, uses_numpy=True),
+        "workers": workers,
+        "files": len(paths),
+        "errors": sum(1 for r in results if r.lufs is None),
+        "wall_s": round(time.perf_counter() - started, 3),
+        "parent_cpu_s": round(time.process_time() - cpu_started, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare executor kinds on the native loudness meter."
+    )
+    parser.add_argument("--files", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=60.0)
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 4, 8))
+    parser.add_argument("--fixtures", type=Path, default=None)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    # The meter needs NumPy, which subinterpreters cannot load.
+    kinds = ["thread", "process"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = args.fixtures or Path(tmp)
+        paths = generate_library(fixtures, [args.seconds] * args.files)
+        results = [run(paths, kind, args.workers) for kind in kinds]
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import subprocess
+from pathlib import Path
+
+# Synthetic audio generated locally with ffmpeg's lavfi sources, so the
+# benchmarks need neither network access nor checked-in media.
+
+_SOURCES = {
+    "sine": "sine=frequency={freq}:duration={seconds}",
+    "noise": "anoisesrc=color=pink:amplitude=0.3:duration={seconds}",
+}
+
+
+def generate_mp3(
+    path: Path,
+    seconds: float,
+    kind: str = "noise",
+    freq: int = 440,
+    volume: float = 1.0,
+) -> Path:
+    source = _SOURCES[kind].format(seconds=seconds, freq=freq)
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-loglevel", "error",
+        "-f", "lavfi",
+        "-i", source,
+        "-af", f"volume={volume}",
+        "-ac", "2",
+        "-codec:a", "libmp3lame",
+        "-q:a", "4",
+        str(path),
+    ]
+    subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+    return path
+
+
+def generate_library(
+    dir_path: Path,
+    durations: list[float],
+    kind: str = "noise",
+) -> list[Path]:
+    dir_path.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, seconds in enumerate(durations):
+        path = dir_path / f"track_{i:04d}.mp3"
+        if not path.exists():
+            # Spread levels so loudness values differ between files.
+            generate_mp3(path, seconds, kind, volume=0.2 + 0.8 * (i % 5) / 4)
+        paths.append(path)
+    return paths
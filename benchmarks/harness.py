@@ -0,0 +1,101 @@
+import resource
+import subprocess
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+
+
+@dataclass(frozen=True)
+class BenchResult:
+    name: str
+    repeat: int
+    wall_s: float
+    cpu_self_s: float
+    cpu_children_s: float
+    peak_rss_self_kib: int
+    peak_rss_children_kib: int
+    subprocesses: int
+    params: dict
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+_spawn_lock = threading.Lock()
+_spawn_count = 0
+_original_popen_init = subprocess.Popen.__init__
+
+
+def _counting_popen_init(self, *args, **kwargs) -> None:
+    global _spawn_count
+    with _spawn_lock:
+        _spawn_count += 1
+    _original_popen_init(self, *args, **kwargs)
+
+
+# Every ffmpeg and yt-dlp child goes through subprocess.Popen (asyncio's
+# subprocess transport included), so counting constructor calls counts
+# spawned processes.
+@contextmanager
+def count_subprocesses() -> Iterator[Callable[[], int]]:
+    start = _spawn_count
+    subprocess.Popen.__init__ = _counting_popen_init
+    try:
+        yield lambda: _spawn_count - start
+    finally:
+        subprocess.Popen.__init__ = _original_popen_init
+
+
+def _cpu_seconds(usage: resource.struct_rusage) -> float:
+    return usage.ru_utime + usage.ru_stime
+
+
+def bench(
+    name: str,
+    func: Callable[[], object],
+    repeat: int = 1,
+    setup: Callable[[], object] | None = None,
+    **params,
+) -> BenchResult:
+    wall = 0.0
+    cpu_self = 0.0
+    cpu_children = 0.0
+
+    with count_subprocesses() as spawned:
+        for _ in range(repeat):
+            if setup is not None:
+                setup()
+
+            self_before = resource.getrusage(resource.RUSAGE_SELF)
+            children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+            started = time.perf_counter()
+
+            func()
+
+            wall += time.perf_counter() - started
+            self_after = resource.getrusage(resource.RUSAGE_SELF)
+            children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            cpu_self += _cpu_seconds(self_after) - _cpu_seconds(self_before)
+            cpu_children += (
+                _cpu_seconds(children_after) - _cpu_seconds(children_before)
+            )
+
+        subprocesses = spawned()
+
+    # ru_maxrss is a high-water mark for the whole process lifetime (KiB on
+    # Linux), so it is only comparable between runs of the same suite.
+    return BenchResult(
+        name=name,
+        repeat=repeat,
+        wall_s=round(wall / repeat, 4),
+        cpu_self_s=round(cpu_self / repeat, 4),
+        cpu_children_s=round(cpu_children / repeat, 4),
+        peak_rss_self_kib=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        peak_rss_children_kib=resource.getrusage(
+            resource.RUSAGE_CHILDREN
+        ).ru_maxrss,
+        subprocesses=subprocesses // repeat,
+        params=params,
+    )
@@ -0,0 +1,265 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from textual.app import App
+from textual.widgets import Button
+
+from yt_chapter_extractor.audio import (
+    extract_chapter_audio,
+    measure_loudness,
+    normalize_audio,
+    process_track,
+)
+from yt_chapter_extractor.measure import measure_files
+from yt_chapter_extractor.models import Chapter, DownloadTask, TrackInfo
+from yt_chapter_extractor.screens.download import DownloadScreen
+from yt_chapter_extractor.sources import LocalDirectorySource
+from yt_chapter_extractor.staging import StagingArea
+
+from .fixtures import generate_library, generate_mp3
+from .harness import BenchResult, bench
+
+_VIDEO_ID = "benchsource"
+_FLOW_POLL_SECONDS = 0.05
+
+
+def _chapters(source_seconds: float, count: int) -> list[Chapter]:
+    length = source_seconds / count
+    return [
+        Chapter(
+            index=i,
+            title=f"Chapter {i + 1}",
+            start_time=i * length,
+            end_time=(i + 1) * length,
+        )
+        for i in range(count)
+    ]
+
+
+class _FlowApp(App):
+    def __init__(self, screen: DownloadScreen) -> None:
+        super().__init__()
+        self._flow_screen = screen
+
+    def on_mount(self) -> None:
+        self.push_screen(self._flow_screen)
+
+
+async def _run_download_flow(screen: DownloadScreen) -> None:
+    app = _FlowApp(screen)
+    async with app.run_test() as pilot:
+        await pilot.pause()
+        while screen.query_one("#done-btn", Button).disabled:
+            await pilot.pause(_FLOW_POLL_SECONDS)
+
+
+def _write_mirror(mirror: Path, source: Path, chapters: list[Chapter]) -> None:
+    mirror.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(source, mirror / f"{_VIDEO_ID}.mp3")
+    info = {
+        "id": _VIDEO_ID,
+        "title": "Benchmark source",
+        "ext": "mp3",
+        "duration": chapters[-1].end_time,
+        "chapters": [
+            {
+                "title": ch.title,
+                "start_time": ch.start_time,
+                "end_time": ch.end_time,
+            }
+            for ch in chapters
+        ],
+    }
+    (mirror / f"{_VIDEO_ID}.info.json").write_text(json.dumps(info))
+
+
+def run_suites(args: argparse.Namespace, work: Path) -> list[BenchResult]:
+    results: list[BenchResult] = []
+    suites = set(args.suite)
+
+    source = work / "source.mp3"
+    generate_mp3(source, args.source_seconds)
+    chapters = _chapters(args.source_seconds, args.chapters)
+    library = generate_library(work / "library", [args.seconds] * args.files)
+    out_dir = work / "out"
+    out_dir.mkdir()
+
+    if "extract_chapter_audio" in suites:
+        middle = chapters[len(chapters) // 2]
+        results.append(
+            bench(
+                "extract_chapter_audio",
+                lambda: extract_chapter_audio(
+                    source, middle.start_time, middle.end_time, out_dir / "ch.mp3"
+                ),
+                repeat=args.repeat,
+                chapter_seconds=middle.duration,
+            )
+        )
+
+    if "process_track" in suites:
+        track = TrackInfo(chapter=chapters[0], filename="track", album="Bench")
+        results.append(
+            bench(
+                "process_track",
+                lambda: process_track(source, track, out_dir),
+                repeat=args.repeat,
+                chapter_seconds=chapters[0].duration,
+            )
+        )
+
+    if "measure_loudness" in suites:
+        results.append(
+            bench(
+                "measure_loudness",
+                lambda: [measure_loudness(p) for p in library],
+                repeat=args.repeat,
+                files=len(library),
+                seconds_per_file=args.seconds,
+            )
+        )
+        results.append(
+            bench(
+                "measure_loudness_batch",
+                lambda: measure_files("ffmpeg", tuple(library)),
+                repeat=args.repeat,
+                files=len(library),
+                seconds_per_file=args.seconds,
+            )
+        )
+
+    if "normalize_audio" in suites:
+        scratch = work / "normalize"
+
+        def copy_library() -> None:
+            shutil.rmtree(scratch, ignore_errors=True)
+            shutil.copytree(library[0].parent, scratch)
+
+        results.append(
+            bench(
+                "normalize_audio",
+                lambda: [
+                    normalize_audio(p, -19.0)
+                    for p in sorted(scratch.glob("*.mp3"))
+                ],
+                repeat=args.repeat,
+                setup=copy_library,
+                files=len(library),
+                seconds_per_file=args.seconds,
+            )
+        )
+
+    if "download_flow" in suites:
+        mirror = work / "mirror"
+        _write_mirror(mirror, source, chapters)
+        tracks = tuple(
+            TrackInfo(chapter=ch, filename=f"flow_{ch.index:03d}")
+            for ch in chapters
+        )
+        task = DownloadTask(
+            url=f"https://www.youtube.com/watch?v={_VIDEO_ID}", tracks=tracks
+        )
+        flow_dir = work / "flow"
+        flow_dir.mkdir()
+
+        def run_flow() -> None:
+            # DownloadScreen writes to ./output, so run it from a scratch dir.
+            cwd = Path.cwd()
+            os.chdir(flow_dir)
+            try:
+                screen = DownloadScreen(
+                    (task,),
+                    target_lufs=args.target_lufs,
+                    source=LocalDirectorySource(mirror),
+                    staging=StagingArea(work / "staging"),
+                )
+                asyncio.run(_run_download_flow(screen))
+            finally:
+                os.chdir(cwd)
+
+        results.append(
+            bench(
+                "download_flow",
+                run_flow,
+                repeat=args.repeat,
+                chapters=len(chapters),
+                source_seconds=args.source_seconds,
+                target_lufs=args.target_lufs,
+            )
+        )
+
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+_SUITES = (
+    "extract_chapter_audio",
+    "process_track",
+    "measure_loudness",
+    "normalize_audio",
+    "download_flow",
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the extraction and normalization pipeline."
+    )
+    parser.add_argument(
+        "--suite",
+        action="append",
+        choices=_SUITES,
+        help="suite to run (repeatable; default: all)",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--source-seconds", type=float, default=600.0)
+    parser.add_argument("--chapters", type=int, default=10)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--target-lufs", type=float, default=-19.0)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+    args.suite = args.suite or list(_SUITES)
+
+    if shutil.which("ffmpeg") is None:
+        parser.error("ffmpeg is required to generate fixtures")
+
+    with tempfile.TemporaryDirectory(prefix="ytce-bench-") as tmp:
+        results = run_suites(args, Path(tmp))
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": [r.to_dict() for r in results],
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
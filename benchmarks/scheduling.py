@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from yt_chapter_extractor.audio import normalize_audio
+from yt_chapter_extractor.concurrency import longest_first
+
+from .fixtures import generate_library
+
+
+def run(library: Path, scratch: Path, order: str, workers: int) -> dict:
+    shutil.rmtree(scratch, ignore_errors=True)
+    shutil.copytree(library, scratch)
+    paths = sorted(scratch.glob("*.mp3"))
+    if order == "longest-first":
+        paths = longest_first(paths, lambda p: p.stat().st_size)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda p: normalize_audio(p, -19.0), paths))
+
+    return {
+        "order": order,
+        "workers": workers,
+        "files": len(paths),
+        "wall_s": round(time.perf_counter() - started, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Compare filename order with longest-first on a skewed "
+            "normalization workload."
+        )
+    )
+    parser.add_argument("--files", type=int, default=15)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--long-seconds", type=float, default=300.0)
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 4, 8))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="ytce-sched-") as tmp:
+        work = Path(tmp)
+        # The long file sorts last by name, the worst case for filename order.
+        generate_library(
+            work / "library",
+            [args.seconds] * args.files + [args.long_seconds],
+        )
+        results = [
+            run(work / "library", work / "scratch", order, args.workers)
+            for _ in range(args.repeat)
+            for order in ("filename", "longest-first")
+        ]
+
+    summary = {
+        order: min(r["wall_s"] for r in results if r["order"] == order)
+        for order in ("filename", "longest-first")
+    }
+    report = json.dumps({"best_wall_s": summary, "runs": results}, indent=2)
+    if args.output:
+        args.output.write_text(report + "\n")
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
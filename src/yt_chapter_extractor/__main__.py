@@ -1,9 +1,249 @@
+import argparse
+import sys
+from pathlib import Path
+
 from .app import ChapterExtractorApp
+from .cache import cached_source
+from .client import JobClient, default_token_path
+from .executors import EXECUTOR_KINDS
+from .jobs import task_to_dict
+from .manifest import load_manifest, resolve_manifest
+from .processes import terminate_all
+from .profiling import Profiler
+from .server import read_token
+from .sources import parse_source
+from .staging import StagingArea, parse_size
+from .subscriptions import (
+    SubscriptionRegistry,
+    default_registry_path,
+    subscription_tasks,
+    sync_subscriptions,
+)
 
 
 def main() -> None:
-    app = ChapterExtractorApp()
-    app.run()
+    parser = argparse.ArgumentParser(prog="yt-chapter-extractor")
+    parser.add_argument(
+        "--source",
+        default="youtube",
+        help=(
+            "where to fetch media from: 'youtube' (default), a local "
+            "directory of yt-dlp downloads, or an http(s):// mirror URL"
+        ),
+    )
+    parser.add_argument(
+        "--staging-dir",
+        type=Path,
+        default=None,
+        help="directory for downloaded sources (default: system temp dir)",
+    )
+    parser.add_argument(
+        "--staging-budget",
+        default=None,
+        help="max bytes of sources staged at once, e.g. 2G (default: unlimited)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help=(
+            "directory for downloaded sources kept between runs "
+            "(default: ~/.cache/yt-chapter-extractor/sources)"
+        ),
+    )
+    parser.add_argument(
+        "--cache-size",
+        default="4G",
+        help="max bytes of cached sources, e.g. 10G; 0 disables the cache",
+    )
+    parser.add_argument(
+        "--no-prefetch",
+        action="store_true",
+        help=(
+            "do not start downloading a video while its chapters and "
+            "metadata are being edited"
+        ),
+    )
+    batch_args = parser.add_mutually_exclusive_group()
+    batch_args.add_argument(
+        "--manifest",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help=(
+            "run every job in a JSON or YAML manifest without prompts, "
+            "then exit"
+        ),
+    )
+    batch_args.add_argument(
+        "--sync-subscriptions",
+        type=Path,
+        nargs="?",
+        const=default_registry_path(),
+        default=None,
+        metavar="PATH",
+        help=(
+            "download the videos added to subscribed playlists since the "
+            "last sync (see yt-chapter-extractor-subs), then exit"
+        ),
+    )
+    parser.add_argument(
+        "--server",
+        default=None,
+        metavar="URL",
+        help=(
+            "send downloads and normalization to a job server, e.g. "
+            "http://127.0.0.1:8765, instead of running them here"
+        ),
+    )
+    parser.add_argument(
+        "--token-file",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help=(
+            "the job server's token file (default: jobs.token next to the "
+            "default job database)"
+        ),
+    )
+    parser.add_argument(
+        "--executor",
+        choices=EXECUTOR_KINDS,
+        default="auto",
+        help=(
+            "pool for in-process CPU work such as the native loudness meter "
+            "(default: processes, or threads on free-threaded builds)"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-out",
+        type=Path,
+        default=None,
+        help=(
+            "write per-stage timings of each run to this file "
+            "(OpenMetrics text for .prom/.txt, JSON otherwise)"
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help=(
+            "sample all threads while running and write folded stacks "
+            "(for flamegraph.pl or speedscope) to PATH on exit"
+        ),
+    )
+    args = parser.parse_args()
+
+    try:
+        source = parse_source(args.source)
+        budget = (
+            parse_size(args.staging_budget)
+            if args.staging_budget is not None
+            else None
+        )
+        cache_size = parse_size(args.cache_size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None
+    if args.server:
+        token_file = args.token_file or default_token_path()
+        try:
+            server = JobClient(args.server, read_token(token_file))
+        except (OSError, ValueError) as e:
+            parser.error(f"{token_file}: {e}")
+
+    source = cached_source(source, args.source, args.cache_dir, cache_size)
+
+    batch = ()
+    skipped: list[str] = []
+    output_dir = None
+    if args.manifest is not None:
+        try:
+            manifest = load_manifest(args.manifest)
+            print(f"Looking up {len(manifest.jobs)} jobs...")
+            batch, skipped = resolve_manifest(manifest, source)
+        except (OSError, ValueError) as e:
+            parser.error(f"{args.manifest}: {e}")
+        for error in skipped:
+            print(f"Skipped {error}", file=sys.stderr)
+        if not batch:
+            sys.exit(1)
+        output_dir = manifest.output_dir
+
+    registry = None
+    synced = []
+    if args.sync_subscriptions is not None:
+        try:
+            registry = SubscriptionRegistry(args.sync_subscriptions)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        synced = sync_subscriptions(registry.subscriptions(), source)
+        for result in synced:
+            if result.error is not None:
+                skipped.append(f"{result.title}: {result.error}")
+                print(f"Skipped {result.title}: {result.error}", file=sys.stderr)
+            else:
+                print(f"{result.title}: {len(result.entries)} new")
+        batch = subscription_tasks(synced)
+        if not batch:
+            sys.exit(1 if skipped else 0)
+
+        # A server takes the downloads as one bulk job; the videos count as
+        # fetched once it has accepted them.
+        if server is not None:
+            payload = {
+                "tasks": [task_to_dict(task) for task in batch],
+                "output_dir": str(Path.cwd() / "output"),
+            }
+            try:
+                job = server.submit("extract", payload, "bulk")
+            except RuntimeError as e:
+                print(f"Error: {e}", file=sys.stderr)
+                sys.exit(1)
+            registry.mark_known(synced)
+            registry.save()
+            print(f"Submitted job {job['id']} to {args.server}")
+            sys.exit(1 if skipped else 0)
+
+    profiler = Profiler() if args.profile is not None else None
+    app = ChapterExtractorApp(
+        source=source,
+        staging=StagingArea(args.staging_dir, budget),
+        executor_kind=args.executor,
+        metrics_path=args.metrics_out,
+        profiler=profiler,
+        prefetch=not args.no_prefetch,
+        batch=batch,
+        output_dir=output_dir,
+        server=server,
+    )
+    if profiler is not None:
+        profiler.start()
+    try:
+        report = app.run()
+    finally:
+        # Pool threads of a quit app may still be waiting on ffmpeg, and the
+        # interpreter joins them before exiting.
+        terminate_all()
+        if profiler is not None:
+            profiler.stop()
+            profiler.write_folded(args.profile)
+            print("\n".join(profiler.summary_lines()))
+            print(f"Folded stacks written to {args.profile}")
+
+    if batch:
+        if report:
+            print("\n".join(report))
+        # Videos that failed, or were not reached before quitting, are
+        # fetched again next time.
+        if registry is not None and app.completed_urls:
+            registry.mark_known(synced, set(app.completed_urls))
+            registry.save()
+        if app.return_code or skipped:
+            sys.exit(app.return_code or 1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+import math
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+from mutagen import MutagenError
+from mutagen.id3 import ID3
+
+from .audio import mp3_duration
+from .histogram import HistogramStore, LoudnessHistogram
+from .models import Mp3FileInfo
+
+GROUP_BY_TAG = "album-tag"
+GROUP_BY_DIRECTORY = "album-dir"
+
+
+@dataclass(frozen=True)
+class AlbumGain:
+    name: str
+    loudness_lufs: float
+    gain_db: float
+    tracks: tuple[Mp3FileInfo, ...]
+
+
+def _album_tag(info: Mp3FileInfo) -> str | None:
+    try:
+        frame = ID3(str(info.path)).get("TALB")
+    except MutagenError:
+        return None
+    if frame is None or not frame.text:
+        return None
+    return str(frame.text[0]).strip() or None
+
+
+def album_key(info: Mp3FileInfo, group_by: str) -> str:
+    if group_by == GROUP_BY_TAG:
+        tag = _album_tag(info)
+        if tag:
+            return tag
+    return str(info.path.parent)
+
+
+# With a stored block histogram for every track, the album is gated as
+# one recording, exactly as if the tracks were measured back to back.
+# Otherwise integrated loudness does not combine exactly across files, so
+# the album value is the duration-weighted mean energy of the per-track
+# measurements.
+def album_loudness(
+    tracks: list[Mp3FileInfo], histograms: HistogramStore | None = None
+) -> float:
+    if histograms is not None:
+        stored = [histograms.get(info.path) for info in tracks]
+        if all(histogram is not None for histogram in stored):
+            return LoudnessHistogram.merge(stored).integrated_loudness()
+
+    total_energy = 0.0
+    total_duration = 0.0
+    for info in tracks:
+        duration = mp3_duration(info.path) or 1.0
+        total_duration += duration
+        if info.loudness_lufs is not None and info.loudness_lufs > -math.inf:
+            total_energy += duration * 10 ** (info.loudness_lufs / 10)
+
+    if total_energy <= 0:
+        return -math.inf
+    return 10 * math.log10(total_energy / total_duration)
+
+
+def plan_album_gains(
+    files: tuple[Mp3FileInfo, ...],
+    target_lufs: float,
+    group_by: str,
+    histograms: Path | None = None,
+) -> list[AlbumGain]:
+    albums: dict[str, list[Mp3FileInfo]] = defaultdict(list)
+    for info in files:
+        if info.loudness_lufs is not None:
+            albums[album_key(info, group_by)].append(info)
+
+    store = (
+        HistogramStore(histograms)
+        if histograms is not None and histograms.exists()
+        else None
+    )
+    plans = []
+    try:
+        for name, tracks in sorted(albums.items()):
+            loudness = album_loudness(tracks, store)
+            gain = target_lufs - loudness if loudness > -math.inf else 0.0
+            plans.append(
+                AlbumGain(
+                    name=name,
+                    loudness_lufs=loudness,
+                    gain_db=gain,
+                    tracks=tuple(tracks),
+                )
+            )
+    finally:
+        if store is not None:
+            store.close()
+    return plans
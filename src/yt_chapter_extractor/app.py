@@ -1,11 +1,23 @@
+import asyncio
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
 from textual import work
 from textual.app import App
 
 from .audio import check_ffmpeg
+from .client import JobClient
+from .jobs import task_to_dict
+from .metrics import RunMetrics
 from .models import Chapter, DownloadTask, PlaylistInfo
+from .prefetch import Prefetcher
+from .profiling import Profiler
 from .screens.chapter_select import ChapterSelectScreen
 from .screens.dir_input import DirInputScreen
 from .screens.download import DownloadScreen
+from .screens.job_status import JobStatusScreen
 from .screens.metadata_edit import MetadataEditScreen
 from .screens.mode_select import ModeSelectScreen
 from .screens.norm_file_list import NormFileListScreen
@@ -13,6 +25,8 @@ from .screens.norm_settings import NormSettingsScreen
 from .screens.norm_progress import NormProgressScreen
 from .screens.playlist_select import PlaylistSelectScreen
 from .screens.url_input import UrlInputScreen
+from .sources import MediaSource, YtDlpSource
+from .staging import StagingArea
 from .theme import CATPPUCCIN_MACCHIATO
 
 
@@ -25,20 +39,94 @@ class ChapterExtractorApp(App):
     }
     """
 
+    def __init__(
+        self,
+        source: MediaSource | None = None,
+        staging: StagingArea | None = None,
+        executor_kind: str = "auto",
+        metrics_path: Path | None = None,
+        profiler: Profiler | None = None,
+        prefetch: bool = True,
+        batch: tuple[DownloadTask, ...] = (),
+        output_dir: Path | None = None,
+        server: JobClient | None = None,
+    ) -> None:
+        super().__init__()
+        self._source = source or YtDlpSource()
+        self._staging = staging or StagingArea()
+        self._executor_kind = executor_kind
+        self._metrics_path = metrics_path
+        self._metrics = RunMetrics()
+        self._profiler = profiler
+        self._server = server
+        # With a job server, downloads happen there.
+        self._prefetcher = (
+            Prefetcher(self._source, self._staging)
+            if prefetch and server is None
+            else None
+        )
+        self._batch = batch
+        self._output_dir = output_dir
+        # Source URLs of the batch that were fetched and processed in full.
+        self.completed_urls: tuple[str, ...] = ()
+
     def on_mount(self) -> None:
         self.register_theme(CATPPUCCIN_MACCHIATO)
         self.theme = "catppuccin-macchiato"
 
+        if self._profiler is not None:
+            self.run_worker(
+                self._profiler.monitor_event_loop(self), group="profile"
+            )
+
         if not check_ffmpeg():
             self.notify(
                 "ffmpeg is not installed. Please install it first.",
                 severity="error",
                 timeout=10,
             )
-            self.exit()
+            self.exit(return_code=1)
             return
 
-        self._run_flow()
+        if self._batch:
+            self._run_batch()
+        else:
+            self._run_flow()
+
+    def call_from_thread(
+        self, callback: Callable[..., Any], *args: Any, **kwargs: Any
+    ) -> Any:
+        if self._profiler is None:
+            return super().call_from_thread(callback, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().call_from_thread(callback, *args, **kwargs)
+        finally:
+            self._profiler.record_call(callback, time.perf_counter() - started)
+
+    # Quitting a manifest run before it is done fails it.
+    async def action_quit(self) -> None:
+        self.exit(return_code=1 if self._batch else 0)
+
+    # Manifest runs skip every prompt and exit when done, with the run
+    # report as the app's result.
+    @work
+    async def _run_batch(self) -> None:
+        self.completed_urls = await self.push_screen_wait(
+            DownloadScreen(
+                self._batch,
+                source=self._source,
+                staging=self._staging,
+                metrics=self._metrics,
+                metrics_path=self._metrics_path,
+                output_dir=self._output_dir,
+                close_when_done=True,
+            )
+        )
+        succeeded = set(self.completed_urls) >= {t.url for t in self._batch}
+        self.exit(
+            self._metrics.summary_lines(), return_code=0 if succeeded else 1
+        )
 
     @work
     async def _run_flow(self) -> None:
@@ -55,17 +143,86 @@ class ChapterExtractorApp(App):
 
     async def _run_youtube_flow(self) -> None:
         while True:
-            result = await self.push_screen_wait(UrlInputScreen())
+            self._metrics = RunMetrics()
+            result = await self.push_screen_wait(
+                UrlInputScreen(self._source, self._metrics)
+            )
             if result is None:
                 return
 
-            if isinstance(result, PlaylistInfo):
-                await self._run_playlist_flow(result)
-            elif result.chapters:
-                await self._run_chapter_flow(result)
-            else:
-                await self._run_single_track_flow(result)
+            try:
+                if isinstance(result, PlaylistInfo):
+                    await self._run_playlist_flow(result)
+                elif result.chapters:
+                    await self._run_chapter_flow(result)
+                else:
+                    await self._run_single_track_flow(result)
+            finally:
+                # Downloads the user backed out of before starting them.
+                if self._prefetcher is not None:
+                    self._prefetcher.cancel_all()
+            return
+
+    async def _run_download(
+        self, tasks: tuple[DownloadTask, ...], target_lufs: float | None
+    ) -> None:
+        if self._server is None:
+            await self.push_screen_wait(
+                DownloadScreen(
+                    tasks,
+                    target_lufs=target_lufs,
+                    source=self._source,
+                    staging=self._staging,
+                    metrics=self._metrics,
+                    metrics_path=self._metrics_path,
+                    prefetcher=self._prefetcher,
+                )
+            )
+            return
+
+        payload = {
+            "tasks": [
+                task_to_dict(
+                    DownloadTask(
+                        url=task.url,
+                        tracks=task.tracks,
+                        target_lufs=(
+                            task.target_lufs
+                            if task.target_lufs is not None
+                            else target_lufs
+                        ),
+                        source_duration=task.source_duration,
+                    )
+                )
+                for task in tasks
+            ],
+            # Where DownloadScreen would have written them.
+            "output_dir": str(Path.cwd() / "output"),
+        }
+        count = sum(len(task.tracks) for task in tasks)
+        await self._submit_job("extract", payload, f"Extracting {count} tracks")
+
+    # Jobs sent from the TUI have someone waiting on them, so they go ahead
+    # of bulk submissions.
+    async def _submit_job(self, kind: str, payload: dict, title: str) -> None:
+        try:
+            job = await asyncio.to_thread(
+                self._server.submit, kind, payload, "interactive"
+            )
+        except RuntimeError as e:
+            self.notify(str(e), severity="error", timeout=10)
+            return
+        await self.push_screen_wait(
+            JobStatusScreen(self._server, job["id"], title)
+        )
+
+    def _prefetch(self, entries: list[tuple[str, float]]) -> None:
+        if self._prefetcher is None:
             return
+        self._prefetcher.retain(url for url, _ in entries)
+        for url, duration in entries:
+            if not self._prefetcher.start(url, duration):
+                break
 
     async def _run_playlist_flow(self, playlist_info: PlaylistInfo) -> None:
         while True:
@@ -75,6 +232,10 @@ class ChapterExtractorApp(App):
             if not selected:
                 return
 
+            # Sources download in playlist order, so the first selected
+            # videos are the ones worth fetching early.
+            self._prefetch([(entry.url, entry.duration) for entry in selected])
+
             chapters = [
                 Chapter(
                     index=entry.index,
@@ -105,18 +266,19 @@ class ChapterExtractorApp(App):
                 DownloadTask(
                     url=selected[i].url,
                     tracks=(track,),
+                    source_duration=selected[i].duration,
                 )
                 for i, track in enumerate(tracks)
             )
 
-            await self.push_screen_wait(
-                DownloadScreen(
-                    tasks, target_lufs=target_lufs if enabled else None
-                )
+            await self._run_download(
+                tasks, target_lufs if enabled else None
             )
             return
 
     async def _run_chapter_flow(self, video_info) -> None:
+        self._prefetch([(video_info.url, video_info.duration)])
+
         while True:
             selected_chapters = await self.push_screen_wait(
                 ChapterSelectScreen(video_info.title, video_info.chapters)
@@ -138,12 +300,13 @@ class ChapterExtractorApp(App):
                 continue
 
             enabled, target_lufs = norm_result
-            url = f"https://www.youtube.com/watch?v={video_info.video_id}"
-            task = DownloadTask(url=url, tracks=tuple(tracks))
-            await self.push_screen_wait(
-                DownloadScreen(
-                    (task,), target_lufs=target_lufs if enabled else None
-                )
+            task = DownloadTask(
+                url=video_info.url,
+                tracks=tuple(tracks),
+                source_duration=video_info.duration,
+            )
+            await self._run_download(
+                (task,), target_lufs if enabled else None
             )
             return
 
@@ -154,6 +317,7 @@ class ChapterExtractorApp(App):
             start_time=0.0,
             end_time=video_info.duration,
         )
+        self._prefetch([(video_info.url, video_info.duration)])
 
         while True:
             tracks = await self.push_screen_wait(
@@ -167,29 +331,58 @@ class ChapterExtractorApp(App):
                 continue
 
             enabled, target_lufs = norm_result
-            url = f"https://www.youtube.com/watch?v={video_info.video_id}"
-            task = DownloadTask(url=url, tracks=tuple(tracks))
-            await self.push_screen_wait(
-                DownloadScreen(
-                    (task,), target_lufs=target_lufs if enabled else None
-                )
+            task = DownloadTask(
+                url=video_info.url,
+                tracks=tuple(tracks),
+                source_duration=video_info.duration,
+            )
+            await self._run_download(
+                (task,), target_lufs if enabled else None
             )
             return
 
     async def _run_normalize_flow(self) -> None:
         while True:
-            dir_path = await self.push_screen_wait(DirInputScreen())
-            if dir_path is None:
+            dir_result = await self.push_screen_wait(DirInputScreen())
+            if dir_result is None:
                 return
 
+            dir_path, recursive = dir_result
             result = await self.push_screen_wait(
-                NormFileListScreen(dir_path)
+                NormFileListScreen(
+                    dir_path,
+                    recursive=recursive,
+                    executor_kind=self._executor_kind,
+                )
             )
             if result is None:
                 continue
 
-            files, target_lufs = result
+            files, target_lufs, mode = result
+            if self._server is not None:
+                payload = {
+                    "files": [
+                        {
+                            "path": str(info.path.resolve()),
+                            "loudness_lufs": info.loudness_lufs,
+                            "loudness_estimated": info.loudness_estimated,
+                        }
+                        for info in files
+                    ],
+                    "target_lufs": target_lufs,
+                    "mode": mode,
+                }
+                await self._submit_job(
+                    "normalize", payload, f"Normalizing {len(files)} files"
+                )
+                return
+
             await self.push_screen_wait(
-                NormProgressScreen(files, target_lufs)
+                NormProgressScreen(
+                    files,
+                    target_lufs,
+                    mode,
+                    metrics_path=self._metrics_path,
+                )
             )
             return
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import re
@@ -6,26 +7,35 @@ import subprocess
 import tempfile
 from pathlib import Path
 
+from mutagen import MutagenError
 from mutagen.id3 import ID3, TIT2, TPE1, TALB, TRCK
 from mutagen.mp3 import MP3
 
+from . import processes
+from .processes import ProcessGroup
+from .metrics import RunMetrics, timed
 from .models import TrackInfo
 
+# Each ffmpeg job has a command builder and a result check shared by a
+# blocking variant (CLI tools, benchmarks, job server) and an async variant
+# that the screens drive from the event loop. Blocking variants that write
+# files take the ProcessGroup to run under, so a caller can cancel them.
+
 
 def check_ffmpeg() -> bool:
     return shutil.which("ffmpeg") is not None
 
 
-def extract_chapter_audio(
+def _extract_command(
     source_path: Path,
     start_time: float,
     end_time: float,
     output_path: Path,
-) -> Path:
+) -> list[str]:
     convert_entire_file = start_time == 0 and end_time <= 0
 
     if convert_entire_file:
-        cmd = [
+        return [
             "ffmpeg",
             "-y",
             "-i", str(source_path),
@@ -33,32 +43,66 @@ def extract_chapter_audio(
             "-q:a", "2",
             str(output_path),
         ]
-    else:
-        duration = end_time - start_time
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-ss", str(start_time),
-            "-i", str(source_path),
-            "-t", str(duration),
-            "-codec:a", "libmp3lame",
-            "-q:a", "2",
-            str(output_path),
-        ]
 
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        timeout=300,
-    )
+    duration = end_time - start_time
+    return [
+        "ffmpeg",
+        "-y",
+        "-ss", str(start_time),
+        "-i", str(source_path),
+        "-t", str(duration),
+        "-codec:a", "libmp3lame",
+        "-q:a", "2",
+        str(output_path),
+    ]
+
 
+def _check_returncode(result: subprocess.CompletedProcess[str]) -> None:
     if result.returncode != 0:
         raise RuntimeError(f"ffmpeg failed: {result.stderr}")
 
+
+def extract_chapter_audio(
+    source_path: Path,
+    start_time: float,
+    end_time: float,
+    output_path: Path,
+    group: ProcessGroup | None = None,
+) -> Path:
+    cmd = _extract_command(source_path, start_time, end_time, output_path)
+    group = group or processes.default_group()
+
+    # A killed or failed encode must not leave a truncated file behind.
+    with group.partial_output(output_path):
+        _check_returncode(group.run(cmd, timeout=300))
+
+    return output_path
+
+
+async def extract_chapter_audio_async(
+    source_path: Path,
+    start_time: float,
+    end_time: float,
+    output_path: Path,
+) -> Path:
+    cmd = _extract_command(source_path, start_time, end_time, output_path)
+
+    try:
+        _check_returncode(await processes.run_async(cmd, timeout=300))
+    except BaseException:
+        output_path.unlink(missing_ok=True)
+        raise
+
     return output_path
 
 
+def mp3_duration(mp3_path: Path) -> float:
+    try:
+        return MP3(str(mp3_path)).info.length
+    except MutagenError:
+        return 0.0
+
+
 def set_metadata(mp3_path: Path, track: TrackInfo) -> None:
     audio = MP3(str(mp3_path))
 
@@ -89,17 +133,44 @@ def process_track(
     source_path: Path,
     track: TrackInfo,
     output_dir: Path,
+    metrics: RunMetrics | None = None,
+    group: ProcessGroup | None = None,
 ) -> Path:
     output_path = output_dir / f"{track.filename}.mp3"
 
-    extract_chapter_audio(
-        source_path=source_path,
-        start_time=track.chapter.start_time,
-        end_time=track.chapter.end_time,
-        output_path=output_path,
-    )
+    with timed(metrics, "extract", track.filename):
+        extract_chapter_audio(
+            source_path=source_path,
+            start_time=track.chapter.start_time,
+            end_time=track.chapter.end_time,
+            output_path=output_path,
+            group=group,
+        )
 
-    set_metadata(output_path, track)
+    with timed(metrics, "tag", track.filename):
+        set_metadata(output_path, track)
+
+    return output_path
+
+
+async def process_track_async(
+    source_path: Path,
+    track: TrackInfo,
+    output_dir: Path,
+    metrics: RunMetrics | None = None,
+) -> Path:
+    output_path = output_dir / f"{track.filename}.mp3"
+
+    with timed(metrics, "extract", track.filename):
+        await extract_chapter_audio_async(
+            source_path=source_path,
+            start_time=track.chapter.start_time,
+            end_time=track.chapter.end_time,
+            output_path=output_path,
+        )
+
+    with timed(metrics, "tag", track.filename):
+        await asyncio.to_thread(set_metadata, output_path, track)
 
     return output_path
 
@@ -109,8 +180,8 @@ _LOUDNORM_JSON_PATTERN = re.compile(
 )
 
 
-def measure_loudness(mp3_path: Path) -> float:
-    cmd = [
+def _measure_command(mp3_path: Path) -> list[str]:
+    return [
         "ffmpeg",
         "-i", str(mp3_path),
         "-af", "loudnorm=print_format=json",
@@ -118,18 +189,23 @@ def measure_loudness(mp3_path: Path) -> float:
         "-",
     ]
 
-    result = subprocess.run(
-        cmd,
-        capture_output=True,
-        text=True,
-        timeout=120,
-    )
 
+def measure_loudness(mp3_path: Path) -> float:
+    result = processes.run(_measure_command(mp3_path), timeout=120)
+    return _parse_loudnorm_output(result.stderr, mp3_path.name)
+
+
+async def measure_loudness_async(mp3_path: Path) -> float:
+    result = await processes.run_async(_measure_command(mp3_path), timeout=120)
+    return _parse_loudnorm_output(result.stderr, mp3_path.name)
+
+
+def _parse_loudnorm_output(stderr: str, name: str) -> float:
     # loudnorm always outputs to stderr even on success, so check for JSON first
-    match = _LOUDNORM_JSON_PATTERN.search(result.stderr)
+    match = _LOUDNORM_JSON_PATTERN.search(stderr)
     if not match:
         raise RuntimeError(
-            f"ffmpeg loudness measurement failed for {mp3_path.name}: {result.stderr[:200]}"
+            f"ffmpeg loudness measurement failed for {name}: {stderr[:200]}"
         )
 
     try:
@@ -137,40 +213,275 @@ def measure_loudness(mp3_path: Path) -> float:
         return float(data["input_i"])
     except (json.JSONDecodeError, KeyError, ValueError) as e:
         raise RuntimeError(
-            f"Failed to parse loudness data for {mp3_path.name}: {e}"
+            f"Failed to parse loudness data for {name}: {e}"
         ) from e
 
 
-def normalize_audio(mp3_path: Path, target_lufs: float) -> Path:
-    dir_path = mp3_path.parent
-    fd, tmp_path_str = tempfile.mkstemp(suffix=".mp3", dir=dir_path)
-    os.close(fd)
-    tmp_path = Path(tmp_path_str)
+# With several loudnorm instances in one graph the JSON blocks come out in
+# teardown order, so each is matched to its input by the instance name.
+_BATCH_LOUDNORM_PATTERN = re.compile(
+    r"\[Parsed_loudnorm_(\d+) @ [^\]]*\]\s*(\{[^{}]*\})", re.DOTALL
+)
+
+
+def _batch_measure_command(mp3_paths: list[Path]) -> list[str]:
+    cmd = ["ffmpeg", "-nostats"]
+    for path in mp3_paths:
+        cmd += ["-i", str(path)]
+
+    cmd += [
+        "-filter_complex",
+        ";".join(
+            f"[{i}:a]loudnorm=print_format=json[out{i}]"
+            for i in range(len(mp3_paths))
+        ),
+    ]
+    for i in range(len(mp3_paths)):
+        cmd += ["-map", f"[out{i}]", "-f", "null", "-"]
+    return cmd
 
+
+def _parse_batch_output(
+    result: subprocess.CompletedProcess[str], mp3_paths: list[Path]
+) -> dict[Path, float]:
+    results: dict[Path, float] = {}
+    if result.returncode == 0:
+        for match in _BATCH_LOUDNORM_PATTERN.finditer(result.stderr):
+            path = mp3_paths[int(match.group(1))]
+            results[path] = _parse_loudnorm_output(match.group(2), path.name)
+    return results
+
+
+def measure_loudness_batch(mp3_paths: list[Path]) -> dict[Path, float]:
     try:
-        cmd = [
-            "ffmpeg",
-            "-y",
+        result = processes.run(
+            _batch_measure_command(mp3_paths), timeout=120 * len(mp3_paths)
+        )
+        results = _parse_batch_output(result, mp3_paths)
+    except subprocess.TimeoutExpired:
+        results = {}
+
+    # One unreadable or stalled input fails the whole graph; measure what
+    # is left on its own so a bad file only costs itself.
+    for path in mp3_paths:
+        if path not in results:
+            try:
+                results[path] = measure_loudness(path)
+            except (RuntimeError, subprocess.TimeoutExpired):
+                continue
+
+    return results
+
+
+async def measure_loudness_batch_async(
+    mp3_paths: list[Path],
+) -> dict[Path, float]:
+    try:
+        result = await processes.run_async(
+            _batch_measure_command(mp3_paths), timeout=120 * len(mp3_paths)
+        )
+        results = _parse_batch_output(result, mp3_paths)
+    except subprocess.TimeoutExpired:
+        results = {}
+
+    for path in mp3_paths:
+        if path not in results:
+            try:
+                results[path] = await measure_loudness_async(path)
+            except (RuntimeError, subprocess.TimeoutExpired):
+                continue
+
+    return results
+
+
+_QUICK_SCAN_WINDOWS = 6
+_QUICK_SCAN_WINDOW_SECONDS = 10.0
+
+
+def _estimate_command(
+    mp3_path: Path, duration: float, windows: int, window_seconds: float
+) -> list[str]:
+    # Evenly spaced windows, concatenated and measured as one stream in a
+    # single ffmpeg process; each input only decodes its own window.
+    spacing = (duration - window_seconds) / windows
+    cmd = ["ffmpeg"]
+    for k in range(windows):
+        start = spacing * (k + 0.5)
+        cmd += [
+            "-ss", f"{start:.3f}",
+            "-t", str(window_seconds),
             "-i", str(mp3_path),
-            "-af", f"loudnorm=I={target_lufs}:LRA=11:TP=-1.5",
-            "-codec:a", "libmp3lame",
-            "-q:a", "2",
-            str(tmp_path),
         ]
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300,
-        )
+    inputs = "".join(f"[{k}:a]" for k in range(windows))
+    cmd += [
+        "-filter_complex",
+        f"{inputs}concat=n={windows}:v=0:a=1,loudnorm=print_format=json",
+        "-f", "null",
+        "-",
+    ]
+    return cmd
+
+
+def estimate_loudness(
+    mp3_path: Path,
+    windows: int = _QUICK_SCAN_WINDOWS,
+    window_seconds: float = _QUICK_SCAN_WINDOW_SECONDS,
+) -> tuple[float, bool]:
+    # Files too short to be worth sampling are measured exactly, so the
+    # second element says whether the value is an estimate.
+    duration = MP3(str(mp3_path)).info.length
+    if duration <= 2 * windows * window_seconds:
+        return measure_loudness(mp3_path), False
+
+    cmd = _estimate_command(mp3_path, duration, windows, window_seconds)
+    result = processes.run(cmd, timeout=120)
+    return _parse_loudnorm_output(result.stderr, mp3_path.name), True
+
+
+async def estimate_loudness_async(
+    mp3_path: Path,
+    windows: int = _QUICK_SCAN_WINDOWS,
+    window_seconds: float = _QUICK_SCAN_WINDOW_SECONDS,
+) -> tuple[float, bool]:
+    info = await asyncio.to_thread(MP3, str(mp3_path))
+    duration = info.info.length
+    if duration <= 2 * windows * window_seconds:
+        return await measure_loudness_async(mp3_path), False
+
+    cmd = _estimate_command(mp3_path, duration, windows, window_seconds)
+    result = await processes.run_async(cmd, timeout=120)
+    return _parse_loudnorm_output(result.stderr, mp3_path.name), True
+
+
+def _loudnorm_filter(target_lufs: float) -> str:
+    return f"loudnorm=I={target_lufs}:LRA=11:TP=-1.5"
+
+
+# A positive album gain can push peaks past full scale, so it goes through
+# a limiter at the same ceiling loudnorm uses.
+def _gain_filter(gain_db: float) -> str:
+    volume = f"volume={gain_db:.2f}dB"
+    if gain_db <= 0:
+        return volume
+    return f"{volume},alimiter=limit=-1.5dB:level=disabled:latency=enabled"
+
+
+def normalize_audio(
+    mp3_path: Path,
+    target_lufs: float,
+    metrics: RunMetrics | None = None,
+    group: ProcessGroup | None = None,
+) -> Path:
+    return _reencode_in_place(
+        mp3_path, _loudnorm_filter(target_lufs), metrics, group
+    )
 
-        if result.returncode != 0:
-            raise RuntimeError(f"ffmpeg failed: {result.stderr}")
 
-        os.replace(tmp_path, mp3_path)
+async def normalize_audio_async(
+    mp3_path: Path,
+    target_lufs: float,
+    metrics: RunMetrics | None = None,
+) -> Path:
+    return await _reencode_in_place_async(
+        mp3_path, _loudnorm_filter(target_lufs), metrics
+    )
+
+
+def apply_gain(
+    mp3_path: Path,
+    gain_db: float,
+    metrics: RunMetrics | None = None,
+    group: ProcessGroup | None = None,
+) -> Path:
+    return _reencode_in_place(mp3_path, _gain_filter(gain_db), metrics, group)
+
+
+async def apply_gain_async(
+    mp3_path: Path,
+    gain_db: float,
+    metrics: RunMetrics | None = None,
+) -> Path:
+    return await _reencode_in_place_async(
+        mp3_path, _gain_filter(gain_db), metrics
+    )
+
+
+def _reencode_command(
+    mp3_path: Path, audio_filter: str, tmp_path: Path
+) -> list[str]:
+    return [
+        "ffmpeg",
+        "-y",
+        "-i", str(mp3_path),
+        "-af", audio_filter,
+        "-codec:a", "libmp3lame",
+        "-q:a", "2",
+        "-f", "mp3",
+        str(tmp_path),
+    ]
+
+
+# A hidden .part name, so scans and watchers of the directory skip it.
+def _temp_output(mp3_path: Path) -> Path:
+    fd, tmp_path_str = tempfile.mkstemp(
+        prefix=f".{mp3_path.name}.", suffix=".part", dir=mp3_path.parent
+    )
+    os.close(fd)
+    return Path(tmp_path_str)
+
+
+# The re-encode replaces the file it read, so a file rewritten meanwhile
+# (a new download landing over it) fails instead of being lost, and the
+# caller can try it again.
+def _check_unchanged(mp3_path: Path, before: os.stat_result) -> None:
+    st = mp3_path.stat()
+    if (st.st_size, st.st_mtime_ns) != (before.st_size, before.st_mtime_ns):
+        raise RuntimeError(f"{mp3_path.name} changed while being re-encoded")
+
+
+def _reencode_in_place(
+    mp3_path: Path,
+    audio_filter: str,
+    metrics: RunMetrics | None = None,
+    group: ProcessGroup | None = None,
+) -> Path:
+    before = mp3_path.stat()
+    tmp_path = _temp_output(mp3_path)
+    group = group or processes.default_group()
+
+    # The temp file is registered so a cancelled batch deletes it even while
+    # ffmpeg is still writing to it.
+    with group.partial_output(tmp_path):
+        cmd = _reencode_command(mp3_path, audio_filter, tmp_path)
+        with timed(metrics, "normalize", mp3_path.name):
+            result = group.run(cmd, timeout=300)
+        _check_returncode(result)
+        _check_unchanged(mp3_path, before)
+
+        with timed(metrics, "replace", mp3_path.name):
+            os.replace(tmp_path, mp3_path)
+        return mp3_path
+
+
+async def _reencode_in_place_async(
+    mp3_path: Path,
+    audio_filter: str,
+    metrics: RunMetrics | None = None,
+) -> Path:
+    before = mp3_path.stat()
+    tmp_path = _temp_output(mp3_path)
+
+    try:
+        cmd = _reencode_command(mp3_path, audio_filter, tmp_path)
+        with timed(metrics, "normalize", mp3_path.name):
+            result = await processes.run_async(cmd, timeout=300)
+        _check_returncode(result)
+        _check_unchanged(mp3_path, before)
+
+        with timed(metrics, "replace", mp3_path.name):
+            os.replace(tmp_path, mp3_path)
         return mp3_path
-    except Exception:
-        if tmp_path.exists():
-            tmp_path.unlink()
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
         raise
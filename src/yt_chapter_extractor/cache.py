@@ -0,0 +1,167 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Container
+from pathlib import Path
+
+from . import youtube
+from .models import PlaylistInfo, VideoInfo
+from .sources import LocalDirectorySource, MediaSource, YtDlpSource
+from .youtube import DOWNLOAD_FORMAT, ProgressCallback
+
+DEFAULT_CACHE_BYTES = 4 * 1024**3
+
+
+def default_cache_dir() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "yt-chapter-extractor" / "sources"
+
+
+def _place(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def _entry_bytes(entry: Path) -> int:
+    return sum(p.stat().st_size for p in entry.iterdir() if p.is_file())
+
+
+# Downloaded sources kept across runs, one directory per video and format.
+# Files are hard-linked in and out where the filesystem allows it. A hit
+# touches its entry, and each insert evicts least recently used entries
+# until the cache fits max_bytes again.
+class SourceCache:
+    def __init__(
+        self, root: Path, max_bytes: int = DEFAULT_CACHE_BYTES
+    ) -> None:
+        self._root = root
+        self._max = max_bytes
+        self._lock = threading.Lock()
+
+    def get(self, video_id: str, fmt: str, output_dir: Path) -> Path | None:
+        entry = self._entry(video_id, fmt)
+        with self._lock:
+            try:
+                files = [p for p in entry.iterdir() if p.is_file()]
+                if not files:
+                    return None
+                os.utime(entry)
+            except OSError:
+                return None
+
+        # Outside the lock: a copy can take a while, and the entry was just
+        # made the most recently used, so eviction will not pick it.
+        output_path = output_dir / files[0].name
+        try:
+            _place(files[0], output_path)
+        except OSError:
+            output_path.unlink(missing_ok=True)
+            return None
+        return output_path
+
+    def put(self, video_id: str, fmt: str, source_path: Path) -> None:
+        if source_path.stat().st_size > self._max:
+            return
+
+        self._root.mkdir(parents=True, exist_ok=True)
+        tmp = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self._root))
+        try:
+            _place(source_path, tmp / source_path.name)
+            entry = self._entry(video_id, fmt)
+            with self._lock:
+                shutil.rmtree(entry, ignore_errors=True)
+                os.rename(tmp, entry)
+                self._evict(keep=entry)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _entry(self, video_id: str, fmt: str) -> Path:
+        digest = hashlib.sha1(fmt.encode()).hexdigest()[:12]
+        return self._root / f"{video_id}-{digest}"
+
+    def _evict(self, keep: Path) -> None:
+        entries = []
+        for entry in self._root.iterdir():
+            if entry.name.startswith(".") or not entry.is_dir():
+                continue
+            try:
+                entries.append(
+                    (entry.stat().st_mtime, _entry_bytes(entry), entry)
+                )
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry in sorted(entries):
+            if total <= self._max:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+
+# Wraps another source so downloads are served from the cache when the
+# same video was fetched in the same format before.
+class CachedSource:
+    def __init__(
+        self, source: MediaSource, cache: SourceCache, fmt: str
+    ) -> None:
+        self._source = source
+        self._cache = cache
+        self._format = fmt
+
+    def extract_video_info(self, url: str) -> VideoInfo:
+        return self._source.extract_video_info(url)
+
+    def extract_playlist_info(self, url: str) -> PlaylistInfo:
+        return self._source.extract_playlist_info(url)
+
+    def extract_playlist_head(
+        self, url: str, known: Container[str]
+    ) -> PlaylistInfo:
+        return self._source.extract_playlist_head(url, known)
+
+    def download_audio(
+        self,
+        url: str,
+        output_dir: Path,
+        on_progress: ProgressCallback | None = None,
+    ) -> Path:
+        video_id = youtube.extract_video_id(url)
+        if video_id is None:
+            return self._source.download_audio(url, output_dir, on_progress)
+
+        cached = self._cache.get(video_id, self._format, output_dir)
+        if cached is not None:
+            if on_progress:
+                on_progress(100.0, "cached")
+            return cached
+
+        source_path = self._source.download_audio(url, output_dir, on_progress)
+        try:
+            self._cache.put(video_id, self._format, source_path)
+        except OSError:
+            # A full or read-only cache only costs the next run a download.
+            pass
+        return source_path
+
+
+def cached_source(
+    source: MediaSource,
+    spec: str,
+    root: Path | None = None,
+    max_bytes: int = DEFAULT_CACHE_BYTES,
+) -> MediaSource:
+    # A local directory is already a cache of its own.
+    if max_bytes <= 0 or isinstance(source, LocalDirectorySource):
+        return source
+    # Mirrors serve one file per video, so the spec stands in for the
+    # format.
+    fmt = DOWNLOAD_FORMAT if isinstance(source, YtDlpSource) else spec
+    cache = SourceCache(root or default_cache_dir(), max_bytes)
+    return CachedSource(source, cache, fmt)
@@ -0,0 +1,178 @@
+import argparse
+import http.client
+import json
+import sys
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from .jobs import default_db_path
+from .server import DEFAULT_HOST, DEFAULT_PORT, read_token, token_path
+
+DEFAULT_URL = f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+
+# Where a server with the default --db keeps its token.
+def default_token_path() -> Path:
+    return token_path(default_db_path())
+
+
+# Talks to a job server (python -m yt_chapter_extractor.server). Jobs come
+# back as the dicts the server sends; failures raise RuntimeError with the
+# server's message. token is the one from the server's token file.
+class JobClient:
+    def __init__(
+        self,
+        base_url: str = DEFAULT_URL,
+        token: str = "",
+        timeout: float = 10.0,
+    ):
+        self._base_url = base_url.rstrip("/")
+        self._token = token
+        self._timeout = timeout
+
+    @property
+    def base_url(self) -> str:
+        return self._base_url
+
+    def submit(
+        self, kind: str, payload: dict, priority: int | str = "normal"
+    ) -> dict:
+        return self._request(
+            "POST",
+            "/jobs",
+            {"kind": kind, "payload": payload, "priority": priority},
+        )
+
+    def get(self, job_id: int) -> dict:
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def list(self, state: str | None = None) -> list[dict]:
+        query = f"?{urlencode({'state': state})}" if state else ""
+        return self._request("GET", f"/jobs{query}")["jobs"]
+
+    def cancel(self, job_id: int) -> dict:
+        return self._request("POST", f"/jobs/{job_id}/cancel")
+
+    def _request(self, method: str, path: str, body: dict | None = None):
+        data = json.dumps(body).encode() if body is not None else None
+        request = Request(
+            self._base_url + path,
+            data=data,
+            method=method,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {self._token}",
+            },
+        )
+        try:
+            with urlopen(request, timeout=self._timeout) as response:
+                return json.load(response)
+        except HTTPError as e:
+            try:
+                message = json.load(e).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise RuntimeError(message) from None
+        except URLError as e:
+            raise RuntimeError(
+                f"Cannot reach job server at {self._base_url}: {e.reason}"
+            ) from None
+        except (OSError, http.client.HTTPException) as e:
+            # Timeouts and dropped connections after the request was sent.
+            raise RuntimeError(
+                f"Job server at {self._base_url} did not answer: {e!r}"
+            ) from None
+
+
+def _format_job(job: dict) -> str:
+    progress = f"{job['done']}/{job['total']}"
+    if job["failed"]:
+        progress += f", {job['failed']} failed"
+    line = f"{job['id']:>5}  {job['kind']:<9} {job['state']:<9} {progress}"
+    if job["message"]:
+        line += f"  {job['message']}"
+    return line
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="yt-chapter-extractor-jobs")
+    parser.add_argument(
+        "--server",
+        default=DEFAULT_URL,
+        help=f"job server URL (default: {DEFAULT_URL})",
+    )
+    parser.add_argument(
+        "--token-file",
+        type=Path,
+        default=None,
+        help=(
+            "the server's token file (default: jobs.token next to the "
+            "default job database)"
+        ),
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    submit = commands.add_parser(
+        "submit", help="submit a manifest (extract) or files (normalize)"
+    )
+    submit.add_argument("kind", choices=("extract", "normalize"))
+    submit.add_argument(
+        "payload",
+        type=Path,
+        help=(
+            "JSON file: a manifest for extract, or "
+            '{"files": [...], "target_lufs": ..., "mode": ...} for normalize'
+        ),
+    )
+    submit.add_argument(
+        "--priority",
+        default="bulk",
+        help="bulk (default), normal, interactive, or a number",
+    )
+
+    listing = commands.add_parser("list", help="list recent jobs")
+    listing.add_argument("--state", default=None)
+
+    status = commands.add_parser("status", help="show one job")
+    status.add_argument("job_id", type=int)
+
+    cancel = commands.add_parser("cancel", help="cancel a job")
+    cancel.add_argument("job_id", type=int)
+
+    args = parser.parse_args()
+
+    try:
+        client = JobClient(
+            args.server, read_token(args.token_file or default_token_path())
+        )
+        if args.command == "submit":
+            payload = json.loads(args.payload.read_text(encoding="utf-8"))
+            priority = (
+                int(args.priority)
+                if args.priority.lstrip("-").isdigit()
+                else args.priority
+            )
+            job = client.submit(args.kind, payload, priority)
+            print(f"Submitted job {job['id']}")
+        elif args.command == "list":
+            for job in client.list(args.state):
+                print(_format_job(job))
+        else:
+            if args.command == "status":
+                job = client.get(args.job_id)
+            else:
+                job = client.cancel(args.job_id)
+            print(_format_job(job))
+            for error in job["errors"]:
+                print(f"  {error}")
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    except RuntimeError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from contextlib import asynccontextmanager
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+CPU_COUNT = os.cpu_count() or 4
+DEFAULT_LIMIT = min(CPU_COUNT, 8)
+MAX_LIMIT = min(CPU_COUNT * 4, 32)
+
+# A window must change throughput by more than this to count as a change
+# rather than a plateau.
+_THRESHOLD = 0.05
+_WINDOW_SECONDS = 2.0
+_CPU_SATURATED = 0.9
+_LOAD_SATURATED = 2.0
+
+
+# Longest-processing-time-first: starting the most expensive jobs first keeps
+# one large file from running alone on a single worker at the end.
+def longest_first(items: Iterable[T], cost: Callable[[T], float]) -> list[T]:
+    return sorted(items, key=cost, reverse=True)
+
+
+def _cpu_seconds() -> float:
+    # Includes reaped children, i.e. the ffmpeg processes jobs wait on.
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _load_per_cpu() -> float:
+    try:
+        return os.getloadavg()[0] / CPU_COUNT
+    except (AttributeError, OSError):
+        return 0.0
+
+
+# Caps in-flight jobs and hill-climbs the cap on measured throughput. After
+# each window of completions the limit moves one step in the direction that
+# last improved jobs/s, reverses when throughput drops, and backs off when it
+# plateaus. It never grows while the host is CPU saturated. Waiting jobs are
+# admitted highest priority (estimated cost) first, in arrival order on ties.
+# It is an asyncio primitive: jobs wait as tasks on the event loop rather
+# than as blocked threads.
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        initial: int = DEFAULT_LIMIT,
+        min_limit: int = 1,
+        max_limit: int = MAX_LIMIT,
+        on_adjust: Callable[[int, float], None] | None = None,
+    ) -> None:
+        self._min = min_limit
+        self._max = max(max_limit, min_limit)
+        self._limit = min(max(initial, self._min), self._max)
+        self._on_adjust = on_adjust
+        self._in_flight = 0
+        self._completed = 0
+        self._window_start = time.monotonic()
+        self._window_cpu = _cpu_seconds()
+        self._last_rate: float | None = None
+        self._direction = 1
+        self._waiting: list[tuple[float, int, asyncio.Future]] = []
+        self._tickets = itertools.count()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    async def acquire(self, priority: float = 0.0) -> None:
+        if self._in_flight < self._limit and not self._waiting:
+            self._in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (-priority, next(self._tickets), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Cancelled just after being admitted: hand the slot on.
+            if future.done() and not future.cancelled():
+                self._in_flight -= 1
+                self._admit()
+            raise
+
+    def release(self, completed: int = 1) -> None:
+        self._in_flight -= 1
+        self._completed += completed
+        adjusted = self._adjust()
+        self._admit()
+
+        if adjusted is not None and self._on_adjust is not None:
+            self._on_adjust(*adjusted)
+
+    def _admit(self) -> None:
+        while self._waiting and self._in_flight < self._limit:
+            _, _, future = heapq.heappop(self._waiting)
+            if future.done():
+                continue
+            future.set_result(None)
+            self._in_flight += 1
+
+    @asynccontextmanager
+    async def slot(
+        self, completed: int = 1, priority: float = 0.0
+    ) -> AsyncIterator[None]:
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(completed)
+
+    async def run(
+        self,
+        func: Callable[..., Awaitable[T]],
+        *args: Any,
+        completed: int = 1,
+        priority: float = 0.0,
+    ) -> T:
+        async with self.slot(completed, priority):
+            return await func(*args)
+
+    def _adjust(self) -> tuple[int, float] | None:
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < _WINDOW_SECONDS or self._completed < self._limit:
+            return None
+
+        cpu = _cpu_seconds()
+        utilization = (cpu - self._window_cpu) / elapsed / CPU_COUNT
+        saturated = (
+            utilization >= _CPU_SATURATED or _load_per_cpu() >= _LOAD_SATURATED
+        )
+        rate = self._completed / elapsed
+
+        if self._last_rate is None:
+            step = 1
+        elif rate > self._last_rate * (1 + _THRESHOLD):
+            step = self._direction
+        elif rate < self._last_rate * (1 - _THRESHOLD):
+            step = -self._direction
+        else:
+            # Same throughput with fewer jobs in flight is cheaper.
+            step = -1
+        if step > 0 and saturated:
+            step = 0
+        elif step > 0 and self._last_rate is not None:
+            # Keep climbing faster while each step still pays off.
+            step = max(1, self._limit // 4)
+
+        self._window_start = now
+        self._window_cpu = cpu
+        self._completed = 0
+        self._last_rate = rate
+        if step:
+            self._direction = 1 if step > 0 else -1
+
+        limit = min(max(self._limit + step, self._min), self._max)
+        if limit == self._limit:
+            return None
+        self._limit = limit
+        return limit, rate
@@ -0,0 +1,74 @@
+import concurrent.futures
+import multiprocessing
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stderr
+
+# Pools for Python-side CPU work. ffmpeg-bound jobs only wait on a
+# subprocess and belong on threads; anything that computes in-process is
+# serialized by the GIL on threads and needs processes, subinterpreters
+# (Python 3.14+), or a free-threaded build instead.
+EXECUTOR_KINDS = ("auto", "thread", "process", "interpreter")
+
+
+def gil_enabled() -> bool:
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled() if is_gil_enabled is not None else True
+
+
+def interpreters_available() -> bool:
+    return hasattr(concurrent.futures, "InterpreterPoolExecutor")
+
+
+# NumPy, like most extension modules, refuses to load in a subinterpreter,
+# so pools for NumPy work (the native meter) use processes instead.
+def resolve_executor_kind(kind: str, uses_numpy: bool = False) -> str:
+    if kind not in EXECUTOR_KINDS:
+        raise ValueError(
+            f"Unknown executor kind: {kind!r} "
+            f"(expected one of {', '.join(EXECUTOR_KINDS)})"
+        )
+    if kind == "auto":
+        return "process" if gil_enabled() else "thread"
+    if kind == "interpreter" and (uses_numpy or not interpreters_available()):
+        return "process"
+    return kind
+
+
+def create_executor(
+    kind: str, max_workers: int, uses_numpy: bool = False
+) -> Executor:
+    kind = resolve_executor_kind(kind, uses_numpy)
+
+    if kind == "interpreter":
+        return concurrent.futures.InterpreterPoolExecutor(
+            max_workers=max_workers
+        )
+    if kind == "process":
+        _start_resource_tracker()
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return ThreadPoolExecutor(max_workers=max_workers)
+
+
+# Shuts a pool down without waiting for running jobs. Threads cannot be
+# stopped, but process workers are terminated, and the ffmpeg decoders they
+# read from exit once their output pipe closes.
+def cancel_executor(executor: Executor) -> None:
+    workers = []
+    if isinstance(executor, ProcessPoolExecutor):
+        workers = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for worker in workers:
+        worker.terminate()
+
+
+def _start_resource_tracker() -> None:
+    from multiprocessing import resource_tracker
+
+    # Textual replaces sys.stderr with a capture whose fileno() is -1, which
+    # the resource tracker cannot hand to its child process.
+    with redirect_stderr(sys.__stderr__):
+        resource_tracker.ensure_running()
@@ -0,0 +1,170 @@
+import json
+import math
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+BIN_LU = 0.1
+
+_ABSOLUTE_GATE_LUFS = -70.0
+_RELATIVE_GATE_LU = -10.0
+_BUSY_TIMEOUT_SECONDS = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS histograms (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    data TEXT NOT NULL
+)
+"""
+
+
+def default_histogram_path() -> Path:
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "yt-chapter-extractor" / "loudness.db"
+
+
+def _power_to_lufs(power: float) -> float:
+    return -0.691 + 10 * math.log10(power) if power > 0 else float("-inf")
+
+
+# The 400 ms gating-block powers of a recording, binned by loudness in
+# BIN_LU steps above the absolute gate. Each bin keeps its block count and
+# summed power, so the histogram of a whole recording is the sum of the
+# histograms of its parts, however it was split. Integrated loudness is
+# exact except for the one bin the relative gate falls in, which is kept or
+# dropped as a whole by its mean.
+@dataclass(frozen=True)
+class LoudnessHistogram:
+    # (bin index, block count, power sum), sorted by index.
+    bins: tuple[tuple[int, int, float], ...] = ()
+
+    @classmethod
+    def from_powers(cls, powers: Iterable[float]) -> "LoudnessHistogram":
+        totals: dict[int, tuple[int, float]] = {}
+        for power in powers:
+            lufs = _power_to_lufs(power)
+            if lufs <= _ABSOLUTE_GATE_LUFS:
+                continue
+            index = math.floor((lufs - _ABSOLUTE_GATE_LUFS) / BIN_LU)
+            count, total = totals.get(index, (0, 0.0))
+            totals[index] = (count + 1, total + power)
+        return cls._from_totals(totals)
+
+    @classmethod
+    def merge(
+        cls, histograms: Iterable["LoudnessHistogram"]
+    ) -> "LoudnessHistogram":
+        totals: dict[int, tuple[int, float]] = {}
+        for histogram in histograms:
+            for index, count, power in histogram.bins:
+                before = totals.get(index, (0, 0.0))
+                totals[index] = (before[0] + count, before[1] + power)
+        return cls._from_totals(totals)
+
+    @classmethod
+    def _from_totals(
+        cls, totals: dict[int, tuple[int, float]]
+    ) -> "LoudnessHistogram":
+        return cls(
+            tuple((index, *totals[index]) for index in sorted(totals))
+        )
+
+    @property
+    def blocks(self) -> int:
+        return sum(count for _, count, _ in self.bins)
+
+    def integrated_loudness(self) -> float:
+        blocks = self.blocks
+        if not blocks:
+            return float("-inf")
+
+        total = sum(power for _, _, power in self.bins)
+        relative_gate = _power_to_lufs(total / blocks) + _RELATIVE_GATE_LU
+        kept_blocks = 0
+        kept_power = 0.0
+        for _, count, power in self.bins:
+            if _power_to_lufs(power / count) > relative_gate:
+                kept_blocks += count
+                kept_power += power
+        return _power_to_lufs(kept_power / kept_blocks)
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {"bin_lu": BIN_LU, "bins": [list(b) for b in self.bins]},
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> "LoudnessHistogram":
+        try:
+            data = json.loads(text)
+            if data["bin_lu"] != BIN_LU:
+                raise ValueError(f"bin width {data['bin_lu']} LU")
+            return cls(
+                tuple(
+                    (int(index), int(count), float(power))
+                    for index, count, power in data["bins"]
+                )
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid loudness histogram ({e})") from None
+
+
+# Histograms of measured files, keyed by absolute path. An entry only
+# counts while the file keeps the size and mtime it was measured at, so a
+# normalized or replaced file is measured again instead of read stale.
+# Several measuring processes may write at once; SQLite serializes them.
+class HistogramStore:
+    def __init__(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(path),
+            timeout=_BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,
+        )
+        with self._lock, self._conn:
+            self._conn.execute(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get(self, path: Path) -> LoudnessHistogram | None:
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, data FROM histograms WHERE path = ?",
+                (str(path.resolve()),),
+            ).fetchone()
+        if row is None or (row[0], row[1]) != (st.st_size, st.st_mtime_ns):
+            return None
+        try:
+            return LoudnessHistogram.from_json(row[2])
+        except ValueError:
+            return None
+
+    # stat is taken before decoding, so a file rewritten while it was being
+    # measured does not match its entry afterwards.
+    def put(
+        self, path: Path, histogram: LoudnessHistogram, stat: os.stat_result
+    ) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO histograms (path, size, mtime_ns, data) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    str(path.resolve()),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    histogram.to_json(),
+                ),
+            )
@@ -0,0 +1,589 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import CancelledError
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from .album import GROUP_BY_DIRECTORY, GROUP_BY_TAG, plan_album_gains
+from .audio import apply_gain, normalize_audio, process_track
+from .histogram import default_histogram_path
+from .manifest import parse_manifest, resolve_manifest
+from .models import Chapter, DownloadTask, Mp3FileInfo, TrackInfo
+from .processes import ProcessGroup, terminate_all
+from .sources import MediaSource
+from .staging import StagingArea, estimate_source_bytes
+
+KINDS = ("extract", "normalize")
+PRIORITIES = {"bulk": 0, "normal": 50, "interactive": 100}
+FINISHED_STATES = ("done", "failed", "cancelled")
+NORMALIZE_MODES = ("track", GROUP_BY_TAG, GROUP_BY_DIRECTORY)
+
+_MAX_ERRORS = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    message TEXT NOT NULL DEFAULT '',
+    errors TEXT NOT NULL DEFAULT '[]',
+    error_count INTEGER NOT NULL DEFAULT 0
+)
+"""
+_COLUMNS = (
+    "id, kind, priority, state, payload, created, started, finished, "
+    "total, done, failed, message, errors, error_count"
+)
+
+
+def default_db_path() -> Path:
+    base = os.environ.get("XDG_STATE_HOME") or Path.home() / ".local/state"
+    return Path(base) / "yt-chapter-extractor" / "jobs.db"
+
+
+def parse_priority(value: object) -> int:
+    if isinstance(value, str) and value in PRIORITIES:
+        return PRIORITIES[value]
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    raise ValueError(
+        f"Invalid priority: {value!r} (expected a number or one of "
+        f"{', '.join(PRIORITIES)})"
+    )
+
+
+@dataclass(frozen=True)
+class Job:
+    id: int
+    kind: str
+    priority: int
+    state: str
+    payload: dict
+    created: float
+    started: float | None
+    finished: float | None
+    total: int
+    done: int
+    failed: int
+    message: str
+    # The last _MAX_ERRORS errors, and how many there were in all.
+    errors: tuple[str, ...]
+    error_count: int
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+def _job_from_row(row: tuple) -> Job:
+    return Job(
+        id=row[0],
+        kind=row[1],
+        priority=row[2],
+        state=row[3],
+        payload=json.loads(row[4]),
+        created=row[5],
+        started=row[6],
+        finished=row[7],
+        total=row[8],
+        done=row[9],
+        failed=row[10],
+        message=row[11],
+        errors=tuple(json.loads(row[12])),
+        error_count=row[13],
+    )
+
+
+# The queue lives in SQLite, so submitted jobs survive a restart. Jobs that
+# were running when the server stopped are queued again from the start.
+# Workers take the highest priority first, oldest first on ties.
+class JobStore:
+    def __init__(self, path: Path | str) -> None:
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(
+            str(path), check_same_thread=False, isolation_level=None
+        )
+        self._cond = threading.Condition()
+        self._cancel_listeners: list[Callable[[int], None]] = []
+        with self._cond:
+            self._conn.execute(_SCHEMA)
+            columns = {
+                row[1]
+                for row in self._conn.execute("PRAGMA table_info(jobs)")
+            }
+            if "error_count" not in columns:
+                self._conn.execute(
+                    "ALTER TABLE jobs ADD COLUMN "
+                    "error_count INTEGER NOT NULL DEFAULT 0"
+                )
+            self._conn.execute(
+                "UPDATE jobs SET state = 'queued', started = NULL, "
+                "done = 0, failed = 0, errors = '[]', error_count = 0 "
+                "WHERE state = 'running'"
+            )
+
+    def close(self) -> None:
+        with self._cond:
+            self._conn.close()
+
+    def submit(self, kind: str, payload: dict, priority: int) -> Job:
+        with self._cond:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, priority, state, payload, created) "
+                "VALUES (?, ?, 'queued', ?, ?)",
+                (kind, priority, json.dumps(payload), time.time()),
+            )
+            self._cond.notify()
+            return self._get(cursor.lastrowid)
+
+    def get(self, job_id: int) -> Job | None:
+        with self._cond:
+            return self._get(job_id)
+
+    def list(self, state: str | None = None, limit: int = 100) -> list[Job]:
+        query = f"SELECT {_COLUMNS} FROM jobs"
+        params: tuple = ()
+        if state is not None:
+            query += " WHERE state = ?"
+            params = (state,)
+        query += " ORDER BY id DESC LIMIT ?"
+        with self._cond:
+            rows = self._conn.execute(query, params + (limit,)).fetchall()
+        return [_job_from_row(row) for row in rows]
+
+    def claim(self, timeout: float) -> Job | None:
+        with self._cond:
+            row = self._next_queued()
+            if row is None:
+                self._cond.wait(timeout)
+                row = self._next_queued()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET state = 'running', started = ? WHERE id = ?",
+                (time.time(), row[0]),
+            )
+            return self._get(row[0])
+
+    def progress(
+        self,
+        job_id: int,
+        total: int | None = None,
+        done: int | None = None,
+        failed: int | None = None,
+        message: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        with self._cond:
+            job = self._get(job_id)
+            if job is None:
+                return
+            errors = list(job.errors)
+            error_count = job.error_count
+            if error is not None:
+                errors = (errors + [error])[-_MAX_ERRORS:]
+                error_count += 1
+            self._conn.execute(
+                "UPDATE jobs SET total = ?, done = ?, failed = ?, "
+                "message = ?, errors = ?, error_count = ? WHERE id = ?",
+                (
+                    job.total if total is None else total,
+                    job.done if done is None else done,
+                    job.failed if failed is None else failed,
+                    job.message if message is None else message,
+                    json.dumps(errors),
+                    error_count,
+                    job_id,
+                ),
+            )
+
+    # A cancelled job keeps its state; the worker only notices it.
+    def finish(self, job_id: int, state: str, message: str = "") -> None:
+        with self._cond:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, finished = ?, message = ? "
+                "WHERE id = ? AND state = 'running'",
+                (state, time.time(), message, job_id),
+            )
+
+    def cancel(self, job_id: int) -> Job | None:
+        with self._cond:
+            was_running = self._conn.execute(
+                "SELECT 1 FROM jobs WHERE id = ? AND state = 'running'",
+                (job_id,),
+            ).fetchone()
+            self._conn.execute(
+                "UPDATE jobs SET state = 'cancelled', finished = ? "
+                "WHERE id = ? AND state IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+            job = self._get(job_id)
+        if was_running:
+            for listener in list(self._cancel_listeners):
+                listener(job_id)
+        return job
+
+    # Called with the id of each running job that is cancelled, so whoever
+    # runs it can stop its work right away.
+    def add_cancel_listener(self, listener: Callable[[int], None]) -> None:
+        self._cancel_listeners.append(listener)
+
+    def is_cancelled(self, job_id: int) -> bool:
+        job = self.get(job_id)
+        return job is None or job.state == "cancelled"
+
+    def _get(self, job_id: int) -> Job | None:
+        row = self._conn.execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return _job_from_row(row) if row is not None else None
+
+    def _next_queued(self) -> tuple | None:
+        return self._conn.execute(
+            "SELECT id FROM jobs WHERE state = 'queued' "
+            "ORDER BY priority DESC, id LIMIT 1"
+        ).fetchone()
+
+
+# What a running job reports through. check() raises once the job has been
+# cancelled, so work stops at the next step boundary or download progress
+# update. The job's ffmpeg runs under group, which cancelling kills.
+class JobContext:
+    def __init__(
+        self, store: JobStore, job_id: int, group: ProcessGroup
+    ) -> None:
+        self._store = store
+        self._job_id = job_id
+        self.group = group
+
+    def check(self) -> None:
+        if self._store.is_cancelled(self._job_id):
+            raise CancelledError()
+
+    def progress(self, **fields) -> None:
+        self._store.progress(self._job_id, **fields)
+
+    def on_download_progress(self, pct: float, speed: str) -> None:
+        self.check()
+
+
+def task_to_dict(task: DownloadTask) -> dict:
+    return {
+        "url": task.url,
+        "target_lufs": task.target_lufs,
+        "source_duration": task.source_duration,
+        "tracks": [
+            {
+                "chapter": asdict(track.chapter),
+                "filename": track.filename,
+                "title": track.title,
+                "artist": track.artist,
+                "album": track.album,
+                "total_tracks": track.total_tracks,
+            }
+            for track in task.tracks
+        ],
+    }
+
+
+def task_from_dict(data: dict) -> DownloadTask:
+    try:
+        return DownloadTask(
+            url=str(data["url"]),
+            tracks=tuple(
+                TrackInfo(
+                    chapter=Chapter(**track["chapter"]),
+                    filename=str(track["filename"]),
+                    title=str(track.get("title", "")),
+                    artist=str(track.get("artist", "")),
+                    album=str(track.get("album", "")),
+                    total_tracks=int(track.get("total_tracks", 0)),
+                )
+                for track in data["tracks"]
+            ),
+            target_lufs=data.get("target_lufs"),
+            source_duration=float(data.get("source_duration") or 0.0),
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid task: {e}") from None
+
+
+def _file_from_dict(data: object) -> Mp3FileInfo:
+    if isinstance(data, str):
+        data = {"path": data}
+    if not isinstance(data, dict) or not isinstance(data.get("path"), str):
+        raise ValueError("Each file needs a 'path'")
+    path = Path(data["path"])
+    lufs = data.get("loudness_lufs")
+    return Mp3FileInfo(
+        path=path,
+        filename=path.name,
+        size_bytes=0,
+        loudness_lufs=float(lufs) if lufs is not None else None,
+        loudness_estimated=bool(data.get("loudness_estimated", False)),
+    )
+
+
+# Rejects a malformed payload at submission time, so the client gets the
+# error instead of a job that fails later.
+def _check_lufs(value: object, where: str) -> None:
+    if (
+        not isinstance(value, (int, float))
+        or isinstance(value, bool)
+        or not -70.0 <= value <= 0.0
+    ):
+        raise ValueError(f"{where} must be between -70.0 and 0.0 LUFS")
+
+
+def validate_payload(kind: str, payload: object) -> None:
+    if kind not in KINDS:
+        raise ValueError(
+            f"Unknown job kind: {kind!r} (expected one of {', '.join(KINDS)})"
+        )
+    if not isinstance(payload, dict):
+        raise ValueError("Job payload must be an object")
+
+    if kind == "extract":
+        if "tasks" not in payload:
+            parse_manifest(payload)
+            return
+        tasks = payload["tasks"]
+        if not isinstance(tasks, list) or not tasks:
+            raise ValueError("tasks must be a non-empty list")
+        for i, task in enumerate(tasks):
+            if not isinstance(task, dict):
+                raise ValueError(f"tasks[{i}]: expected an object")
+            if task.get("target_lufs") is not None:
+                _check_lufs(task["target_lufs"], f"tasks[{i}].target_lufs")
+            task_from_dict(task)
+        return
+
+    _check_lufs(payload.get("target_lufs"), "target_lufs")
+    if payload.get("mode", "track") not in NORMALIZE_MODES:
+        raise ValueError(
+            f"mode must be one of {', '.join(NORMALIZE_MODES)}"
+        )
+    files = payload.get("files")
+    if not isinstance(files, list) or not files:
+        raise ValueError("files must be a non-empty list")
+    infos = [_file_from_dict(item) for item in files]
+    if payload.get("mode", "track") != "track" and any(
+        info.loudness_estimated for info in infos
+    ):
+        raise ValueError(
+            "Album modes need exact measurements, not loudness_estimated ones"
+        )
+
+
+# Runs jobs with the blocking youtube/audio functions, one job per worker
+# thread. Extraction payloads are either resolved tasks, as the TUI sends
+# them, or a manifest to resolve first.
+class JobRunner:
+    def __init__(
+        self,
+        source: MediaSource,
+        staging: StagingArea,
+        output_dir: Path,
+    ) -> None:
+        self._source = source
+        self._staging = staging
+        self._output_dir = output_dir
+
+    def __call__(self, job: Job, ctx: JobContext) -> str:
+        if job.kind == "extract":
+            return self._extract(job.payload, ctx)
+        return self._normalize(job.payload, ctx)
+
+    def _extract(self, payload: dict, ctx: JobContext) -> str:
+        skipped: list[str] = []
+        if "tasks" in payload:
+            tasks = tuple(task_from_dict(task) for task in payload["tasks"])
+            output_dir = Path(payload.get("output_dir") or self._output_dir)
+        else:
+            ctx.progress(message="Looking up videos...")
+            manifest = parse_manifest(payload)
+            tasks, skipped = resolve_manifest(manifest, self._source)
+            for error in skipped:
+                ctx.progress(error=f"Skipped {error}")
+            output_dir = manifest.output_dir or self._output_dir
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        total = sum(len(task.tracks) for task in tasks)
+        done = failed = 0
+        ctx.progress(total=total, done=0, failed=0)
+
+        # As in DownloadScreen, a source shared by several tasks is
+        # downloaded once.
+        sources: dict[str, list[DownloadTask]] = {}
+        for task in tasks:
+            sources.setdefault(task.url, []).append(task)
+
+        for url, group in sources.items():
+            ctx.check()
+            tracks = [track for task in group for track in task.tracks]
+            seconds = max(task.source_seconds for task in group)
+            with self._staging.acquire(estimate_source_bytes(seconds)) as staged:
+                ctx.progress(message=f"Downloading {url}")
+                try:
+                    source_path = self._source.download_audio(
+                        url, staged.path, ctx.on_download_progress
+                    )
+                    staged.record_source(source_path)
+                except CancelledError:
+                    raise
+                except Exception as e:
+                    failed += len(tracks)
+                    ctx.progress(failed=failed, error=f"{url}: {e}")
+                    continue
+
+                for task in group:
+                    for track in task.tracks:
+                        ctx.check()
+                        ctx.progress(message=f"Processing {track.filename}")
+                        try:
+                            result = process_track(
+                                source_path, track, output_dir, group=ctx.group
+                            )
+                            if task.target_lufs is not None:
+                                normalize_audio(
+                                    result, task.target_lufs, group=ctx.group
+                                )
+                            done += 1
+                            ctx.progress(done=done)
+                        except CancelledError:
+                            raise
+                        except Exception as e:
+                            failed += 1
+                            ctx.progress(
+                                failed=failed, error=f"{track.filename}: {e}"
+                            )
+
+        summary = _summary(done, failed, total)
+        # As with --manifest, a job that could not be resolved fails the run.
+        if skipped:
+            raise RuntimeError(f"{summary}, {len(skipped)} jobs skipped")
+        return summary
+
+    def _normalize(self, payload: dict, ctx: JobContext) -> str:
+        files = tuple(_file_from_dict(item) for item in payload["files"])
+        target = float(payload["target_lufs"])
+        mode = payload.get("mode", "track")
+
+        if mode == "track":
+            jobs = [(info, normalize_audio, target) for info in files]
+        else:
+            jobs = [
+                (info, apply_gain, album.gain_db)
+                for album in plan_album_gains(
+                    files, target, mode, default_histogram_path()
+                )
+                for info in album.tracks
+            ]
+
+        skipped = len(files) - len(jobs)
+        done = 0
+        failed = skipped
+        ctx.progress(total=len(files), done=0, failed=failed)
+        if skipped:
+            ctx.progress(
+                error=f"Skipped {skipped} files without a loudness measurement"
+            )
+
+        for info, func, value in jobs:
+            ctx.check()
+            ctx.progress(message=f"Normalizing {info.filename}")
+            try:
+                func(info.path, value, group=ctx.group)
+                done += 1
+                ctx.progress(done=done)
+            except CancelledError:
+                raise
+            except Exception as e:
+                failed += 1
+                ctx.progress(failed=failed, error=f"{info.filename}: {e}")
+
+        return _summary(done, failed, len(files))
+
+
+def _summary(done: int, failed: int, total: int) -> str:
+    if failed:
+        raise RuntimeError(f"{failed} of {total} failed")
+    return f"{done} of {total} done"
+
+
+# A fixed number of threads, each running one job at a time. Cancelling a
+# running job in the store kills its ffmpeg processes.
+class WorkerPool:
+    def __init__(
+        self,
+        store: JobStore,
+        runner: Callable[[Job, JobContext], str],
+        workers: int,
+    ) -> None:
+        self._store = store
+        self._runner = runner
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._groups: dict[int, ProcessGroup] = {}
+        store.add_cancel_listener(self._cancel)
+        self._threads = [
+            threading.Thread(
+                target=self._work, name=f"job-worker-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    # Kills the ffmpeg of running jobs. They stay "running" in the store
+    # and are queued again when it is next opened.
+    def stop(self, timeout: float | None = None) -> None:
+        self._stopped.set()
+        terminate_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _cancel(self, job_id: int) -> None:
+        with self._lock:
+            group = self._groups.get(job_id)
+        if group is not None:
+            group.cancel()
+
+    def _work(self) -> None:
+        while not self._stopped.is_set():
+            job = self._store.claim(timeout=0.5)
+            if job is None:
+                continue
+
+            group = ProcessGroup()
+            with self._lock:
+                self._groups[job.id] = group
+            try:
+                message = self._runner(
+                    job, JobContext(self._store, job.id, group)
+                )
+            except CancelledError:
+                continue
+            except Exception as e:
+                if self._stopped.is_set():
+                    return
+                self._store.finish(job.id, "failed", str(e))
+            else:
+                self._store.finish(job.id, "done", message)
+            finally:
+                with self._lock:
+                    del self._groups[job.id]
@@ -0,0 +1,297 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError:  # pragma: no cover - optional dependency
+    yaml = None
+
+from .models import (
+    Chapter,
+    DownloadTask,
+    PlaylistInfo,
+    TrackInfo,
+    VideoInfo,
+)
+from .sources import MediaSource
+from .youtube import is_playlist_url, sanitize_filename
+
+# Metadata lookups only wait on the network.
+_MAX_LOOKUPS = 8
+
+# A manifest describes many extractions at once:
+#
+#   target_lufs: -19.0          # default for every job; omit to skip
+#   output_dir: ./output        # default: ./output
+#   jobs:
+#     - url: https://www.youtube.com/watch?v=...
+#       chapters: [1, 3, {number: 5, title: Finale, filename: 05 Finale}]
+#       artist: ...
+#       album: ...
+#       target_lufs: -16.0
+#     - url: https://www.youtube.com/playlist?list=...
+#       entries: [1, 2, 7]
+#
+# Chapter and entry numbers are 1-based, and all of them are taken when the
+# list is omitted. A video without chapters is a single track.
+
+
+@dataclass(frozen=True)
+class TrackSpec:
+    number: int
+    title: str = ""
+    filename: str = ""
+
+
+@dataclass(frozen=True)
+class ManifestJob:
+    url: str
+    tracks: tuple[TrackSpec, ...] = ()
+    artist: str = ""
+    album: str = ""
+    target_lufs: float | None = None
+
+
+@dataclass(frozen=True)
+class Manifest:
+    jobs: tuple[ManifestJob, ...]
+    output_dir: Path | None = None
+
+
+def load_manifest(path: Path) -> Manifest:
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() in (".yaml", ".yml"):
+        if yaml is None:
+            raise ValueError(
+                "YAML manifests need PyYAML (uv sync --extra manifest-yaml)"
+            )
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Invalid YAML: {e}") from None
+    else:
+        data = json.loads(text)
+    return parse_manifest(data, base_dir=path.parent)
+
+
+def parse_manifest(data: object, base_dir: Path = Path(".")) -> Manifest:
+    if not isinstance(data, dict) or not isinstance(data.get("jobs"), list):
+        raise ValueError("Manifest must be a mapping with a 'jobs' list")
+
+    default_target = _optional_lufs(data.get("target_lufs"), "target_lufs")
+    jobs = tuple(
+        _parse_job(raw, default_target, f"jobs[{i}]")
+        for i, raw in enumerate(data["jobs"])
+    )
+    if not jobs:
+        raise ValueError("Manifest has no jobs")
+
+    output_dir = data.get("output_dir")
+    return Manifest(
+        jobs=jobs,
+        output_dir=(
+            base_dir / Path(output_dir).expanduser()
+            if output_dir is not None
+            else None
+        ),
+    )
+
+
+def _parse_job(
+    raw: object, default_target: float | None, where: str
+) -> ManifestJob:
+    if not isinstance(raw, dict) or not isinstance(raw.get("url"), str):
+        raise ValueError(f"{where}: each job needs a 'url'")
+
+    url = raw["url"].strip()
+    if is_playlist_url(url):
+        key, other, kind = "entries", "chapters", "a playlist"
+    else:
+        key, other, kind = "chapters", "entries", "a video"
+    # Ignoring the other key would select everything instead.
+    if other in raw:
+        raise ValueError(f"{where}.{other}: this URL is {kind}; use '{key}'")
+    selection = raw.get(key) or []
+    if not isinstance(selection, list):
+        raise ValueError(f"{where}.{key}: expected a list")
+
+    target = (
+        _optional_lufs(raw["target_lufs"], f"{where}.target_lufs")
+        if "target_lufs" in raw
+        else default_target
+    )
+    return ManifestJob(
+        url=url,
+        tracks=tuple(
+            _parse_track(item, f"{where}.{key}[{i}]")
+            for i, item in enumerate(selection)
+        ),
+        artist=str(raw.get("artist", "")).strip(),
+        album=str(raw.get("album", "")).strip(),
+        target_lufs=target,
+    )
+
+
+def _parse_track(raw: object, where: str) -> TrackSpec:
+    if isinstance(raw, dict):
+        number = raw.get("number")
+        title = str(raw.get("title", "")).strip()
+        filename = str(raw.get("filename", "")).strip()
+    else:
+        number, title, filename = raw, "", ""
+
+    if not isinstance(number, int) or isinstance(number, bool) or number < 1:
+        raise ValueError(f"{where}: expected a number from 1")
+    return TrackSpec(number, title, filename)
+
+
+def _optional_lufs(value: object, where: str) -> float | None:
+    if value is None:
+        return None
+    try:
+        lufs = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{where}: expected a number") from None
+    if not -70.0 <= lufs <= 0.0:
+        raise ValueError(f"{where}: must be between -70.0 and 0.0 LUFS")
+    return lufs
+
+
+# Looks up every distinct URL once, in parallel, and turns the jobs into
+# download tasks. Jobs whose lookup or selection fails are reported and
+# left out; two tracks with the same output file fail the whole manifest.
+# Tasks may share a source URL; DownloadScreen downloads each source once
+# for all of them.
+def resolve_manifest(
+    manifest: Manifest, source: MediaSource
+) -> tuple[tuple[DownloadTask, ...], list[str]]:
+    urls = list(dict.fromkeys(job.url for job in manifest.jobs))
+
+    def lookup(url: str) -> VideoInfo | PlaylistInfo | Exception:
+        try:
+            if is_playlist_url(url):
+                return source.extract_playlist_info(url)
+            return source.extract_video_info(url)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=_MAX_LOOKUPS) as pool:
+        infos = dict(zip(urls, pool.map(lookup, urls)))
+
+    tasks: list[DownloadTask] = []
+    errors: list[str] = []
+    for job in manifest.jobs:
+        info = infos[job.url]
+        try:
+            if isinstance(info, Exception):
+                raise info
+            if isinstance(info, PlaylistInfo):
+                tasks += playlist_tasks(job, info)
+            else:
+                tasks.append(_video_task(job, info))
+        except Exception as e:
+            errors.append(f"{job.url}: {e}")
+
+    # Every track lands in the same output directory.
+    seen: set[str] = set()
+    for task in tasks:
+        for track in task.tracks:
+            if track.filename in seen:
+                raise ValueError(
+                    f"{track.filename}.mp3 is written by more than one "
+                    "track; give one of them a distinct filename"
+                )
+            seen.add(track.filename)
+
+    return tuple(tasks), errors
+
+
+def _video_task(job: ManifestJob, info: VideoInfo) -> DownloadTask:
+    chapters = info.chapters or (
+        Chapter(
+            index=0,
+            title=info.title,
+            start_time=0.0,
+            end_time=info.duration,
+        ),
+    )
+    specs = job.tracks or tuple(TrackSpec(i + 1) for i in range(len(chapters)))
+    tracks = []
+    for spec in specs:
+        if spec.number > len(chapters):
+            raise ValueError(
+                f"chapter {spec.number} does not exist "
+                f"(the video has {len(chapters)})"
+            )
+        tracks.append(
+            _track(job, spec, chapters[spec.number - 1], len(chapters))
+        )
+    return DownloadTask(
+        url=info.url,
+        tracks=tuple(tracks),
+        target_lufs=job.target_lufs,
+        source_duration=info.duration,
+    )
+
+
+def playlist_tasks(
+    job: ManifestJob, info: PlaylistInfo
+) -> list[DownloadTask]:
+    specs = job.tracks or tuple(
+        TrackSpec(i + 1) for i in range(len(info.entries))
+    )
+    album_job = job if job.album else _with_album(job, info.title)
+    tasks = []
+    for spec in specs:
+        if spec.number > len(info.entries):
+            raise ValueError(
+                f"entry {spec.number} does not exist "
+                f"(the playlist has {len(info.entries)})"
+            )
+        entry = info.entries[spec.number - 1]
+        chapter = Chapter(
+            index=entry.index,
+            title=entry.title,
+            start_time=0.0,
+            end_time=entry.duration,
+        )
+        tasks.append(
+            DownloadTask(
+                url=entry.url,
+                tracks=(_track(album_job, spec, chapter, len(info.entries)),),
+                target_lufs=job.target_lufs,
+                source_duration=entry.duration,
+            )
+        )
+    return tasks
+
+
+def _with_album(job: ManifestJob, album: str) -> ManifestJob:
+    return ManifestJob(
+        url=job.url,
+        tracks=job.tracks,
+        artist=job.artist,
+        album=album,
+        target_lufs=job.target_lufs,
+    )
+
+
+# Same naming as the metadata screen: "<album> <title>" unless a filename
+# is given.
+def _track(
+    job: ManifestJob, spec: TrackSpec, chapter: Chapter, total: int
+) -> TrackInfo:
+    title = spec.title or chapter.title
+    filename = spec.filename or (
+        f"{job.album} {title}".strip() if job.album else title
+    )
+    return TrackInfo(
+        chapter=chapter,
+        filename=sanitize_filename(filename),
+        title=title,
+        artist=job.artist,
+        album=job.album,
+        total_tracks=total,
+    )
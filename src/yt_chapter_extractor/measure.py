@@ -0,0 +1,135 @@
+import asyncio
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from pathlib import Path
+
+from .audio import (
+    estimate_loudness,
+    estimate_loudness_async,
+    measure_loudness,
+    measure_loudness_async,
+    measure_loudness_batch,
+    measure_loudness_batch_async,
+)
+from .histogram import HistogramStore, LoudnessHistogram
+from .meter import (
+    SEGMENT_SECONDS,
+    gated_loudness,
+    measure_block_powers,
+    measure_block_powers_segmented,
+)
+
+METERS = ("ffmpeg", "native", "quick")
+
+
+# Jobs may run in another process or interpreter, so everything crossing the
+# pool boundary is a small picklable record instead of a model object.
+@dataclass(frozen=True, slots=True)
+class LoudnessResult:
+    path: Path
+    lufs: float | None
+    estimated: bool = False
+    error: str = ""
+
+
+def _batch_results(
+    paths: tuple[Path, ...], measured: dict[Path, float]
+) -> list[LoudnessResult]:
+    return [
+        LoudnessResult(path, measured[path])
+        if path in measured
+        else LoudnessResult(path, None, error="measurement failed")
+        for path in paths
+    ]
+
+
+def _store_histogram(histograms: Path, path: Path, powers, stat) -> None:
+    store = HistogramStore(histograms)
+    try:
+        store.put(path, LoudnessHistogram.from_powers(powers.tolist()), stat)
+    finally:
+        store.close()
+
+
+# The value is gated from the exact block powers. The histogram kept for
+# album loudness is only used where files are combined.
+def _measure_native(path: Path, histograms: Path | None) -> float:
+    stat = path.stat()
+    powers = measure_block_powers(path)
+    if histograms is not None:
+        _store_histogram(histograms, path, powers, stat)
+    return gated_loudness(powers)
+
+
+def _measure_one(
+    meter: str, path: Path, histograms: Path | None = None
+) -> LoudnessResult:
+    try:
+        if meter == "quick":
+            lufs, estimated = estimate_loudness(path)
+        elif meter == "native":
+            lufs, estimated = _measure_native(path, histograms), False
+        else:
+            lufs, estimated = measure_loudness(path), False
+    except Exception as e:
+        return LoudnessResult(path, None, error=str(e))
+    return LoudnessResult(path, lufs, estimated)
+
+
+# histograms is the path of a HistogramStore that native measurements are
+# recorded in.
+def measure_files(
+    meter: str, paths: tuple[Path, ...], histograms: Path | None = None
+) -> list[LoudnessResult]:
+    if meter == "ffmpeg" and len(paths) > 1:
+        measured = measure_loudness_batch(list(paths))
+        return _batch_results(paths, measured)
+
+    return [_measure_one(meter, path, histograms) for path in paths]
+
+
+# The native meter for one file on an executor. A file longer than one
+# segment is split so its segments run on separate workers.
+async def measure_native_segmented(
+    executor: Executor,
+    path: Path,
+    histograms: Path | None = None,
+    segment_seconds: float = SEGMENT_SECONDS,
+) -> list[LoudnessResult]:
+    try:
+        stat = await asyncio.to_thread(path.stat)
+        powers = await measure_block_powers_segmented(
+            executor, path, segment_seconds
+        )
+        if histograms is not None:
+            await asyncio.to_thread(
+                _store_histogram, histograms, path, powers, stat
+            )
+    except Exception as e:
+        return [LoudnessResult(path, None, error=str(e))]
+    return [LoudnessResult(path, gated_loudness(powers))]
+
+
+async def _measure_one_async(meter: str, path: Path) -> LoudnessResult:
+    try:
+        if meter == "quick":
+            lufs, estimated = await estimate_loudness_async(path)
+        else:
+            lufs, estimated = await measure_loudness_async(path), False
+    except Exception as e:
+        return LoudnessResult(path, None, error=str(e))
+    return LoudnessResult(path, lufs, estimated)
+
+
+# The ffmpeg-backed meters on the event loop. The native meter computes in
+# Python and stays on measure_files in an executor.
+async def measure_files_async(
+    meter: str, paths: tuple[Path, ...]
+) -> list[LoudnessResult]:
+    if meter == "native":
+        raise ValueError("The native meter has no async variant.")
+    if meter == "ffmpeg" and len(paths) > 1:
+        measured = await measure_loudness_batch_async(list(paths))
+        return _batch_results(paths, measured)
+
+    return [await _measure_one_async(meter, path) for path in paths]
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import math
+import subprocess
+import sys
+from concurrent.futures import Executor
+from functools import cache
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+import mutagen
+
+from . import processes
+from .audio import measure_loudness, mp3_duration
+from .concurrency import DEFAULT_LIMIT
+from .executors import create_executor
+
+# ITU-R BS.1770-4 in-process integrated loudness. Decoding still goes through
+# ffmpeg, but as raw float PCM on a pipe: no loudnorm filter graph and no
+# text parsing. K-weighting is applied by FFT overlap-add with the truncated
+# impulse response of the two reference biquads, so filtering is vectorized.
+
+_SAMPLE_RATE = 48000
+
+# Pre-filter (high shelf) and RLB high-pass coefficients at 48 kHz.
+_SHELF_B = (1.53512485958697, -2.69169618940638, 1.19839281085285)
+_SHELF_A = (1.0, -1.69065929318241, 0.73248077421585)
+_HIGHPASS_B = (1.0, -2.0, 1.0)
+_HIGHPASS_A = (1.0, -1.99004745483398, 0.99007225036621)
+
+# The slowest pole has radius ~0.995, so 8192 taps decay below 1e-17.
+_IMPULSE_TAPS = 8192
+_FFT_SIZE = 1 << 19
+_CHUNK_FRAMES = _FFT_SIZE - _IMPULSE_TAPS + 1
+
+_SUBBLOCK_FRAMES = _SAMPLE_RATE // 10
+_SUBBLOCKS_PER_BLOCK = 4
+
+# Long files are measured in segments of this length, one per worker. A
+# segment decodes from two sub-blocks early so the K-weighting filter
+# (whose impulse response is 8192 taps, ~170 ms) has settled by its first
+# block, and three sub-blocks late to complete its last block.
+SEGMENT_SECONDS = 600.0
+_PRE_ROLL_SUBBLOCKS = 2
+_POST_ROLL_SUBBLOCKS = _SUBBLOCKS_PER_BLOCK - 1
+
+_ABSOLUTE_GATE_LUFS = -70.0
+_RELATIVE_GATE_LU = -10.0
+
+# ffmpeg's default 5.1 order is FL FR FC LFE BL BR.
+_SURROUND_WEIGHTS = (1.0, 1.0, 1.0, 0.0, 1.41, 1.41)
+
+_DEFAULT_TOLERANCE_LU = 0.5
+
+
+def native_meter_available() -> bool:
+    return np is not None
+
+
+def _biquad_impulse(b: tuple, a: tuple, x: list[float]) -> list[float]:
+    y: list[float] = []
+    x1 = x2 = y1 = y2 = 0.0
+    for x0 in x:
+        y0 = b[0] * x0 + b[1] * x1 + b[2] * x2 - a[1] * y1 - a[2] * y2
+        y.append(y0)
+        x2, x1 = x1, x0
+        y2, y1 = y1, y0
+    return y
+
+
+@cache
+def _k_weighting_response():
+    delta = [1.0] + [0.0] * (_IMPULSE_TAPS - 1)
+    impulse = _biquad_impulse(
+        _HIGHPASS_B, _HIGHPASS_A, _biquad_impulse(_SHELF_B, _SHELF_A, delta)
+    )
+    return np.fft.rfft(np.asarray(impulse), _FFT_SIZE)
+
+
+def _channel_weights(channels: int):
+    if channels == len(_SURROUND_WEIGHTS):
+        return np.asarray(_SURROUND_WEIGHTS)
+    return np.ones(channels)
+
+
+class LoudnessMeter:
+    def __init__(self, channels: int) -> None:
+        if np is None:
+            raise RuntimeError("The native loudness meter requires numpy.")
+        self._channels = channels
+        self._response = _k_weighting_response()
+        self._tail = np.zeros((_IMPULSE_TAPS - 1, channels))
+        self._pending = np.zeros((0, channels))
+        self._energies: list = []
+
+    def feed(self, samples) -> None:
+        frames = len(samples)
+        if frames == 0:
+            return
+
+        spectrum = np.fft.rfft(samples, _FFT_SIZE, axis=0)
+        filtered = np.fft.irfft(
+            spectrum * self._response[:, None], _FFT_SIZE, axis=0
+        )[: frames + _IMPULSE_TAPS - 1]
+        filtered[: _IMPULSE_TAPS - 1] += self._tail
+        self._tail = filtered[frames:].copy()
+
+        weighted = np.concatenate((self._pending, filtered[:frames]))
+        whole = len(weighted) // _SUBBLOCK_FRAMES * _SUBBLOCK_FRAMES
+        if whole:
+            squares = np.square(weighted[:whole]).reshape(
+                -1, _SUBBLOCK_FRAMES, self._channels
+            )
+            self._energies.append(squares.mean(axis=1))
+        self._pending = weighted[whole:]
+
+    # Power of each 400 ms gating block, starting one per 100 ms sub-block.
+    # skip leaves out blocks that start in the first sub-blocks fed.
+    def block_powers(self, skip: int = 0):
+        if not self._energies:
+            return np.zeros(0)
+
+        subblocks = np.concatenate(self._energies)[skip:]
+        if len(subblocks) < _SUBBLOCKS_PER_BLOCK:
+            return np.zeros(0)
+
+        # 400 ms gating blocks with 75% overlap are the mean of four
+        # consecutive 100 ms sub-blocks.
+        windows = np.lib.stride_tricks.sliding_window_view(
+            subblocks, _SUBBLOCKS_PER_BLOCK, axis=0
+        )
+        return windows.mean(axis=-1) @ _channel_weights(self._channels)
+
+    def integrated_loudness(self) -> float:
+        powers = self.block_powers()
+        if len(powers) == 0:
+            return float("-inf")
+        return gated_loudness(powers)
+
+
+def _power_to_lufs(power) -> float:
+    return -0.691 + 10 * math.log10(power) if power > 0 else float("-inf")
+
+
+def gated_loudness(block_powers) -> float:
+    with np.errstate(divide="ignore"):
+        block_lufs = -0.691 + 10 * np.log10(block_powers)
+
+    gated = block_powers[block_lufs > _ABSOLUTE_GATE_LUFS]
+    if len(gated) == 0:
+        return float("-inf")
+
+    relative_gate = _power_to_lufs(gated.mean()) + _RELATIVE_GATE_LU
+    gated = block_powers[
+        (block_lufs > _ABSOLUTE_GATE_LUFS) & (block_lufs > relative_gate)
+    ]
+    return _power_to_lufs(gated.mean())
+
+
+def _channel_count(path: Path) -> int:
+    try:
+        audio = mutagen.File(str(path))
+    except mutagen.MutagenError:
+        audio = None
+    channels = getattr(getattr(audio, "info", None), "channels", 0)
+    return channels if channels and channels > 0 else 2
+
+
+def _decode(
+    path: Path, channels: int, start_seconds: float, duration: float | None
+) -> LoudnessMeter:
+    cmd = ["ffmpeg", "-v", "error"]
+    if start_seconds:
+        cmd += ["-ss", f"{start_seconds:.3f}"]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.3f}"]
+    cmd += [
+        "-i", str(path),
+        "-map", "0:a:0",
+        "-ac", str(channels),
+        "-ar", str(_SAMPLE_RATE),
+        "-f", "f32le",
+        "-",
+    ]
+
+    meter = LoudnessMeter(channels)
+    frame_bytes = 4 * channels
+    with processes.popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    ) as proc:
+        while data := proc.stdout.read(_CHUNK_FRAMES * frame_bytes):
+            usable = len(data) // frame_bytes * frame_bytes
+            samples = np.frombuffer(data[:usable], dtype="<f4")
+            meter.feed(samples.reshape(-1, channels).astype(np.float64))
+        stderr = proc.stderr.read().decode(errors="replace")
+
+    if proc.returncode != 0:
+        raise RuntimeError(
+            f"ffmpeg decode failed for {path.name}: {stderr[:200]}"
+        )
+    return meter
+
+
+def measure_loudness_native(path: Path) -> float:
+    if np is None:
+        raise RuntimeError("The native loudness meter requires numpy.")
+
+    return _decode(path, _channel_count(path), 0.0, None).integrated_loudness()
+
+
+# The powers of the gating blocks that start in [first, first + count)
+# sub-blocks into the file, or in the rest of the file if count is None.
+# The blocks of adjacent ranges join up into those of the whole file.
+def measure_block_powers(
+    path: Path, first: int = 0, count: int | None = None
+):
+    if np is None:
+        raise RuntimeError("The native loudness meter requires numpy.")
+
+    pre_roll = min(first, _PRE_ROLL_SUBBLOCKS)
+    start = (first - pre_roll) / 10
+    duration = (
+        None
+        if count is None
+        else (pre_roll + count + _POST_ROLL_SUBBLOCKS) / 10
+    )
+    meter = _decode(path, _channel_count(path), start, duration)
+    powers = meter.block_powers(skip=pre_roll)
+    if count is not None:
+        powers = powers[:count]
+    return powers
+
+
+# Splits a file into (first, count) sub-block ranges for
+# measure_block_powers.
+# The last range runs to the end of the file, since the duration read from
+# the header can be slightly off.
+def segment_ranges(
+    duration: float, segment_seconds: float = SEGMENT_SECONDS
+) -> list[tuple[int, int | None]]:
+    step = max(1, round(segment_seconds * 10))
+    total = math.ceil(duration * 10)
+    ranges: list[tuple[int, int | None]] = [
+        (first, step) for first in range(0, total - step, step)
+    ]
+    ranges.append((len(ranges) * step, None))
+    return ranges
+
+
+# The block powers of a whole file, with each segment measured on its own
+# worker of executor. A few hours of blocks are a few megabytes, so the
+# segments send back their exact powers and the file is gated as one.
+async def measure_block_powers_segmented(
+    executor: Executor, path: Path, segment_seconds: float = SEGMENT_SECONDS
+):
+    loop = asyncio.get_running_loop()
+    duration = await asyncio.to_thread(mp3_duration, path)
+    parts = await asyncio.gather(
+        *(
+            loop.run_in_executor(
+                executor, measure_block_powers, path, first, count
+            )
+            for first, count in segment_ranges(duration, segment_seconds)
+        )
+    )
+    return np.concatenate(parts)
+
+
+def compare_with_ffmpeg(
+    path: Path, executor: Executor | None = None
+) -> tuple[float, float]:
+    if executor is None:
+        native = measure_loudness_native(path)
+    else:
+        powers = asyncio.run(measure_block_powers_segmented(executor, path))
+        native = gated_loudness(powers)
+    return native, measure_loudness(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Compare the native loudness meter with ffmpeg loudnorm."
+    )
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument(
+        "--tolerance", type=float, default=_DEFAULT_TOLERANCE_LU
+    )
+    parser.add_argument(
+        "--segmented",
+        action="store_true",
+        help=(
+            f"measure {SEGMENT_SECONDS:.0f}-second segments in a process "
+            "pool and join their blocks"
+        ),
+    )
+    args = parser.parse_args()
+
+    executor = (
+        create_executor("process", DEFAULT_LIMIT) if args.segmented else None
+    )
+    failed = False
+    for path in args.files:
+        native, reference = compare_with_ffmpeg(path, executor)
+        delta = abs(native - reference)
+        ok = delta <= args.tolerance or native == reference
+        failed |= not ok
+        print(
+            f"{'ok  ' if ok else 'FAIL'} {path.name}: native {native:.2f} "
+            f"ffmpeg {reference:.2f} (delta {delta:.2f} LU)"
+        )
+    if executor is not None:
+        executor.shutdown()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import json
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+# Stage names used by the pipeline. "extract" is one ffmpeg run that seeks,
+# decodes and encodes, so those steps cannot be timed separately.
+STAGES = (
+    "metadata",
+    "download",
+    "queue_wait",
+    "extract",
+    "tag",
+    "normalize",
+    "replace",
+)
+
+
+@dataclass(frozen=True)
+class StageSample:
+    stage: str
+    key: str
+    seconds: float
+    nbytes: int = 0
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+class RunMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: list[StageSample] = []
+        self._started = time.monotonic()
+        self._finished: float | None = None
+        self._tracks = 0
+        self._audio_seconds = 0.0
+
+    def record(
+        self, stage: str, key: str, seconds: float, nbytes: int = 0
+    ) -> None:
+        with self._lock:
+            self._samples.append(StageSample(stage, key, seconds, nbytes))
+
+    @contextmanager
+    def stage(self, stage: str, key: str = "") -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, key, time.perf_counter() - started)
+
+    # Restarts the wall clock. Stage samples taken before, such as the
+    # metadata lookups done while the user was still choosing chapters,
+    # keep their own durations but do not count towards wall time.
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._finished = None
+
+    def track_done(self, audio_seconds: float = 0.0) -> None:
+        with self._lock:
+            self._tracks += 1
+            self._audio_seconds += max(audio_seconds, 0.0)
+
+    def finish(self) -> None:
+        self._finished = time.monotonic()
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = list(self._samples)
+            tracks = self._tracks
+            audio_seconds = self._audio_seconds
+        wall = (self._finished or time.monotonic()) - self._started
+
+        stages = {}
+        for stage in STAGES + tuple(
+            sorted({s.stage for s in samples} - set(STAGES))
+        ):
+            values = sorted(s.seconds for s in samples if s.stage == stage)
+            if not values:
+                continue
+            stages[stage] = {
+                "count": len(values),
+                "total_s": round(sum(values), 4),
+                "p50_s": round(percentile(values, 50), 4),
+                "p95_s": round(percentile(values, 95), 4),
+                "max_s": round(values[-1], 4),
+                "bytes": sum(s.nbytes for s in samples if s.stage == stage),
+            }
+
+        return {
+            "wall_s": round(wall, 3),
+            "tracks": tracks,
+            "tracks_per_min": round(tracks / wall * 60, 2) if wall > 0 else 0.0,
+            "audio_s": round(audio_seconds, 3),
+            "realtime_factor": round(audio_seconds / wall, 2) if wall > 0 else 0.0,
+            "stages": stages,
+        }
+
+    def summary_lines(self) -> list[str]:
+        summary = self.summary()
+        lines = [
+            f"{summary['tracks']} tracks in {summary['wall_s']:.1f}s: "
+            f"{summary['tracks_per_min']:.1f} tracks/min, "
+            f"{summary['realtime_factor']:.1f}x realtime",
+        ]
+        for stage, stats in summary["stages"].items():
+            lines.append(
+                f"  {stage:<10} n={stats['count']:<4} "
+                f"p50 {stats['p50_s']:.2f}s  p95 {stats['p95_s']:.2f}s  "
+                f"total {stats['total_s']:.1f}s"
+            )
+        return lines
+
+    def to_openmetrics(self) -> str:
+        summary = self.summary()
+        lines = [
+            "# TYPE ytce_stage_seconds summary",
+            "# UNIT ytce_stage_seconds seconds",
+        ]
+        for stage, stats in summary["stages"].items():
+            for quantile, key in (("0.5", "p50_s"), ("0.95", "p95_s")):
+                lines.append(
+                    f'ytce_stage_seconds{{stage="{stage}",quantile="{quantile}"}} '
+                    f"{stats[key]}"
+                )
+            lines.append(
+                f'ytce_stage_seconds_sum{{stage="{stage}"}} {stats["total_s"]}'
+            )
+            lines.append(
+                f'ytce_stage_seconds_count{{stage="{stage}"}} {stats["count"]}'
+            )
+        lines += [
+            "# TYPE ytce_stage_bytes counter",
+            *(
+                f'ytce_stage_bytes_total{{stage="{stage}"}} {stats["bytes"]}'
+                for stage, stats in summary["stages"].items()
+            ),
+            "# TYPE ytce_run_tracks counter",
+            f"ytce_run_tracks_total {summary['tracks']}",
+            "# TYPE ytce_run_wall_seconds gauge",
+            f"ytce_run_wall_seconds {summary['wall_s']}",
+            "# TYPE ytce_run_realtime_factor gauge",
+            f"ytce_run_realtime_factor {summary['realtime_factor']}",
+            "# EOF",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path) -> None:
+        if path.suffix in (".prom", ".txt", ".om"):
+            path.write_text(self.to_openmetrics())
+        else:
+            path.write_text(json.dumps(self.summary(), indent=2) + "\n")
+
+
+@contextmanager
+def timed(
+    metrics: RunMetrics | None, stage: str, key: str = ""
+) -> Iterator[None]:
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(stage, key):
+        yield
@@ -77,6 +77,10 @@ class VideoInfo:
     duration: float
     chapters: tuple[Chapter, ...] = field(default_factory=tuple)
 
+    @property
+    def url(self) -> str:
+        return f"https://www.youtube.com/watch?v={self.video_id}"
+
 
 @dataclass(frozen=True)
 class PlaylistEntry:
@@ -105,6 +109,18 @@ class PlaylistInfo:
 class DownloadTask:
     url: str
     tracks: tuple[TrackInfo, ...]
+    # Overrides the screen-wide normalization target for these tracks.
+    target_lufs: float | None = None
+    # Length of the whole source, which is downloaded in full even when
+    # only some of its chapters are extracted. 0 when unknown.
+    source_duration: float = 0.0
+
+    @property
+    def source_seconds(self) -> float:
+        last_end = max(
+            (track.chapter.end_time for track in self.tracks), default=0.0
+        )
+        return max(self.source_duration, last_end)
 
 
 @dataclass(frozen=True)
@@ -113,11 +129,14 @@ class Mp3FileInfo:
     filename: str
     size_bytes: int
     loudness_lufs: float | None = None
+    loudness_estimated: bool = False
 
     @property
     def loudness_display(self) -> str:
         if self.loudness_lufs is None:
             return "N/A"
+        if self.loudness_estimated:
+            return f"~{self.loudness_lufs:.1f} LUFS (est.)"
         return f"{self.loudness_lufs:.1f} LUFS"
 
     @property
@@ -126,10 +145,13 @@ class Mp3FileInfo:
             return f"{self.size_bytes / (1024 * 1024):.1f} MB"
         return f"{self.size_bytes / 1024:.1f} KB"
 
-    def with_loudness(self, loudness_lufs: float) -> "Mp3FileInfo":
+    def with_loudness(
+        self, loudness_lufs: float, estimated: bool = False
+    ) -> "Mp3FileInfo":
         return Mp3FileInfo(
             path=self.path,
             filename=self.filename,
             size_bytes=self.size_bytes,
             loudness_lufs=loudness_lufs,
+            loudness_estimated=estimated,
         )
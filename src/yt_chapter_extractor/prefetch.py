@@ -0,0 +1,123 @@
+import threading
+from collections.abc import Iterable
+from concurrent.futures import CancelledError, Future
+
+from .sources import MediaSource
+from .staging import StagedSource, StagingArea, estimate_source_bytes
+from .youtube import ProgressCallback
+
+_MAX_PREFETCHED = 2
+
+
+def _release_result(future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().release()
+
+
+# A source downloading before anyone has asked for it. Progress goes to
+# whoever claims it, and a cancelled download stops at its next progress
+# update.
+class Prefetch:
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.future: Future[StagedSource] = Future()
+        self._cancelled = threading.Event()
+        self._listener: ProgressCallback | None = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def listen(self, on_progress: ProgressCallback) -> None:
+        self._listener = on_progress
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def _on_progress(self, pct: float, speed: str) -> None:
+        if self._cancelled.is_set():
+            raise CancelledError()
+        listener = self._listener
+        if listener is not None:
+            listener(pct, speed)
+
+
+# Starts downloading sources while the user is still picking chapters and
+# editing metadata. At most max_prefetched sources are held at once, and
+# their bytes count against the staging budget like any other download.
+# DownloadScreen claims a prefetch by URL and owns its staged source from
+# then on; unclaimed ones are cancelled and deleted when the user backs out.
+class Prefetcher:
+    def __init__(
+        self,
+        source: MediaSource,
+        staging: StagingArea,
+        max_prefetched: int = _MAX_PREFETCHED,
+    ) -> None:
+        self._source = source
+        self._staging = staging
+        self._max = max_prefetched
+        self._lock = threading.Lock()
+        self._prefetches: dict[str, Prefetch] = {}
+
+    def start(self, url: str, duration: float) -> bool:
+        with self._lock:
+            if url in self._prefetches:
+                return True
+            if len(self._prefetches) >= self._max:
+                return False
+            prefetch = Prefetch(url)
+            self._prefetches[url] = prefetch
+
+        # Daemon threads: a download the user never asks for must not keep
+        # the interpreter alive on exit.
+        threading.Thread(
+            target=self._download,
+            args=(prefetch, duration),
+            name="prefetch",
+            daemon=True,
+        ).start()
+        return True
+
+    def claim(self, url: str) -> Prefetch | None:
+        with self._lock:
+            return self._prefetches.pop(url, None)
+
+    def retain(self, urls: Iterable[str]) -> None:
+        keep = set(urls)
+        with self._lock:
+            dropped = [
+                prefetch
+                for url, prefetch in self._prefetches.items()
+                if url not in keep
+            ]
+            for prefetch in dropped:
+                del self._prefetches[prefetch.url]
+
+        for prefetch in dropped:
+            prefetch.cancel()
+            prefetch.future.add_done_callback(_release_result)
+
+    def cancel_all(self) -> None:
+        self.retain(())
+
+    def _download(self, prefetch: Prefetch, duration: float) -> None:
+        try:
+            staged = self._staging.acquire(estimate_source_bytes(duration))
+        except BaseException as e:
+            prefetch.future.set_exception(e)
+            return
+
+        try:
+            if prefetch.cancelled:
+                raise CancelledError()
+            source_path = self._source.download_audio(
+                prefetch.url, staged.path, prefetch._on_progress
+            )
+            staged.record_source(source_path)
+        except BaseException as e:
+            staged.release()
+            prefetch.future.set_exception(e)
+            return
+
+        prefetch.future.set_result(staged)
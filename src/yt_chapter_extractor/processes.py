@@ -0,0 +1,168 @@
+import asyncio
+import subprocess
+import threading
+import weakref
+from collections.abc import Iterator
+from concurrent.futures import CancelledError
+from contextlib import AbstractContextManager, contextmanager
+from pathlib import Path
+from typing import Any
+
+_KILL_AFTER_SECONDS = 2.0
+
+
+# Live ffmpeg processes and half-written outputs of one batch of jobs.
+# Cancelling the group terminates the processes right away instead of
+# letting them run into their timeouts, and deletes the partial files.
+class ProcessGroup:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._processes: set[subprocess.Popen] = set()
+        self._outputs: set[Path] = set()
+        self._cancelled = False
+        _GROUPS.add(self)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @contextmanager
+    def popen(
+        self, cmd: list[str], **kwargs: Any
+    ) -> Iterator[subprocess.Popen]:
+        with self._lock:
+            if self._cancelled:
+                raise CancelledError()
+            proc = subprocess.Popen(cmd, **kwargs)
+            self._processes.add(proc)
+
+        try:
+            yield proc
+        except BaseException:
+            proc.kill()
+            raise
+        finally:
+            for stream in (proc.stdin, proc.stdout, proc.stderr):
+                if stream is not None:
+                    stream.close()
+            proc.wait()
+            with self._lock:
+                self._processes.discard(proc)
+
+        if self._cancelled:
+            raise CancelledError()
+
+    def run(
+        self, cmd: list[str], timeout: float
+    ) -> subprocess.CompletedProcess[str]:
+        with self.popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        ) as proc:
+            stdout, stderr = proc.communicate(timeout=timeout)
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+    @contextmanager
+    def partial_output(self, path: Path) -> Iterator[Path]:
+        with self._lock:
+            self._outputs.add(path)
+        try:
+            yield path
+        except BaseException:
+            path.unlink(missing_ok=True)
+            raise
+        finally:
+            with self._lock:
+                self._outputs.discard(path)
+
+    # Safe to call from the UI thread: it only signals the processes, and
+    # any that ignore SIGTERM are killed from a timer thread.
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            processes = list(self._processes)
+            outputs = list(self._outputs)
+
+        for proc in processes:
+            if proc.poll() is None:
+                proc.terminate()
+        for path in outputs:
+            try:
+                path.unlink(missing_ok=True)
+            except OSError:
+                # Still open by a dying process on Windows; the job's own
+                # cleanup removes it once the process has exited.
+                pass
+
+        if processes:
+            timer = threading.Timer(
+                _KILL_AFTER_SECONDS, _kill_remaining, args=(processes,)
+            )
+            timer.daemon = True
+            timer.start()
+
+
+def _kill_remaining(processes: list[subprocess.Popen]) -> None:
+    for proc in processes:
+        if proc.poll() is None:
+            proc.kill()
+
+
+_GROUPS: "weakref.WeakSet[ProcessGroup]" = weakref.WeakSet()
+
+# Blocking callers, e.g. the CLI tools, the native meter and benchmarks.
+_DEFAULT_GROUP = ProcessGroup()
+
+
+def default_group() -> ProcessGroup:
+    return _DEFAULT_GROUP
+
+
+def run(cmd: list[str], timeout: float) -> subprocess.CompletedProcess[str]:
+    return _DEFAULT_GROUP.run(cmd, timeout)
+
+
+def popen(
+    cmd: list[str], **kwargs: Any
+) -> AbstractContextManager[subprocess.Popen]:
+    return _DEFAULT_GROUP.popen(cmd, **kwargs)
+
+
+def partial_output(path: Path) -> AbstractContextManager[Path]:
+    return _DEFAULT_GROUP.partial_output(path)
+
+
+# Event-loop counterpart of ProcessGroup.run for async workers. Cancelling
+# the awaiting task kills the process, so no group is needed.
+async def run_async(
+    cmd: list[str], timeout: float
+) -> subprocess.CompletedProcess[str]:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException as e:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        if isinstance(e, TimeoutError):
+            raise subprocess.TimeoutExpired(cmd, timeout) from None
+        raise
+
+    return subprocess.CompletedProcess(
+        cmd,
+        proc.returncode,
+        stdout.decode(errors="replace"),
+        stderr.decode(errors="replace"),
+    )
+
+
+def terminate_all() -> None:
+    for group in list(_GROUPS):
+        group.cancel()
@@ -0,0 +1,188 @@
+import asyncio
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from pathlib import Path
+from types import FrameType
+
+from textual.app import App
+
+from .metrics import percentile
+
+# Leaf functions where a sampled thread is blocked rather than running.
+_IDLE_FUNCTIONS = frozenset(
+    {
+        "wait",
+        "select",
+        "poll",
+        "sleep",
+        "_worker",
+        "_wait_for_tstate_lock",
+        "_try_wait",
+        "_communicate",
+        "readinto",
+        "get",
+    }
+)
+
+
+def _thread_group(name: str) -> str:
+    # Pool threads are named e.g. "ThreadPoolExecutor-3_1"; fold them
+    # together so every pool shows up as one root in the flame graph.
+    return re.sub(r"[-_]\d+", "", name).replace(" ", "_")
+
+
+def _fold(frame: FrameType | None) -> list[str]:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_qualname} ({Path(code.co_filename).name})")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class Profiler:
+    def __init__(self, interval: float = 0.005) -> None:
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started = 0.0
+        self._finished: float | None = None
+        self._samples = 0
+        self._stacks: Counter[str] = Counter()
+        self._thread_samples: Counter[str] = Counter()
+        self._thread_busy: Counter[str] = Counter()
+        self._leaves: Counter[str] = Counter()
+        self._loop_lags: list[float] = []
+        self._queue_depths: list[int] = []
+        self._calls: Counter[str] = Counter()
+        self._call_seconds: defaultdict[str, float] = defaultdict(float)
+        self._call_max: defaultdict[str, float] = defaultdict(float)
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._run, name="profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._finished = time.monotonic()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            with self._lock:
+                self._samples += 1
+                for ident, frame in frames.items():
+                    if ident == own:
+                        continue
+                    group = _thread_group(names.get(ident, str(ident)))
+                    stack = _fold(frame)
+                    self._stacks[";".join([group, *stack])] += 1
+                    self._thread_samples[group] += 1
+                    if frame.f_code.co_name in _IDLE_FUNCTIONS:
+                        continue
+                    self._thread_busy[group] += 1
+                    self._leaves[stack[-1]] += 1
+
+    async def monitor_event_loop(self, app: App, interval: float = 0.05) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stop.is_set():
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            lag = max(loop.time() - expected, 0.0)
+            depth = _queue_depth(app)
+            with self._lock:
+                self._loop_lags.append(lag)
+                self._queue_depths.append(depth)
+
+    def record_call(self, callback: Callable, seconds: float) -> None:
+        name = getattr(callback, "__qualname__", repr(callback))
+        with self._lock:
+            self._calls[name] += 1
+            self._call_seconds[name] += seconds
+            self._call_max[name] = max(self._call_max[name], seconds)
+
+    def write_folded(self, path: Path) -> None:
+        with self._lock:
+            lines = [
+                f"{stack} {count}"
+                for stack, count in sorted(self._stacks.items())
+            ]
+        path.write_text("\n".join(lines) + "\n")
+
+    def summary_lines(self, top: int = 15) -> list[str]:
+        with self._lock:
+            samples = self._samples
+            lags = sorted(self._loop_lags)
+            depths = sorted(self._queue_depths)
+            thread_samples = Counter(self._thread_samples)
+            thread_busy = Counter(self._thread_busy)
+            leaves = Counter(self._leaves)
+            calls = [
+                (name, count, self._call_seconds[name], self._call_max[name])
+                for name, count in self._calls.items()
+            ]
+        wall = (self._finished or time.monotonic()) - self._started
+
+        lines = [
+            f"Profile: {samples} samples over {wall:.1f}s "
+            f"({self._interval * 1000:.0f} ms interval)",
+        ]
+        if lags:
+            lines.append(
+                f"Event loop lag: p50 {percentile(lags, 50) * 1000:.1f} ms, "
+                f"p95 {percentile(lags, 95) * 1000:.1f} ms, "
+                f"max {lags[-1] * 1000:.1f} ms"
+            )
+            lines.append(
+                f"Message queue depth: p50 {percentile(depths, 50)}, "
+                f"p95 {percentile(depths, 95)}, max {depths[-1]}"
+            )
+
+        if calls:
+            lines.append("call_from_thread (round-trip incl. callback):")
+            for name, count, total, longest in sorted(
+                calls, key=lambda c: c[2], reverse=True
+            )[:top]:
+                lines.append(
+                    f"  {name:<40} n={count:<6} total {total:.2f}s  "
+                    f"max {longest * 1000:.1f} ms"
+                )
+
+        if samples:
+            lines.append("Threads (busy / sampled, 100% = one thread):")
+            for group, count in thread_samples.most_common():
+                lines.append(
+                    f"  {group:<40} {thread_busy[group] / samples:6.1%} / "
+                    f"{count / samples:6.1%}"
+                )
+
+        if leaves:
+            busy = sum(leaves.values())
+            lines.append("Top functions (self time, busy samples):")
+            for leaf, count in leaves.most_common(top):
+                lines.append(f"  {count / busy:6.1%}  {leaf}")
+        return lines
+
+
+def _queue_depth(app: App) -> int:
+    # Textual keeps each message pump's pending messages in a private
+    # asyncio.Queue; fall back to 0 if that ever changes.
+    depth = 0
+    for pump in (app, *app.screen_stack[-1:]):
+        queue = getattr(pump, "_message_queue", None)
+        if queue is not None:
+            depth += queue.qsize()
+    return depth
@@ -0,0 +1,108 @@
+import asyncio
+import os
+from collections.abc import AsyncIterator, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from .models import Mp3FileInfo
+
+# Directory listing is latency-bound on network filesystems, so more
+# threads than cores pay off.
+_MAX_SCAN_WORKERS = 16
+
+
+def _scan_dir(
+    dir_path: Path, root: Path
+) -> tuple[list[Mp3FileInfo], list[Path]]:
+    files: list[Mp3FileInfo] = []
+    subdirs: list[Path] = []
+
+    try:
+        with os.scandir(dir_path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(Path(entry.path))
+                    elif (
+                        entry.name.lower().endswith(".mp3")
+                        and entry.is_file()
+                    ):
+                        path = Path(entry.path)
+                        files.append(
+                            Mp3FileInfo(
+                                path=path,
+                                filename=str(path.relative_to(root)),
+                                size_bytes=entry.stat().st_size,
+                            )
+                        )
+                except OSError:
+                    continue
+    except OSError:
+        pass
+
+    files.sort(key=lambda f: f.filename)
+    subdirs.sort()
+    return files, subdirs
+
+
+# Yields MP3 files as each directory listing completes, so callers can start
+# work before the walk finishes. Files within a directory come out sorted;
+# directories are visited in completion order when recursing.
+def scan_mp3_files(
+    root: Path,
+    recursive: bool = False,
+    max_workers: int = _MAX_SCAN_WORKERS,
+) -> Iterator[Mp3FileInfo]:
+    if not recursive:
+        files, _ = _scan_dir(root, root)
+        yield from files
+        return
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending: set[Future] = {pool.submit(_scan_dir, root, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                for subdir in subdirs:
+                    pending.add(pool.submit(_scan_dir, subdir, root))
+                yield from files
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+# scan_mp3_files for async workers: listings run on a thread pool and the
+# walk itself is driven from the event loop.
+async def scan_mp3_files_async(
+    root: Path,
+    recursive: bool = False,
+    max_workers: int = _MAX_SCAN_WORKERS,
+) -> AsyncIterator[Mp3FileInfo]:
+    loop = asyncio.get_running_loop()
+    pool = ThreadPoolExecutor(max_workers=max_workers if recursive else 1)
+    try:
+        pending = {loop.run_in_executor(pool, _scan_dir, root, root)}
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for future in done:
+                files, subdirs = future.result()
+                if recursive:
+                    for subdir in subdirs:
+                        pending.add(
+                            loop.run_in_executor(pool, _scan_dir, subdir, root)
+                        )
+                for info in files:
+                    yield info
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def has_mp3_files(root: Path, recursive: bool = False) -> bool:
+    files = scan_mp3_files(root, recursive)
+    try:
+        return next(files, None) is not None
+    finally:
+        files.close()
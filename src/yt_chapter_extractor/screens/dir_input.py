@@ -3,10 +3,12 @@ from pathlib import Path
 from textual.app import ComposeResult
 from textual.containers import Center, Vertical
 from textual.screen import Screen
-from textual.widgets import Button, Footer, Header, Input, Label
+from textual.widgets import Button, Checkbox, Footer, Header, Input, Label
 
+from ..scan import has_mp3_files
 
-class DirInputScreen(Screen[Path | None]):
+
+class DirInputScreen(Screen[tuple[Path, bool] | None]):
     CSS = """
     #container {
         align: center middle;
@@ -25,6 +27,10 @@ class DirInputScreen(Screen[Path | None]):
         margin-bottom: 1;
     }
 
+    #recursive-checkbox {
+        margin-bottom: 1;
+    }
+
     #load-btn {
         width: 100%;
         margin-top: 1;
@@ -50,6 +56,10 @@ class DirInputScreen(Screen[Path | None]):
                     placeholder="Enter directory path...",
                     id="dir-input",
                 )
+                yield Checkbox(
+                    "Include subdirectories",
+                    id="recursive-checkbox",
+                )
                 yield Button(
                     "Load Directory", id="load-btn", variant="primary"
                 )
@@ -83,14 +93,12 @@ class DirInputScreen(Screen[Path | None]):
             self._show_error("Path is not a directory.")
             return
 
-        mp3_files = list(dir_path.glob("*.mp3")) + list(
-            dir_path.glob("*.MP3")
-        )
-        if not mp3_files:
+        recursive = self.query_one("#recursive-checkbox", Checkbox).value
+        if not has_mp3_files(dir_path, recursive):
             self._show_error("No MP3 files found in this directory.")
             return
 
-        self.dismiss(dir_path)
+        self.dismiss((dir_path, recursive))
 
     def _show_error(self, message: str) -> None:
         self.query_one("#error-label", Label).update(message)
@@ -1,7 +1,6 @@
-import os
-import tempfile
+import asyncio
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import CancelledError
 from pathlib import Path
 
 from textual import work
@@ -9,12 +8,23 @@ from textual.app import ComposeResult
 from textual.containers import Vertical, VerticalScroll
 from textual.screen import Screen
 from textual.widgets import Button, Footer, Header, Label, ProgressBar, Static
+from textual.worker import Worker, get_current_worker
 
-from ..audio import normalize_audio, process_track
+from ..audio import normalize_audio_async, process_track_async
+from ..concurrency import AdaptiveLimiter, longest_first
+from ..metrics import RunMetrics
 from ..models import DownloadTask, TrackInfo
-from ..youtube import download_audio
+from ..prefetch import Prefetch, Prefetcher
+from ..sources import MediaSource, YtDlpSource
+from ..staging import StagedSource, StagingArea, estimate_source_bytes
+from ..youtube import ProgressCallback
 
-_MAX_WORKERS = min(os.cpu_count() or 4, 8)
+_MAX_DOWNLOADS = 2
+
+
+def _release_unclaimed(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        future.result().release()
 
 
 class DownloadScreen(Screen[bool]):
@@ -72,11 +82,32 @@ class DownloadScreen(Screen[bool]):
         self,
         tasks: tuple[DownloadTask, ...],
         target_lufs: float | None = None,
+        source: MediaSource | None = None,
+        staging: StagingArea | None = None,
+        metrics: RunMetrics | None = None,
+        metrics_path: Path | None = None,
+        prefetcher: Prefetcher | None = None,
+        output_dir: Path | None = None,
+        close_when_done: bool = False,
     ) -> None:
         super().__init__()
         self._tasks = tasks
         self._target_lufs = target_lufs
+        self._source = source or YtDlpSource()
+        self._staging = staging or StagingArea()
+        self._metrics = metrics or RunMetrics()
+        self._metrics_path = metrics_path
+        self._prefetcher = prefetcher
+        self._output_dir = output_dir or Path.cwd() / "output"
+        self._close_when_done = close_when_done
+        self._source_count = len(tasks)
+        self._error_count = 0
+        # Source URLs whose download and tracks all succeeded; the screen's
+        # result.
+        self._completed_urls: list[str] = []
         self._total_tracks = sum(len(t.tracks) for t in tasks)
+        self._limiter = AdaptiveLimiter(on_adjust=self._on_limit_adjusted)
+        self._done_count = 0
 
     def compose(self) -> ComposeResult:
         yield Header()
@@ -98,7 +129,7 @@ class DownloadScreen(Screen[bool]):
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "done-btn":
-            self.dismiss(True)
+            self.dismiss(tuple(self._completed_urls))
 
     def _log(self, message: str, style: str = "log-info") -> None:
         log_area = self.query_one("#log-area", VerticalScroll)
@@ -106,147 +137,293 @@ class DownloadScreen(Screen[bool]):
         log_area.mount(label)
         label.scroll_visible()
 
-    @work(thread=True)
-    def _start_processing(self) -> None:
-        from textual.worker import get_current_worker
-
+    @work(exclusive=True)
+    async def _start_processing(self) -> None:
+        self._metrics.start()
         worker = get_current_worker()
-        output_dir = Path.cwd() / "output"
-        output_dir.mkdir(exist_ok=True)
-
-        multi_task = len(self._tasks) > 1
-        track_num = 0
+        self._output_dir.mkdir(parents=True, exist_ok=True)
+
+        # Tasks that share a source URL, e.g. several manifest jobs cutting
+        # the same video, download it once.
+        sources: dict[str, list[DownloadTask]] = {}
+        for task in self._tasks:
+            sources.setdefault(task.url, []).append(task)
+        self._source_count = len(sources)
+
+        downloads = asyncio.Semaphore(_MAX_DOWNLOADS)
+        jobs = [
+            asyncio.create_task(
+                self._run_source(worker, downloads, source_idx, tasks)
+            )
+            for source_idx, tasks in enumerate(sources.values())
+        ]
 
         try:
-            for task_idx, task in enumerate(self._tasks):
-                if worker.is_cancelled:
-                    return
-
-                if multi_task:
-                    self.app.call_from_thread(
-                        self._log,
-                        f"Downloading video {task_idx + 1}/{len(self._tasks)}...",
+            await asyncio.gather(*jobs)
+        except Exception as e:
+            self._log(f"Fatal error: {e}", "log-error")
+            self._error_count += 1
+        finally:
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+
+        self._metrics.finish()
+        if self._metrics_path is not None:
+            try:
+                self._metrics.write(self._metrics_path)
+            except OSError as e:
+                self._log(f"Could not write metrics: {e}", "log-error")
+        self._finish()
+
+    async def _run_source(
+        self,
+        worker: Worker,
+        downloads: asyncio.Semaphore,
+        source_idx: int,
+        tasks: list[DownloadTask],
+    ) -> None:
+        merged = DownloadTask(
+            url=tasks[0].url,
+            tracks=tuple(track for task in tasks for track in task.tracks),
+            source_duration=max(task.source_duration for task in tasks),
+        )
+        async with downloads:
+            try:
+                staged = await self._download(worker, source_idx, merged)
+            except Exception as e:
+                self._log(f"  Error: {merged.url} - {e}", "log-error")
+                self._advance_progress(len(merged.tracks))
+                self._done_count += len(merged.tracks)
+                self._error_count += len(merged.tracks)
+                return
+        if len(tasks) > 1:
+            self._log(f"  Shared by {len(tasks)} jobs")
+
+        jobs = [
+            (track, self._target_for(task))
+            for task in tasks
+            for track in task.tracks
+        ]
+
+        # The source is only needed until its last chapter is encoded; free
+        # the staging space for queued downloads.
+        try:
+            submitted = time.perf_counter()
+            results = await asyncio.gather(
+                *(
+                    self._run_track(
+                        staged.source_path, track, target_lufs, submitted
                     )
-                else:
-                    self.app.call_from_thread(
-                        self._log, "Downloading audio from YouTube..."
+                    for track, target_lufs in longest_first(
+                        jobs, lambda job: job[0].chapter.duration
                     )
-
-                self.app.call_from_thread(
-                    self._update_current, "Downloading audio..."
                 )
+            )
+        finally:
+            staged.release()
+        if all(results):
+            self._completed_urls.append(merged.url)
+
+    def _target_for(self, task: DownloadTask) -> float | None:
+        if task.target_lufs is not None:
+            return task.target_lufs
+        return self._target_lufs
+
+    async def _download(
+        self, worker: Worker, source_idx: int, task: DownloadTask
+    ) -> StagedSource:
+        future = asyncio.get_running_loop().run_in_executor(
+            None, self._fetch_source, worker, source_idx, task
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # The download stops at its next progress update; free its
+            # staging space once the thread is done with it.
+            future.add_done_callback(_release_unclaimed)
+            raise
+
+    async def _run_track(
+        self,
+        source_path: Path,
+        track: TrackInfo,
+        target_lufs: float | None,
+        submitted: float,
+    ) -> bool:
+        succeeded = True
+        try:
+            await self._process_single_track(
+                source_path, track, target_lufs, submitted
+            )
+        except Exception as e:
+            self._log(f"  Error: {track.filename} - {e}", "log-error")
+            self._error_count += 1
+            succeeded = False
+
+        self._done_count += 1
+        self._advance_progress()
+        self._update_current(
+            f"Processing tracks... {self._done_count}/{self._total_tracks} "
+            f"({self._limiter.limit} in flight)",
+        )
+        return succeeded
+
+    def _fetch_source(
+        self, worker: Worker, source_idx: int, task: DownloadTask
+    ) -> StagedSource:
+        last_update = 0.0
+
+        def on_progress(pct: float, speed: str) -> None:
+            nonlocal last_update
+            # Raising from the progress hook is how a download is stopped
+            # part-way.
+            if worker.is_cancelled:
+                raise CancelledError()
+            now = time.monotonic()
+            if now - last_update < 0.5:
+                return
+            last_update = now
+            msg = f"Downloading audio... {pct:.1f}%"
+            if speed:
+                msg += f" ({speed})"
+            self.app.call_from_thread(self._update_current, msg)
+
+        prefetch = (
+            self._prefetcher.claim(task.url)
+            if self._prefetcher is not None
+            else None
+        )
+        if prefetch is not None:
+            staged = self._claim_prefetch(worker, prefetch, on_progress)
+            if staged is not None:
+                return staged
 
-                with tempfile.TemporaryDirectory() as tmp_dir:
-                    last_update = 0.0
-
-                    def on_progress(pct: float, speed: str) -> None:
-                        nonlocal last_update
-                        now = time.monotonic()
-                        if now - last_update < 0.5:
-                            return
-                        last_update = now
-                        msg = f"Downloading audio... {pct:.1f}%"
-                        if speed:
-                            msg += f" ({speed})"
-                        self.app.call_from_thread(self._update_current, msg)
-
-                    source_path = download_audio(
-                        task.url, Path(tmp_dir), on_progress
-                    )
+        staged = self._staging.acquire(
+            estimate_source_bytes(task.source_seconds)
+        )
 
-                    if worker.is_cancelled:
-                        return
+        try:
+            if worker.is_cancelled:
+                raise CancelledError()
 
-                    self.app.call_from_thread(
-                        self._log, "Download complete.", "log-success"
-                    )
+            if self._source_count > 1:
+                self.app.call_from_thread(
+                    self._log,
+                    f"Downloading video {source_idx + 1}/"
+                    f"{self._source_count}...",
+                )
+            else:
+                self.app.call_from_thread(
+                    self._log, "Downloading audio from YouTube..."
+                )
 
-                    self.app.call_from_thread(
-                        self._update_current,
-                        f"Processing tracks... 0/{len(task.tracks)} ({_MAX_WORKERS} threads)",
-                    )
+            started = time.perf_counter()
+            source_path = self._source.download_audio(
+                task.url, staged.path, on_progress
+            )
+            staged.record_source(source_path)
+            self._metrics.record(
+                "download",
+                task.url,
+                time.perf_counter() - started,
+                source_path.stat().st_size,
+            )
+        except BaseException:
+            staged.release()
+            raise
 
-                    done_count = 0
-
-                    with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as pool:
-                        future_to_track = {
-                            pool.submit(
-                                self._process_single_track,
-                                source_path,
-                                track,
-                                output_dir,
-                            ): track
-                            for track in task.tracks
-                        }
-
-                        for future in as_completed(future_to_track):
-                            if worker.is_cancelled:
-                                pool.shutdown(wait=False, cancel_futures=True)
-                                return
-
-                            track = future_to_track[future]
-                            track_num += 1
-                            done_count += 1
-
-                            try:
-                                future.result()
-                            except Exception as e:
-                                self.app.call_from_thread(
-                                    self._log,
-                                    f"  Error: {track.filename} - {e}",
-                                    "log-error",
-                                )
-
-                            self.app.call_from_thread(self._advance_progress)
-                            self.app.call_from_thread(
-                                self._update_current,
-                                f"Processing tracks... {done_count}/{len(task.tracks)}",
-                            )
+        self.app.call_from_thread(
+            self._log, "Download complete.", "log-success"
+        )
+        return staged
 
-        except Exception as e:
+    # Waits for a download started while the user was editing metadata.
+    # Only the remaining wait is recorded as download time. Returns None if
+    # it failed, so the caller downloads the source again.
+    def _claim_prefetch(
+        self,
+        worker: Worker,
+        prefetch: Prefetch,
+        on_progress: ProgressCallback,
+    ) -> StagedSource | None:
+        started = time.perf_counter()
+        prefetch.listen(on_progress)
+        if not prefetch.future.done():
             self.app.call_from_thread(
-                self._log, f"Fatal error: {e}", "log-error"
+                self._log, "Waiting for background download..."
             )
 
-        self.app.call_from_thread(self._finish)
+        try:
+            staged = prefetch.future.result()
+        except Exception as e:
+            if worker.is_cancelled:
+                raise
+            self.app.call_from_thread(
+                self._log,
+                f"  Background download failed ({e}), downloading again...",
+                "log-error",
+            )
+            return None
 
-    def _process_single_track(
-        self,
-        source_path: Path,
-        track: TrackInfo,
-        output_dir: Path,
-    ) -> None:
-        self.app.call_from_thread(
-            self._log, f"Processing: {track.filename}..."
+        self._metrics.record(
+            "download",
+            prefetch.url,
+            time.perf_counter() - started,
+            staged.source_path.stat().st_size,
         )
-
-        result_path = process_track(source_path, track, output_dir)
         self.app.call_from_thread(
             self._log,
-            f"  Saved: {result_path.name}",
+            "Download complete (started in background).",
             "log-success",
         )
+        return staged
 
-        if self._target_lufs is not None:
-            self.app.call_from_thread(
-                self._log,
-                f"  Normalizing to {self._target_lufs:.1f} LUFS...",
+    async def _process_single_track(
+        self,
+        source_path: Path,
+        track: TrackInfo,
+        target_lufs: float | None,
+        submitted: float,
+    ) -> None:
+        async with self._limiter.slot(priority=track.chapter.duration):
+            self._metrics.record(
+                "queue_wait", track.filename, time.perf_counter() - submitted
             )
-            normalize_audio(result_path, self._target_lufs)
-            self.app.call_from_thread(
-                self._log,
-                f"  Normalized: {result_path.name}",
-                "log-success",
+            self._log(f"Processing: {track.filename}...")
+
+            result_path = await process_track_async(
+                source_path, track, self._output_dir, self._metrics
             )
+            self._log(f"  Saved: {result_path.name}", "log-success")
+
+            if target_lufs is not None:
+                self._log(f"  Normalizing to {target_lufs:.1f} LUFS...")
+                await normalize_audio_async(
+                    result_path, target_lufs, self._metrics
+                )
+                self._log(f"  Normalized: {result_path.name}", "log-success")
+
+        self._metrics.track_done(track.chapter.duration)
+
+    def _on_limit_adjusted(self, limit: int, rate: float) -> None:
+        self._log(f"  Concurrency set to {limit} ({rate * 60:.1f} tracks/min)")
 
     def _update_current(self, text: str) -> None:
         self.query_one("#current-label", Label).update(text)
 
-    def _advance_progress(self) -> None:
-        self.query_one("#overall-progress", ProgressBar).advance(1)
+    def _advance_progress(self, count: int = 1) -> None:
+        self.query_one("#overall-progress", ProgressBar).advance(count)
 
     def _finish(self) -> None:
         self.query_one("#current-label", Label).update("Complete!")
-        self.query_one("#overall-label", Label).update("All tracks processed.")
+        summary = "All tracks processed."
+        if self._error_count:
+            summary += f" {self._error_count} failed."
+        self.query_one("#overall-label", Label).update(summary)
         self.query_one("#done-btn", Button).disabled = False
+        for line in self._metrics.summary_lines():
+            self._log(line)
         self._log("All done!", "log-success")
+        if self._close_when_done:
+            self.dismiss(tuple(self._completed_urls))
@@ -0,0 +1,153 @@
+import asyncio
+
+from textual import work
+from textual.app import ComposeResult
+from textual.containers import Horizontal, Vertical, VerticalScroll
+from textual.screen import Screen
+from textual.widgets import Button, Footer, Header, Label, ProgressBar
+
+from ..client import JobClient
+from ..jobs import FINISHED_STATES
+
+_POLL_SECONDS = 0.5
+
+
+# Follows a job running on a job server. Leaving the screen leaves the job
+# running; only "Cancel job" stops it.
+class JobStatusScreen(Screen[bool]):
+    CSS = """
+    #progress-section {
+        height: auto;
+        padding: 1 2;
+    }
+
+    #overall-label {
+        text-style: bold;
+        margin-bottom: 1;
+    }
+
+    #current-label {
+        margin-top: 1;
+        margin-bottom: 1;
+    }
+
+    #log-area {
+        height: 1fr;
+        padding: 0 2;
+        border: solid $surface-lighten-2;
+        margin: 1 2;
+    }
+
+    .log-line {
+        margin: 0;
+    }
+
+    .log-error {
+        color: $error;
+    }
+
+    #bottom-bar {
+        height: 3;
+        align: center middle;
+        dock: bottom;
+    }
+
+    #bottom-bar Button {
+        width: 20;
+        margin: 0 1;
+    }
+    """
+
+    BINDINGS = [
+        ("escape", "back", "Back"),
+    ]
+
+    def __init__(self, client: JobClient, job_id: int, title: str) -> None:
+        super().__init__()
+        self._client = client
+        self._job_id = job_id
+        self._title = title
+        self._errors_shown = 0
+
+    def compose(self) -> ComposeResult:
+        yield Header()
+        with Vertical(id="progress-section"):
+            yield Label(
+                f"Job {self._job_id} on {self._client.base_url}: {self._title}",
+                id="overall-label",
+            )
+            yield ProgressBar(id="overall-progress")
+            yield Label("Queued...", id="current-label")
+        yield VerticalScroll(id="log-area")
+        with Horizontal(id="bottom-bar"):
+            yield Button("Cancel job", id="cancel-btn", variant="error")
+            yield Button("Done", id="done-btn", variant="primary")
+        yield Footer()
+
+    def on_mount(self) -> None:
+        self._poll()
+
+    def action_back(self) -> None:
+        self.dismiss(False)
+
+    def on_button_pressed(self, event: Button.Pressed) -> None:
+        if event.button.id == "done-btn":
+            self.dismiss(False)
+        elif event.button.id == "cancel-btn":
+            event.button.disabled = True
+            self._cancel()
+
+    @work(group="cancel")
+    async def _cancel(self) -> None:
+        try:
+            await asyncio.to_thread(self._client.cancel, self._job_id)
+        except RuntimeError as e:
+            self.notify(str(e), severity="error")
+            self.query_one("#cancel-btn", Button).disabled = False
+
+    @work(exclusive=True)
+    async def _poll(self) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self._client.get, self._job_id)
+            except RuntimeError as e:
+                self.query_one("#current-label", Label).update(str(e))
+            else:
+                self._show(job)
+                if job["state"] in FINISHED_STATES:
+                    self.query_one("#cancel-btn", Button).disabled = True
+                    return
+            await asyncio.sleep(_POLL_SECONDS)
+
+    def _show(self, job: dict) -> None:
+        progress = self.query_one("#overall-progress", ProgressBar)
+        if job["total"]:
+            progress.update(
+                total=job["total"], progress=job["done"] + job["failed"]
+            )
+
+        state = job["state"]
+        if state == "queued":
+            status = "Queued..."
+        elif state == "running":
+            status = job["message"] or "Running..."
+        else:
+            status = f"{state.capitalize()}. {job['message']}".strip()
+        self.query_one("#current-label", Label).update(status)
+
+        # The job keeps only its latest errors, so after a burst some of
+        # the new ones may no longer be in the list.
+        new = job["error_count"] - self._errors_shown
+        if new <= 0:
+            return
+        log_area = self.query_one("#log-area", VerticalScroll)
+        errors = job["errors"][-new:]
+        lines = [f"  {error}" for error in errors]
+        if new > len(errors):
+            missed = new - len(errors)
+            lines.insert(0, f"  ... {missed} earlier errors not shown")
+        for line in lines:
+            label = Label(line, classes="log-line log-error")
+            log_area.mount(label)
+            label.scroll_visible()
+        self._errors_shown = job["error_count"]
@@ -1,6 +1,7 @@
-import os
+import asyncio
 import statistics
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections.abc import AsyncIterator, Iterable
+from contextlib import aclosing
 from pathlib import Path
 
 from textual import work
@@ -9,20 +10,43 @@ from textual.containers import Horizontal, Vertical
 from textual.screen import Screen
 from textual.widgets import (
     Button,
+    Checkbox,
     DataTable,
     Footer,
     Header,
     Input,
     Label,
+    Select,
 )
 
-from ..audio import measure_loudness
+from ..album import GROUP_BY_DIRECTORY, GROUP_BY_TAG
+from ..audio import measure_loudness_async
+from ..concurrency import DEFAULT_LIMIT, AdaptiveLimiter, longest_first
+from ..executors import cancel_executor, create_executor
+from ..histogram import default_histogram_path
+from ..measure import (
+    LoudnessResult,
+    measure_files_async,
+    measure_native_segmented,
+)
+from ..meter import native_meter_available
 from ..models import Mp3FileInfo
+from ..scan import scan_mp3_files_async
+
+# Short clips are measured several to an ffmpeg process, since spawn and
+# codec setup dominate their measurement time.
+_BATCH_MAX_BYTES = 2 * 1024 * 1024
+_BATCH_SIZE = 16
+
 
-_MAX_WORKERS = min(os.cpu_count() or 4, 8)
+async def _iterate(items: Iterable[Mp3FileInfo]) -> AsyncIterator[Mp3FileInfo]:
+    for item in items:
+        yield item
 
 
-class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
+class NormFileListScreen(
+    Screen[tuple[tuple[Mp3FileInfo, ...], float, str] | None]
+):
     CSS = """
     #file-table {
         height: 1fr;
@@ -34,13 +58,13 @@ class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
         padding: 1 2;
     }
 
-    #target-row {
+    #target-row, #meter-row, #mode-row {
         height: auto;
         align: left middle;
         margin-bottom: 1;
     }
 
-    #target-label {
+    #target-label, #meter-label, #mode-label {
         width: auto;
         margin-right: 1;
     }
@@ -49,6 +73,14 @@ class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
         width: 20;
     }
 
+    #meter-select, #mode-select {
+        width: 34;
+    }
+
+    #refine-checkbox {
+        margin-left: 2;
+    }
+
     #target-unit {
         width: auto;
         margin-left: 1;
@@ -80,11 +112,19 @@ class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
         ("escape", "back", "Back"),
     ]
 
-    def __init__(self, dir_path: Path) -> None:
+    def __init__(
+        self,
+        dir_path: Path,
+        recursive: bool = False,
+        executor_kind: str = "auto",
+    ) -> None:
         super().__init__()
         self._dir_path = dir_path
+        self._recursive = recursive
+        self._executor_kind = executor_kind
         self._files: tuple[Mp3FileInfo, ...] = ()
         self._loudness_col_key = None
+        self._meter = "ffmpeg"
 
     def compose(self) -> ComposeResult:
         yield Header()
@@ -94,6 +134,36 @@ class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
         yield DataTable(id="file-table")
         yield Label("", id="stats-label")
         with Vertical(id="bottom-section"):
+            with Horizontal(id="meter-row"):
+                yield Label("Meter:", id="meter-label")
+                meter_options = [("ffmpeg loudnorm", "ffmpeg")]
+                if native_meter_available():
+                    meter_options.append(("Native (NumPy)", "native"))
+                meter_options.append(("Quick estimate (sampled)", "quick"))
+                yield Select(
+                    meter_options,
+                    value=self._meter,
+                    allow_blank=False,
+                    id="meter-select",
+                    disabled=True,
+                )
+                yield Checkbox(
+                    "Refine estimates in background",
+                    value=True,
+                    id="refine-checkbox",
+                )
+            with Horizontal(id="mode-row"):
+                yield Label("Mode:", id="mode-label")
+                yield Select(
+                    [
+                        ("Per track (loudnorm)", "track"),
+                        ("Album gain, by album tag", GROUP_BY_TAG),
+                        ("Album gain, by folder", GROUP_BY_DIRECTORY),
+                    ],
+                    value="track",
+                    allow_blank=False,
+                    id="mode-select",
+                )
             with Horizontal(id="target-row"):
                 yield Label("Target Loudness:", id="target-label")
                 yield Input(
@@ -121,6 +191,12 @@ class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
         if event.button.id == "start-btn":
             self._submit()
 
+    def on_select_changed(self, event: Select.Changed) -> None:
+        if event.select.id == "meter-select" and event.value != self._meter:
+            self._meter = event.value
+            self._set_measuring(True)
+            self._scan_files()
+
     def _submit(self) -> None:
         raw = self.query_one("#target-input", Input).value.strip()
 
@@ -134,78 +210,144 @@ class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
             self._show_error("Target must be between -70.0 and 0.0 LUFS.")
             return
 
-        self.dismiss((self._files, target))
-
-    @work(thread=True)
-    def _scan_files(self) -> None:
-        from textual.worker import get_current_worker
-
-        worker = get_current_worker()
-
-        mp3_paths = sorted(
-            p
-            for p in self._dir_path.iterdir()
-            if p.suffix.lower() == ".mp3" and p.is_file()
+        mode = self.query_one("#mode-select", Select).value
+        if mode != "track" and any(f.loudness_estimated for f in self._files):
+            self._show_error(
+                "Album modes need exact measurements; "
+                "wait for the estimates to be refined."
+            )
+            return
+        self.dismiss((self._files, target, mode))
+
+    @work(exclusive=True)
+    async def _scan_files(self) -> None:
+        meter = self._meter
+
+        # A meter change re-measures the files already listed.
+        rescan = not self._files
+        files = (
+            scan_mp3_files_async(self._dir_path, self._recursive)
+            if rescan
+            else _iterate(self._files)
         )
 
         collected: list[Mp3FileInfo] = []
-        for i, mp3_path in enumerate(mp3_paths):
-            if worker.is_cancelled:
-                return
-
-            info = Mp3FileInfo(
-                path=mp3_path,
-                filename=mp3_path.name,
-                size_bytes=mp3_path.stat().st_size,
-            )
-            collected.append(info)
+        pending: dict[asyncio.Future, list[int]] = {}
+        batch: list[int] = []
+        done_count = 0
 
-            self.app.call_from_thread(
-                self._add_row, i, info, "Measuring..."
+        # The native meter is CPU-bound Python in a fixed-size process pool;
+        # the ffmpeg-backed meters are subprocesses under the adaptive limit.
+        pool = (
+            create_executor(
+                self._executor_kind, DEFAULT_LIMIT, uses_numpy=True
             )
-
-        self._files = tuple(collected)
-
-        self.app.call_from_thread(
-            self._update_status,
-            f"Measuring loudness... 0/{len(self._files)}",
+            if meter == "native"
+            else None
         )
+        limiter = None if pool is not None else AdaptiveLimiter()
 
-        updated: list[Mp3FileInfo] = list(self._files)
-        done_count = 0
+        def handle(future: asyncio.Future) -> None:
+            nonlocal done_count
+            indices = pending.pop(future)
 
-        with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as pool:
-            future_to_index = {
-                pool.submit(measure_loudness, info.path): i
-                for i, info in enumerate(updated)
-            }
+            try:
+                results: list[LoudnessResult] = future.result()
+            except Exception:
+                results = [
+                    LoudnessResult(collected[i].path, None) for i in indices
+                ]
 
-            for future in as_completed(future_to_index):
-                if worker.is_cancelled:
-                    pool.shutdown(wait=False, cancel_futures=True)
-                    return
-
-                i = future_to_index[future]
+            for i, result in zip(indices, results):
                 done_count += 1
+                if result.lufs is None:
+                    self._update_row_loudness(i, "Error")
+                    continue
+
+                collected[i] = collected[i].with_loudness(
+                    result.lufs, result.estimated
+                )
+                self._update_row_loudness(i, collected[i].loudness_display)
 
-                try:
-                    lufs = future.result()
-                    updated[i] = updated[i].with_loudness(lufs)
-                    self.app.call_from_thread(
-                        self._update_row_loudness, i, updated[i].loudness_display
+            self._update_status(
+                f"Measuring loudness... {done_count}/{len(collected)}"
+            )
+
+        def submit(indices: list[int]) -> None:
+            paths = tuple(collected[i].path for i in indices)
+            if pool is not None:
+                # Native measurements keep their block histograms, which
+                # album mode merges later without decoding again.
+                future = asyncio.ensure_future(
+                    measure_native_segmented(
+                        pool, paths[0], default_histogram_path()
                     )
-                except Exception:
-                    self.app.call_from_thread(
-                        self._update_row_loudness, i, "Error"
+                )
+            else:
+                # Files are measured as they are found, so larger ones can
+                # only overtake others while waiting on the limiter.
+                future = asyncio.ensure_future(
+                    limiter.run(
+                        measure_files_async,
+                        meter,
+                        paths,
+                        completed=len(paths),
+                        priority=sum(collected[i].size_bytes for i in indices),
                     )
+                )
+            pending[future] = list(indices)
 
-                self.app.call_from_thread(
-                    self._update_status,
-                    f"Measuring loudness... {done_count}/{len(updated)}",
+        try:
+            # Measurement starts as soon as each file is found rather than
+            # after the whole tree has been listed.
+            async with aclosing(files):
+                async for info in files:
+                    i = len(collected)
+                    collected.append(info)
+                    if rescan:
+                        self._add_row(i, info, "Measuring...")
+                    else:
+                        self._update_row_loudness(i, "Measuring...")
+
+                    if meter == "ffmpeg" and info.size_bytes <= _BATCH_MAX_BYTES:
+                        # Keep every slot busy first; batches only build up
+                        # once files are found faster than they are measured.
+                        batch.append(i)
+                        in_flight = limiter.limit if limiter else DEFAULT_LIMIT
+                        if len(batch) >= _BATCH_SIZE or len(pending) < in_flight:
+                            submit(batch)
+                            batch.clear()
+                    else:
+                        submit([i])
+
+                    for future in [f for f in pending if f.done()]:
+                        handle(future)
+
+            if batch:
+                submit(batch)
+
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
                 )
+                for future in done:
+                    handle(future)
+        finally:
+            # Switching meters or leaving the screen cancels the worker;
+            # cancelling the measurements kills their ffmpeg processes.
+            # Native segments already running in the pool only stop with
+            # their workers.
+            if pool is not None:
+                if pending:
+                    cancel_executor(pool)
+                else:
+                    pool.shutdown(wait=False, cancel_futures=True)
+            for future in pending:
+                future.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
 
-        self._files = tuple(updated)
-        self.app.call_from_thread(self._scan_complete)
+        self._files = tuple(collected)
+        self._scan_complete()
 
     def _add_row(self, index: int, info: Mp3FileInfo, loudness: str) -> None:
         table = self.query_one("#file-table", DataTable)
@@ -225,13 +367,78 @@ class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
         self.query_one("#scan-status", Label).update(text)
 
     def _scan_complete(self) -> None:
-        self._update_status(
-            f"Found {len(self._files)} MP3 files in {self._dir_path}"
-        )
+        self._update_status(self._found_status())
         self._update_stats()
-        self.query_one("#start-btn", Button).disabled = False
+        self._set_measuring(False)
         self.query_one("#target-input", Input).focus()
 
+        refine = self.query_one("#refine-checkbox", Checkbox).value
+        if refine and any(f.loudness_estimated for f in self._files):
+            self._refine_estimates()
+
+    def _found_status(self) -> str:
+        return f"Found {len(self._files)} MP3 files in {self._dir_path}"
+
+    # Replaces quick-scan estimates with exact measurements while the user
+    # is already free to start normalizing. Shares the worker group with
+    # _scan_files, so switching meters cancels it.
+    @work(exclusive=True)
+    async def _refine_estimates(self) -> None:
+        targets = longest_first(
+            (i for i, f in enumerate(self._files) if f.loudness_estimated),
+            lambda i: self._files[i].size_bytes,
+        )
+        done_count = 0
+        self._update_status(f"Refining estimates... 0/{len(targets)}")
+
+        limiter = AdaptiveLimiter()
+        task_to_index = {
+            asyncio.ensure_future(
+                limiter.run(
+                    measure_loudness_async,
+                    self._files[i].path,
+                    priority=self._files[i].size_bytes,
+                )
+            ): i
+            for i in targets
+        }
+
+        try:
+            pending = set(task_to_index)
+            while pending:
+                finished, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in finished:
+                    i = task_to_index[task]
+                    done_count += 1
+
+                    try:
+                        lufs = task.result()
+                    except Exception:
+                        lufs = None
+
+                    if lufs is not None:
+                        files = list(self._files)
+                        files[i] = files[i].with_loudness(lufs)
+                        self._files = tuple(files)
+                        self._update_row_loudness(i, files[i].loudness_display)
+                        self._update_stats()
+
+                    self._update_status(
+                        f"Refining estimates... {done_count}/{len(targets)}"
+                    )
+        finally:
+            for task in task_to_index:
+                task.cancel()
+            await asyncio.gather(*task_to_index, return_exceptions=True)
+
+        self._update_status(self._found_status())
+
+    def _set_measuring(self, measuring: bool) -> None:
+        self.query_one("#start-btn", Button).disabled = measuring
+        self.query_one("#meter-select", Select).disabled = measuring
+
     def _update_stats(self) -> None:
         values = [
             f.loudness_lufs
@@ -243,9 +450,10 @@ class NormFileListScreen(Screen[tuple[tuple[Mp3FileInfo, ...], float] | None]):
 
         mean = statistics.mean(values)
         median = statistics.median(values)
-        self.query_one("#stats-label", Label).update(
-            f"Average: {mean:.1f} LUFS  |  Median: {median:.1f} LUFS"
-        )
+        text = f"Average: {mean:.1f} LUFS  |  Median: {median:.1f} LUFS"
+        if any(f.loudness_estimated for f in self._files):
+            text += "  (includes estimates)"
+        self.query_one("#stats-label", Label).update(text)
 
     def _show_error(self, message: str) -> None:
         self.query_one("#error-label", Label).update(message)
@@ -1,5 +1,7 @@
-import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
 
 from textual import work
 from textual.app import ComposeResult
@@ -7,12 +9,13 @@ from textual.containers import Vertical, VerticalScroll
 from textual.screen import Screen
 from textual.widgets import Button, Footer, Header, Label, ProgressBar, Static
 
-from ..audio import normalize_audio
+from ..album import plan_album_gains
+from ..audio import apply_gain_async, mp3_duration, normalize_audio_async
+from ..concurrency import AdaptiveLimiter, longest_first
+from ..histogram import default_histogram_path
+from ..metrics import RunMetrics
 from ..models import Mp3FileInfo
 
-_MAX_WORKERS = min(os.cpu_count() or 4, 8)
-
-
 class NormProgressScreen(Screen[bool]):
     CSS = """
     #progress-section {
@@ -65,11 +68,19 @@ class NormProgressScreen(Screen[bool]):
     """
 
     def __init__(
-        self, files: tuple[Mp3FileInfo, ...], target_lufs: float
+        self,
+        files: tuple[Mp3FileInfo, ...],
+        target_lufs: float,
+        mode: str = "track",
+        metrics_path: Path | None = None,
     ) -> None:
         super().__init__()
         self._files = files
         self._target_lufs = target_lufs
+        self._mode = mode
+        self._metrics = RunMetrics()
+        self._metrics_path = metrics_path
+        self._limiter = AdaptiveLimiter(on_adjust=self._on_limit_adjusted)
 
     def compose(self) -> ComposeResult:
         yield Header()
@@ -101,71 +112,149 @@ class NormProgressScreen(Screen[bool]):
         log_area.mount(label)
         label.scroll_visible()
 
-    @work(thread=True)
-    def _start_processing(self) -> None:
-        from textual.worker import get_current_worker
-
-        worker = get_current_worker()
+    @work(exclusive=True)
+    async def _start_processing(self) -> None:
+        self._metrics.start()
         success_count = 0
         error_count = 0
         done_count = 0
 
-        self.app.call_from_thread(
-            self._update_current,
-            f"Normalizing {len(self._files)} files ({_MAX_WORKERS} threads)...",
+        self._update_current(
+            f"Normalizing {len(self._files)} files "
+            f"({self._limiter.limit} in flight)...",
         )
 
-        with ThreadPoolExecutor(max_workers=_MAX_WORKERS) as pool:
-            future_to_file = {
-                pool.submit(
-                    normalize_audio, file_info.path, self._target_lufs
-                ): file_info
-                for file_info in self._files
-            }
-
-            for future in as_completed(future_to_file):
-                if worker.is_cancelled:
-                    pool.shutdown(wait=False, cancel_futures=True)
-                    return
-
-                file_info = future_to_file[future]
-                done_count += 1
-
-                try:
-                    future.result()
-                    self.app.call_from_thread(
-                        self._log,
-                        f"  Done: {file_info.filename}",
-                        "log-success",
-                    )
-                    success_count += 1
-                except Exception as e:
-                    self.app.call_from_thread(
-                        self._log,
-                        f"  Error: {file_info.filename} - {e}",
-                        "log-error",
-                    )
-                    error_count += 1
+        jobs = longest_first(
+            await self._plan_jobs(), lambda job: job[0].size_bytes
+        )
+        skipped = len(self._files) - len(jobs)
+        if skipped:
+            self._log(
+                f"  Skipping {skipped} files without a loudness measurement",
+                "log-error",
+            )
+            self._advance_progress(skipped)
+            error_count += skipped
+            done_count += skipped
+
+        # One task per file; they wait on the limiter, not on pool threads.
+        submitted = time.perf_counter()
+        task_to_file = {
+            asyncio.create_task(
+                self._run_job(file_info, func, args, submitted)
+            ): file_info
+            for file_info, func, args in jobs
+        }
 
-                self.app.call_from_thread(self._advance_progress)
-                self.app.call_from_thread(
-                    self._update_current,
-                    f"Normalizing... {done_count}/{len(self._files)}",
+        try:
+            pending = set(task_to_file)
+            while pending:
+                finished, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
                 )
+                for task in finished:
+                    file_info = task_to_file[task]
+                    done_count += 1
+
+                    try:
+                        task.result()
+                        self._log(f"  Done: {file_info.filename}", "log-success")
+                        success_count += 1
+                    except Exception as e:
+                        self._log(
+                            f"  Error: {file_info.filename} - {e}", "log-error"
+                        )
+                        error_count += 1
+
+                    self._advance_progress()
+                    self._update_current(
+                        f"Normalizing... {done_count}/{len(self._files)} "
+                        f"({self._limiter.limit} in flight)",
+                    )
+        finally:
+            # Leaving the screen cancels the worker; cancelling the jobs
+            # kills their ffmpeg processes and removes the temp files.
+            for task in task_to_file:
+                task.cancel()
+            await asyncio.gather(*task_to_file, return_exceptions=True)
+
+        self._metrics.finish()
+        if self._metrics_path is not None:
+            try:
+                self._metrics.write(self._metrics_path)
+            except OSError as e:
+                self._log(f"Could not write metrics: {e}", "log-error")
 
         summary = f"Complete! {success_count} succeeded"
         if error_count > 0:
             summary += f", {error_count} failed"
-        self.app.call_from_thread(self._finish, summary)
+        self._finish(summary)
+
+    async def _run_job(
+        self,
+        file_info: Mp3FileInfo,
+        func: Callable[..., Awaitable[Path]],
+        args: tuple,
+        submitted: float,
+    ) -> None:
+        async with self._limiter.slot(priority=file_info.size_bytes):
+            self._metrics.record(
+                "queue_wait",
+                file_info.filename,
+                time.perf_counter() - submitted,
+            )
+            await func(*args, metrics=self._metrics)
+        duration = await asyncio.to_thread(mp3_duration, file_info.path)
+        self._metrics.track_done(duration)
+
+    def _on_limit_adjusted(self, limit: int, rate: float) -> None:
+        self._log(f"  Concurrency set to {limit} ({rate * 60:.1f} tracks/min)")
+
+    async def _plan_jobs(
+        self,
+    ) -> list[tuple[Mp3FileInfo, Callable[..., Awaitable[Path]], tuple]]:
+        if self._mode == "track":
+            return [
+                (
+                    file_info,
+                    normalize_audio_async,
+                    (file_info.path, self._target_lufs),
+                )
+                for file_info in self._files
+            ]
+
+        # Album mode: one linear gain per album, so relative levels between
+        # tracks are kept and no per-file loudnorm analysis is needed. The
+        # grouping reads tags and durations from disk, so it runs off-loop.
+        albums = await asyncio.to_thread(
+            plan_album_gains,
+            self._files,
+            self._target_lufs,
+            self._mode,
+            default_histogram_path(),
+        )
+        jobs = []
+        for album in albums:
+            self._log(
+                f"Album {album.name}: {len(album.tracks)} tracks at "
+                f"{album.loudness_lufs:.1f} LUFS, gain {album.gain_db:+.1f} dB",
+            )
+            jobs += [
+                (file_info, apply_gain_async, (file_info.path, album.gain_db))
+                for file_info in album.tracks
+            ]
+        return jobs
 
     def _update_current(self, text: str) -> None:
         self.query_one("#current-label", Label).update(text)
 
-    def _advance_progress(self) -> None:
-        self.query_one("#overall-progress", ProgressBar).advance(1)
+    def _advance_progress(self, count: int = 1) -> None:
+        self.query_one("#overall-progress", ProgressBar).advance(count)
 
     def _finish(self, summary: str) -> None:
         self.query_one("#current-label", Label).update("Complete!")
         self.query_one("#overall-label", Label).update(summary)
         self.query_one("#done-btn", Button).disabled = False
+        for line in self._metrics.summary_lines():
+            self._log(line)
         self._log("All done!", "log-success")
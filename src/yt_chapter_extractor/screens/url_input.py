@@ -1,3 +1,4 @@
+import asyncio
 import re
 
 from textual import work
@@ -6,13 +7,23 @@ from textual.containers import Center, Vertical
 from textual.screen import Screen
 from textual.widgets import Button, Footer, Header, Input, Label, LoadingIndicator
 
+from ..metrics import RunMetrics, timed
 from ..models import PlaylistInfo, VideoInfo
-from ..youtube import extract_playlist_info, extract_video_info, is_playlist_url
+from ..sources import MediaSource, YtDlpSource
+from ..youtube import extract_playlist_id, extract_video_id, is_playlist_url
 
 _YOUTUBE_URL_PATTERN = re.compile(
     r"^(https?://)?(www\.)?"
     r"(youtube\.com/(watch\?[\w&=-]+|playlist\?[\w&=-]+)|youtu\.be/[\w-]+)"
 )
+_PREFETCH_DELAY_SECONDS = 0.4
+
+
+# Marks the error of a lookup nobody awaited as retrieved, so asyncio does
+# not log it when the future is collected.
+def _retrieve_error(future: asyncio.Future) -> None:
+    if not future.cancelled():
+        future.exception()
 
 
 class UrlInputScreen(Screen[VideoInfo | PlaylistInfo | None]):
@@ -55,6 +66,16 @@ class UrlInputScreen(Screen[VideoInfo | PlaylistInfo | None]):
         ("escape", "quit", "Quit"),
     ]
 
+    def __init__(
+        self,
+        source: MediaSource | None = None,
+        metrics: RunMetrics | None = None,
+    ) -> None:
+        super().__init__()
+        self._source = source or YtDlpSource()
+        self._metrics = metrics
+        self._lookup: tuple[str, asyncio.Future] | None = None
+
     def compose(self) -> ComposeResult:
         yield Header()
         with Center():
@@ -73,6 +94,17 @@ class UrlInputScreen(Screen[VideoInfo | PlaylistInfo | None]):
         self.query_one("#loading", LoadingIndicator).display = False
         self.query_one("#url-input", Input).focus()
 
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if event.input.id != "url-input":
+            return
+        url = event.value.strip()
+        if self._lookup is not None and self._lookup[0] != url:
+            # Stale: a lookup that has not started yet is dropped, and the
+            # result of a running one is ignored.
+            self._lookup[1].cancel()
+            self._lookup = None
+        self._prefetch_info(url)
+
     def on_input_submitted(self, event: Input.Submitted) -> None:
         if event.input.id == "url-input":
             self._load_video()
@@ -91,27 +123,55 @@ class UrlInputScreen(Screen[VideoInfo | PlaylistInfo | None]):
             return
         self._fetch_info(url)
 
-    @work(exclusive=True, thread=True)
-    def _fetch_info(self, url: str) -> None:
-        from textual.worker import get_current_worker
-
-        worker = get_current_worker()
+    # Starts the lookup once the input has been still for a moment, so a
+    # pasted URL is usually resolved by the time Load is pressed. Every
+    # keystroke restarts the wait.
+    @work(exclusive=True, group="prefetch")
+    async def _prefetch_info(self, url: str) -> None:
+        await asyncio.sleep(_PREFETCH_DELAY_SECONDS)
+        if not _YOUTUBE_URL_PATTERN.match(url):
+            return
+        if extract_video_id(url) is None and extract_playlist_id(url) is None:
+            return
+        self._lookup_for(url)
 
-        self.app.call_from_thread(self._set_loading, True)
+    @work(exclusive=True)
+    async def _fetch_info(self, url: str) -> None:
+        self._set_loading(True)
 
         try:
-            if is_playlist_url(url):
-                result = extract_playlist_info(url)
-            else:
-                result = extract_video_info(url)
-            if not worker.is_cancelled:
-                self.app.call_from_thread(self.dismiss, result)
+            with timed(self._metrics, "metadata", url):
+                # Shielded: the lookup outlives this worker and can be
+                # reused if Load is pressed again.
+                result = await asyncio.shield(self._lookup_for(url))
         except Exception as e:
-            if not worker.is_cancelled:
-                self.app.call_from_thread(self._show_error, str(e))
-        finally:
-            if not worker.is_cancelled:
-                self.app.call_from_thread(self._set_loading, False)
+            self._show_error(str(e))
+            self._set_loading(False)
+            return
+
+        self._set_loading(False)
+        self.dismiss(result)
+
+    def _lookup_for(self, url: str) -> asyncio.Future:
+        if self._lookup is not None:
+            lookup_url, future = self._lookup
+            failed = future.done() and (
+                future.cancelled() or future.exception() is not None
+            )
+            if lookup_url == url and not failed:
+                return future
+
+        future = asyncio.get_running_loop().run_in_executor(
+            None, self._extract_info, url
+        )
+        future.add_done_callback(_retrieve_error)
+        self._lookup = (url, future)
+        return future
+
+    def _extract_info(self, url: str) -> VideoInfo | PlaylistInfo:
+        if is_playlist_url(url):
+            return self._source.extract_playlist_info(url)
+        return self._source.extract_video_info(url)
 
     def _set_loading(self, loading: bool) -> None:
         self.query_one("#loading", LoadingIndicator).display = loading
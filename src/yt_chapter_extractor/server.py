@@ -0,0 +1,334 @@
+import argparse
+import hmac
+import ipaddress
+import json
+import os
+import re
+import secrets
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from .cache import cached_source
+from .concurrency import DEFAULT_LIMIT
+from .jobs import (
+    FINISHED_STATES,
+    JobRunner,
+    JobStore,
+    WorkerPool,
+    default_db_path,
+    parse_priority,
+    validate_payload,
+)
+from .sources import parse_source
+from .staging import StagingArea, parse_size
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+_MAX_BODY_BYTES = 16 * 1024 * 1024
+_JOB_PATH = re.compile(r"^/jobs/(\d+)(/cancel)?$")
+_STATES = ("queued", "running") + FINISHED_STATES
+
+
+# The secret clients send as "Authorization: Bearer <token>". It sits next
+# to the job database in a file only its owner can read, so other local
+# users and web pages cannot submit or cancel jobs.
+def token_path(db_path: Path) -> Path:
+    return db_path.with_suffix(".token")
+
+
+def read_token(path: Path) -> str:
+    token = path.read_text(encoding="utf-8").strip()
+    if not token:
+        raise ValueError(f"Token file {path} is empty")
+    return token
+
+
+def ensure_token(path: Path) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        os.chmod(path, 0o600)
+        return read_token(path)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(secrets.token_urlsafe(32) + "\n")
+    return read_token(path)
+
+
+class _HttpError(Exception):
+    def __init__(self, status: HTTPStatus, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+# The API, all JSON:
+#
+#   POST /jobs               {"kind", "payload", "priority"} -> 201 job
+#   GET  /jobs[?state=...]   -> {"jobs": [...]}, newest first
+#   GET  /jobs/<id>          -> job
+#   POST /jobs/<id>/cancel   -> job
+#
+# Every request needs the server's token. Requests from browsers (with an
+# Origin header) or for another host name (DNS rebinding) are refused.
+# Errors come back as {"error": message} with a 4xx or 500 status.
+class JobRequestHandler(BaseHTTPRequestHandler):
+    server: "JobServer"
+
+    def do_GET(self) -> None:
+        self._handle(self._get)
+
+    def do_POST(self) -> None:
+        self._handle(self._post)
+
+    def log_message(self, format: str, *args) -> None:
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _handle(self, method) -> None:
+        try:
+            self._check_client()
+            status, body = method(urlsplit(self.path))
+        except _HttpError as e:
+            status, body = e.status, {"error": str(e)}
+        except ValueError as e:
+            status, body = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            # A bug in one request still gets an answer, and the server
+            # keeps serving the others.
+            self.log_error(
+                "Error handling %s %s: %r", self.command, self.path, e
+            )
+            status = HTTPStatus.INTERNAL_SERVER_ERROR
+            body = {"error": f"Internal server error: {e}"}
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _check_client(self) -> None:
+        if "Origin" in self.headers:
+            raise _HttpError(
+                HTTPStatus.FORBIDDEN, "Cross-origin requests are not allowed"
+            )
+        if not self.server.allows_host(self.headers.get("Host")):
+            raise _HttpError(HTTPStatus.FORBIDDEN, "Unexpected Host header")
+        sent = self.headers.get("Authorization", "").encode()
+        expected = f"Bearer {self.server.token}".encode()
+        if not hmac.compare_digest(sent, expected):
+            raise _HttpError(HTTPStatus.UNAUTHORIZED, "Missing or wrong token")
+
+    def _get(self, url) -> tuple[HTTPStatus, dict]:
+        store = self.server.store
+        if url.path == "/jobs":
+            state = parse_qs(url.query).get("state", [None])[0]
+            if state is not None and state not in _STATES:
+                raise ValueError(f"Unknown state: {state!r}")
+            jobs = store.list(state)
+            return HTTPStatus.OK, {"jobs": [job.to_dict() for job in jobs]}
+
+        job_id = self._job_id(url, cancel=False)
+        job = store.get(job_id)
+        if job is None:
+            raise _HttpError(HTTPStatus.NOT_FOUND, f"No job {job_id}")
+        return HTTPStatus.OK, job.to_dict()
+
+    def _post(self, url) -> tuple[HTTPStatus, dict]:
+        # Forms can only send text/plain and form types, so this keeps
+        # browsers from posting without a preflight.
+        if self.headers.get_content_type() != "application/json":
+            raise _HttpError(
+                HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                "Content-Type must be application/json",
+            )
+        store = self.server.store
+        if url.path == "/jobs":
+            body = self._read_json()
+            kind = body.get("kind")
+            payload = body.get("payload")
+            priority = parse_priority(body.get("priority", "normal"))
+            validate_payload(kind, payload)
+            job = store.submit(kind, payload, priority)
+            return HTTPStatus.CREATED, job.to_dict()
+
+        job_id = self._job_id(url, cancel=True)
+        job = store.cancel(job_id)
+        if job is None:
+            raise _HttpError(HTTPStatus.NOT_FOUND, f"No job {job_id}")
+        return HTTPStatus.OK, job.to_dict()
+
+    def _job_id(self, url, cancel: bool) -> int:
+        match = _JOB_PATH.match(url.path)
+        if match is None or bool(match.group(2)) != cancel:
+            raise _HttpError(HTTPStatus.NOT_FOUND, f"No such path: {url.path}")
+        return int(match.group(1))
+
+    def _read_json(self) -> dict:
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise ValueError("Invalid Content-Length")
+        if length > _MAX_BODY_BYTES:
+            raise _HttpError(
+                HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large"
+            )
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON: {e}") from None
+        if not isinstance(body, dict):
+            raise ValueError("Request body must be a JSON object")
+        return body
+
+
+class JobServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        store: JobStore,
+        token: str,
+        quiet: bool = False,
+    ) -> None:
+        super().__init__(address, JobRequestHandler)
+        self.store = store
+        self.token = token
+        self.quiet = quiet
+
+    # The Host header must name the bound address (or localhost for a
+    # loopback one). A server on all interfaces takes any name.
+    def allows_host(self, host: str | None) -> bool:
+        bound, port = self.server_address[:2]
+        if host is None:
+            return False
+        address = ipaddress.ip_address(bound)
+        if address.is_unspecified:
+            return True
+        names = {bound, "localhost"} if address.is_loopback else {bound}
+        return host in {f"{name}:{port}" for name in names} or (
+            port == 80 and host in names
+        )
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="yt-chapter-extractor-server")
+    parser.add_argument(
+        "--host",
+        default=DEFAULT_HOST,
+        help=f"address to listen on (default: {DEFAULT_HOST})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_PORT,
+        help=f"port to listen on; 0 picks a free one (default: {DEFAULT_PORT})",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help=(
+            "SQLite file holding the job queue "
+            "(default: ~/.local/state/yt-chapter-extractor/jobs.db)"
+        ),
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_LIMIT,
+        help=f"jobs run at once (default: {DEFAULT_LIMIT})",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=Path,
+        default=Path.cwd() / "output",
+        help="where extracted tracks go unless a job says otherwise",
+    )
+    parser.add_argument(
+        "--source",
+        default="youtube",
+        help="'youtube' (default), a local directory, or an http(s) mirror",
+    )
+    parser.add_argument(
+        "--staging-dir",
+        type=Path,
+        default=None,
+        help="directory for downloaded sources (default: system temp dir)",
+    )
+    parser.add_argument(
+        "--staging-budget",
+        default=None,
+        help="max bytes of sources staged at once, e.g. 2G (default: unlimited)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=None,
+        help="directory for downloaded sources kept between runs",
+    )
+    parser.add_argument(
+        "--cache-size",
+        default="4G",
+        help="max bytes of cached sources, e.g. 10G; 0 disables the cache",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="do not log each request"
+    )
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        source = parse_source(args.source)
+        budget = (
+            parse_size(args.staging_budget)
+            if args.staging_budget is not None
+            else None
+        )
+        cache_size = parse_size(args.cache_size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    db_path = args.db or default_db_path()
+    try:
+        token = ensure_token(token_path(db_path))
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    source = cached_source(source, args.source, args.cache_dir, cache_size)
+    store = JobStore(db_path)
+    runner = JobRunner(
+        source, StagingArea(args.staging_dir, budget), args.output_dir
+    )
+    pool = WorkerPool(store, runner, args.workers)
+    server = JobServer(
+        (args.host, args.port), store, token, quiet=args.quiet
+    )
+
+    pool.start()
+    print(f"Serving jobs on {server.url} with {args.workers} workers", flush=True)
+    print(f"Clients authenticate with the token in {token_path(db_path)}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.stop(timeout=5.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,496 @@
+import argparse
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from .audio import measure_loudness, normalize_audio
+from .concurrency import DEFAULT_LIMIT
+from .models import Mp3FileInfo
+from .processes import terminate_all
+from .scan import scan_mp3_files
+
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+DB_NAME = ".ytce-shard.db"
+
+# Files already this close to the target are left alone. A node that died
+# after replacing a file but before recording it finds the file on target
+# when the lease expires, so the re-encode is not repeated.
+_ON_TARGET_LU = 0.5
+_BUSY_TIMEOUT_SECONDS = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    loudness_lufs REAL,
+    error TEXT,
+    finished REAL,
+    dirty INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# claim() takes the largest pending file and the largest lapsed lease, so
+# neither has to scan a library of mostly finished files.
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS files_state_size ON files (state, size)",
+    "CREATE INDEX IF NOT EXISTS files_state_lease "
+    "ON files (state, lease_expires)",
+)
+
+
+@dataclass(frozen=True)
+class Lease:
+    path: str
+    attempts: int
+
+
+def default_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# The shared record of which files are pending, leased, done or failed,
+# keyed by path relative to the library root so nodes may mount it in
+# different places. A lease lapses unless its owner renews it, which is
+# how the files of a crashed node go back to the others. A file that keeps
+# failing (or keeps killing its node) is given up after max_attempts.
+#
+# Every write runs in an IMMEDIATE transaction, so claims from different
+# processes are serialized by SQLite's file lock. The file system holding
+# the table must support POSIX locks (local disks, NFSv4, SMB).
+class LeaseTable:
+    def __init__(
+        self,
+        path: Path,
+        owner: str | None = None,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ) -> None:
+        self.owner = owner or default_owner()
+        self._lease = lease_seconds
+        self._max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            str(path),
+            timeout=_BUSY_TIMEOUT_SECONDS,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        with self._transaction():
+            self._conn.execute(_SCHEMA)
+            columns = {
+                row[1]
+                for row in self._conn.execute("PRAGMA table_info(files)")
+            }
+            if "dirty" not in columns:
+                self._conn.execute(
+                    "ALTER TABLE files ADD COLUMN "
+                    "dirty INTEGER NOT NULL DEFAULT 0"
+                )
+            for index in _INDEXES:
+                self._conn.execute(index)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # Adds files seen for the first time. A finished file whose size or
+    # mtime changed since is queued again. A leased one is marked dirty with
+    # the size and mtime seen, and complete() queues it again unless those
+    # came from the node's own re-encode.
+    def sync(self, files: Iterable[tuple[str, int, int]]) -> int:
+        files = list(files)
+        with self._transaction():
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT INTO files (path, size, mtime_ns) VALUES (?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET state = 'pending', "
+                "size = excluded.size, mtime_ns = excluded.mtime_ns, "
+                "attempts = 0, error = NULL, finished = NULL "
+                "WHERE files.state IN ('done', 'failed') "
+                "AND (files.size != excluded.size "
+                "OR files.mtime_ns != excluded.mtime_ns)",
+                files,
+            )
+            self._conn.executemany(
+                "UPDATE files SET dirty = 1, size = ?, mtime_ns = ? "
+                "WHERE path = ? AND state = 'leased' "
+                "AND (size != ? OR mtime_ns != ?)",
+                (
+                    (size, mtime_ns, path, size, mtime_ns)
+                    for path, size, mtime_ns in files
+                ),
+            )
+            return self._conn.total_changes - before
+
+    def claim(self) -> Lease | None:
+        now = time.time()
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE files SET state = 'failed', owner = NULL, "
+                "error = 'Gave up after ' || attempts || ' attempts', "
+                "finished = ? WHERE state = 'leased' AND lease_expires < ? "
+                "AND attempts >= ?",
+                (now, now, self._max_attempts),
+            )
+            row = self._conn.execute(
+                "SELECT path, attempts FROM ("
+                "SELECT * FROM (SELECT path, attempts, size FROM files "
+                "WHERE state = 'pending' ORDER BY size DESC LIMIT 1) "
+                "UNION ALL "
+                "SELECT * FROM (SELECT path, attempts, size FROM files "
+                "WHERE state = 'leased' AND lease_expires < ? "
+                "ORDER BY size DESC LIMIT 1)"
+                ") ORDER BY size DESC LIMIT 1",
+                (now,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE files SET state = 'leased', owner = ?, dirty = 0, "
+                "lease_expires = ?, attempts = attempts + 1 WHERE path = ?",
+                (self.owner, now + self._lease, row[0]),
+            )
+        return Lease(path=row[0], attempts=row[1] + 1)
+
+    def renew(self, paths: Iterable[str]) -> None:
+        expires = time.time() + self._lease
+        with self._transaction():
+            self._conn.executemany(
+                "UPDATE files SET lease_expires = ? "
+                "WHERE path = ? AND owner = ? AND state = 'leased'",
+                ((expires, path, self.owner) for path in paths),
+            )
+
+    # Returns False if the lease was lost in the meantime, in which case
+    # another node has the file and this result is dropped. A file seen
+    # changing while leased goes back to pending instead of done, unless
+    # what was seen is this result (size and mtime_ns after the re-encode).
+    def complete(
+        self, path: str, loudness_lufs: float, size: int, mtime_ns: int
+    ) -> bool:
+        with self._transaction():
+            cursor = self._conn.execute(
+                "UPDATE files SET state = 'done', owner = NULL, dirty = 0, "
+                "loudness_lufs = ?, size = ?, mtime_ns = ?, error = NULL, "
+                "finished = ? WHERE path = ? AND owner = ? "
+                "AND state = 'leased' "
+                "AND NOT (dirty AND (size != ? OR mtime_ns != ?))",
+                (
+                    loudness_lufs,
+                    size,
+                    mtime_ns,
+                    time.time(),
+                    path,
+                    self.owner,
+                    size,
+                    mtime_ns,
+                ),
+            )
+            if cursor.rowcount == 1:
+                return True
+            cursor = self._conn.execute(
+                "UPDATE files SET state = 'pending', owner = NULL, "
+                "attempts = 0, dirty = 0, error = NULL "
+                "WHERE path = ? AND owner = ? AND state = 'leased'",
+                (path, self.owner),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, path: str, error: str) -> None:
+        with self._transaction():
+            self._conn.execute(
+                "UPDATE files SET owner = NULL, error = ?, "
+                "state = CASE WHEN attempts >= ? THEN 'failed' "
+                "ELSE 'pending' END, "
+                "finished = CASE WHEN attempts >= ? THEN ? END "
+                "WHERE path = ? AND owner = ? AND state = 'leased'",
+                (
+                    error,
+                    self._max_attempts,
+                    self._max_attempts,
+                    time.time(),
+                    path,
+                    self.owner,
+                ),
+            )
+
+    def has_leases(self) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM files WHERE state = 'leased' LIMIT 1"
+            ).fetchone()
+        return row is not None
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM files GROUP BY state"
+            ).fetchall()
+        return dict(rows)
+
+    @contextmanager
+    def _transaction(self) -> Iterator[None]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+
+def _stat_files(files: Iterable[Mp3FileInfo]):
+    for info in files:
+        try:
+            st = info.path.stat()
+        except OSError:
+            continue
+        yield info.filename, st.st_size, st.st_mtime_ns
+
+
+# One node: threads claim files one at a time, and a heartbeat renews the
+# leases of files in progress. Once nothing is claimable the node waits
+# while other nodes still hold leases, in case one of them dies. With
+# follow set it keeps waiting for files added later and woken with wake().
+class ShardWorker:
+    def __init__(
+        self,
+        root: Path,
+        table: LeaseTable,
+        target_lufs: float,
+        workers: int = DEFAULT_LIMIT,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        follow: bool = False,
+        log=print,
+    ) -> None:
+        self._root = root
+        self._table = table
+        self._target = target_lufs
+        self._workers = workers
+        self._renew_every = lease_seconds / 3
+        self._follow = follow
+        self._log = log
+        self._active: set[str] = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._generation = 0
+        self._stopped = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+
+    def run(self) -> None:
+        self.start()
+        try:
+            self.join()
+        finally:
+            self.stop()
+
+    def start(self) -> None:
+        threading.Thread(
+            target=self._heartbeat,
+            name="shard-heartbeat",
+            daemon=True,
+        ).start()
+        self._threads = [
+            threading.Thread(target=self._work, name=f"shard-{i}")
+            for i in range(self._workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def join(self) -> None:
+        for thread in self._threads:
+            thread.join()
+
+    def wake(self) -> None:
+        with self._wakeup:
+            self._generation += 1
+            self._wakeup.notify_all()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.wake()
+
+    def _heartbeat(self) -> None:
+        while not self._stopped.wait(self._renew_every):
+            with self._lock:
+                paths = list(self._active)
+            if paths:
+                self._table.renew(paths)
+
+    def _work(self) -> None:
+        while not self._stopped.is_set():
+            generation = self._generation
+            lease = self._table.claim()
+            if lease is None:
+                if not self._follow and not self._table.has_leases():
+                    return
+                with self._wakeup:
+                    self._wakeup.wait_for(
+                        lambda: self._generation != generation,
+                        self._renew_every,
+                    )
+                continue
+            with self._lock:
+                self._active.add(lease.path)
+            try:
+                self._process(lease)
+            finally:
+                with self._lock:
+                    self._active.discard(lease.path)
+
+    def _process(self, lease: Lease) -> None:
+        path = self._root / lease.path
+        try:
+            loudness = measure_loudness(path)
+            normalize = abs(loudness - self._target) > _ON_TARGET_LU
+            if normalize:
+                normalize_audio(path, self._target)
+            st = path.stat()
+        except Exception as e:
+            if self._stopped.is_set():
+                return
+            with self._lock:
+                self.failed += 1
+            self._table.fail(lease.path, str(e))
+            self._log(f"Error: {lease.path} - {e}")
+            return
+
+        if not self._table.complete(
+            lease.path, loudness, st.st_size, st.st_mtime_ns
+        ):
+            self._log(f"Lease lost: {lease.path}")
+            return
+
+        with self._lock:
+            if normalize:
+                self.done += 1
+            else:
+                self.skipped += 1
+        if normalize:
+            self._log(
+                f"Done: {lease.path} ({loudness:.1f} -> {self._target:.1f} LUFS)"
+            )
+        else:
+            self._log(f"Done: {lease.path} ({loudness:.1f} LUFS, on target)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="yt-chapter-extractor-shard",
+        description=(
+            "Normalize a library together with other nodes. Run the same "
+            "command on every node that mounts the library."
+        ),
+    )
+    parser.add_argument("root", type=Path, help="library directory")
+    parser.add_argument(
+        "--target-lufs",
+        type=float,
+        default=-16.0,
+        help="target integrated loudness (default: -16.0)",
+    )
+    parser.add_argument(
+        "--recursive", action="store_true", help="include subdirectories"
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=None,
+        help=f"shared lease table (default: ROOT/{DB_NAME})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_LIMIT,
+        help=f"files processed at once on this node (default: {DEFAULT_LIMIT})",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        type=float,
+        default=DEFAULT_LEASE_SECONDS,
+        help=(
+            "how long a file stays claimed by a node that stopped renewing "
+            f"it (default: {DEFAULT_LEASE_SECONDS:.0f})"
+        ),
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=DEFAULT_MAX_ATTEMPTS,
+        help=f"tries per file before giving up (default: {DEFAULT_MAX_ATTEMPTS})",
+    )
+    parser.add_argument(
+        "--no-scan",
+        action="store_true",
+        help="only work on files already in the table",
+    )
+    args = parser.parse_args()
+
+    if not -70.0 <= args.target_lufs <= 0.0:
+        parser.error("--target-lufs must be between -70.0 and 0.0")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if not args.root.is_dir():
+        parser.error(f"{args.root} is not a directory")
+
+    table = LeaseTable(
+        args.db or args.root / DB_NAME,
+        lease_seconds=args.lease_seconds,
+        max_attempts=args.max_attempts,
+    )
+    print(f"Node {table.owner}")
+    if not args.no_scan:
+        added = table.sync(
+            _stat_files(scan_mp3_files(args.root, args.recursive))
+        )
+        print(f"Scanned {args.root}: {added} new or changed files")
+
+    worker = ShardWorker(
+        args.root,
+        table,
+        args.target_lufs,
+        workers=args.workers,
+        lease_seconds=args.lease_seconds,
+        log=lambda line: print(line, flush=True),
+    )
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        # Leases of unfinished files lapse and other nodes pick them up.
+        worker.stop()
+        terminate_all()
+        worker.join()
+    finally:
+        counts = table.counts()
+        table.close()
+
+    print(
+        f"This node: {worker.done} normalized, {worker.skipped} on target, "
+        f"{worker.failed} failed"
+    )
+    print(
+        "Library: "
+        + ", ".join(f"{n} {state}" for state, n in sorted(counts.items()))
+    )
+    if counts.get("failed"):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
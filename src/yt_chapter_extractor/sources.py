@@ -0,0 +1,251 @@
+import json
+import os
+import time
+import urllib.parse
+import urllib.request
+from collections.abc import Container
+from pathlib import Path
+from typing import Protocol
+
+from . import youtube
+from .models import PlaylistInfo, VideoInfo
+from .youtube import ProgressCallback
+
+_CHUNK_SIZE = 1024 * 1024
+_HTTP_TIMEOUT = 30
+
+
+class MediaSource(Protocol):
+    def extract_video_info(self, url: str) -> VideoInfo: ...
+
+    def extract_playlist_info(self, url: str) -> PlaylistInfo: ...
+
+    def extract_playlist_head(
+        self, url: str, known: Container[str]
+    ) -> PlaylistInfo: ...
+
+    def download_audio(
+        self,
+        url: str,
+        output_dir: Path,
+        on_progress: ProgressCallback | None = None,
+    ) -> Path: ...
+
+
+class YtDlpSource:
+    def extract_video_info(self, url: str) -> VideoInfo:
+        return youtube.extract_video_info(url)
+
+    def extract_playlist_info(self, url: str) -> PlaylistInfo:
+        return youtube.extract_playlist_info(url)
+
+    def extract_playlist_head(
+        self, url: str, known: Container[str]
+    ) -> PlaylistInfo:
+        return youtube.extract_playlist_head(url, known)
+
+    def download_audio(
+        self,
+        url: str,
+        output_dir: Path,
+        on_progress: ProgressCallback | None = None,
+    ) -> Path:
+        return youtube.download_audio(url, output_dir, on_progress)
+
+
+# Serves media laid out the way yt-dlp writes it with
+# `-o "%(id)s.%(ext)s" --write-info-json`: `<id>.info.json` next to
+# `<id>.<ext>`, plus `<playlist_id>.info.json` for playlists.
+class LocalDirectorySource:
+    def __init__(self, root: Path) -> None:
+        self._root = root
+
+    def extract_video_info(self, url: str) -> VideoInfo:
+        video_id = _require_video_id(url)
+        return youtube.video_info_from_dict(self._read_info(video_id))
+
+    def extract_playlist_info(self, url: str) -> PlaylistInfo:
+        playlist_id = _require_playlist_id(url)
+        return youtube.playlist_info_from_dict(self._read_info(playlist_id))
+
+    def extract_playlist_head(
+        self, url: str, known: Container[str]
+    ) -> PlaylistInfo:
+        return playlist_head(self.extract_playlist_info(url), known)
+
+    def download_audio(
+        self,
+        url: str,
+        output_dir: Path,
+        on_progress: ProgressCallback | None = None,
+    ) -> Path:
+        video_id = _require_video_id(url)
+        source_path = self._find_media(video_id)
+        output_path = output_dir / source_path.name
+
+        try:
+            os.link(source_path, output_path)
+        except OSError:
+            with source_path.open("rb") as src:
+                _copy_stream(
+                    src,
+                    output_path,
+                    source_path.stat().st_size,
+                    on_progress,
+                )
+            return output_path
+
+        if on_progress:
+            on_progress(100.0, "")
+        return output_path
+
+    def _read_info(self, item_id: str) -> dict:
+        info_path = self._root / f"{item_id}.info.json"
+        if not info_path.is_file():
+            raise ValueError(f"No info.json for {item_id} in {self._root}")
+        with info_path.open(encoding="utf-8") as f:
+            return json.load(f)
+
+    def _find_media(self, video_id: str) -> Path:
+        info_path = self._root / f"{video_id}.info.json"
+        if info_path.is_file():
+            with info_path.open(encoding="utf-8") as f:
+                ext = json.load(f).get("ext")
+            if ext and (self._root / f"{video_id}.{ext}").is_file():
+                return self._root / f"{video_id}.{ext}"
+
+        candidates = sorted(
+            p
+            for p in self._root.glob(f"{video_id}.*")
+            if not p.name.endswith((".info.json", ".part"))
+        )
+        if not candidates:
+            raise FileNotFoundError(
+                f"No media for {video_id} in {self._root}"
+            )
+        return candidates[0]
+
+
+# Same layout as LocalDirectorySource, served over HTTP.
+class HttpMirrorSource:
+    def __init__(self, base_url: str) -> None:
+        self._base_url = base_url.rstrip("/") + "/"
+
+    def extract_video_info(self, url: str) -> VideoInfo:
+        video_id = _require_video_id(url)
+        return youtube.video_info_from_dict(self._read_info(video_id))
+
+    def extract_playlist_info(self, url: str) -> PlaylistInfo:
+        playlist_id = _require_playlist_id(url)
+        return youtube.playlist_info_from_dict(self._read_info(playlist_id))
+
+    def extract_playlist_head(
+        self, url: str, known: Container[str]
+    ) -> PlaylistInfo:
+        return playlist_head(self.extract_playlist_info(url), known)
+
+    def download_audio(
+        self,
+        url: str,
+        output_dir: Path,
+        on_progress: ProgressCallback | None = None,
+    ) -> Path:
+        video_id = _require_video_id(url)
+        ext = self._read_info(video_id).get("ext", "webm")
+        filename = f"{video_id}.{ext}"
+        output_path = output_dir / filename
+
+        with urllib.request.urlopen(
+            self._url(filename), timeout=_HTTP_TIMEOUT
+        ) as response:
+            total = int(response.headers.get("Content-Length") or 0)
+            _copy_stream(response, output_path, total, on_progress)
+
+        return output_path
+
+    def _read_info(self, item_id: str) -> dict:
+        try:
+            with urllib.request.urlopen(
+                self._url(f"{item_id}.info.json"), timeout=_HTTP_TIMEOUT
+            ) as response:
+                return json.load(response)
+        except OSError as e:
+            raise ValueError(
+                f"Could not fetch info for {item_id} from {self._base_url}: {e}"
+            ) from e
+
+    def _url(self, filename: str) -> str:
+        return urllib.parse.urljoin(
+            self._base_url, urllib.parse.quote(filename)
+        )
+
+
+# A mirror's playlist is one file with no pages to skip, so the head is cut
+# from the full listing.
+def playlist_head(info: PlaylistInfo, known: Container[str]) -> PlaylistInfo:
+    entries = []
+    for entry in info.entries:
+        if entry.video_id in known:
+            break
+        entries.append(entry)
+    return PlaylistInfo(
+        playlist_id=info.playlist_id, title=info.title, entries=tuple(entries)
+    )
+
+
+def parse_source(spec: str) -> MediaSource:
+    if spec in ("", "youtube"):
+        return YtDlpSource()
+    if spec.startswith(("http://", "https://")):
+        return HttpMirrorSource(spec)
+
+    root = Path(spec.removeprefix("dir:")).expanduser().resolve()
+    if not root.is_dir():
+        raise ValueError(f"Source directory does not exist: {root}")
+    return LocalDirectorySource(root)
+
+
+def _require_video_id(url: str) -> str:
+    video_id = youtube.extract_video_id(url)
+    if video_id is None:
+        raise ValueError(f"Could not find a video id in: {url}")
+    return video_id
+
+
+def _require_playlist_id(url: str) -> str:
+    playlist_id = youtube.extract_playlist_id(url)
+    if playlist_id is None:
+        raise ValueError(f"Could not find a playlist id in: {url}")
+    return playlist_id
+
+
+def _copy_stream(
+    src,
+    output_path: Path,
+    total: int,
+    on_progress: ProgressCallback | None,
+) -> None:
+    started = time.monotonic()
+    copied = 0
+
+    with output_path.open("wb") as dst:
+        while chunk := src.read(_CHUNK_SIZE):
+            dst.write(chunk)
+            copied += len(chunk)
+            if on_progress:
+                elapsed = time.monotonic() - started
+                pct = (copied / total * 100) if total > 0 else 0
+                speed = _format_speed(copied / elapsed) if elapsed > 0 else ""
+                on_progress(pct, speed)
+
+    if copied == 0:
+        output_path.unlink()
+        raise FileNotFoundError(f"Source returned no data: {output_path.name}")
+
+
+def _format_speed(bytes_per_second: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if bytes_per_second < 1024:
+            return f"{bytes_per_second:.1f}{unit}/s"
+        bytes_per_second /= 1024
+    return f"{bytes_per_second:.1f}GiB/s"
@@ -0,0 +1,112 @@
+import re
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+# bestaudio is usually Opus/AAC at or below 160 kbps; estimate high so
+# admission errs on the side of leaving disk free.
+_ESTIMATE_BYTES_PER_SECOND = 256_000 // 8
+_ESTIMATE_OVERHEAD_BYTES = 1024 * 1024
+
+_SIZE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3, "T": 1024**4}
+
+
+def parse_size(text: str) -> int:
+    match = _SIZE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid size: {text!r} (expected e.g. 512M, 4G)")
+    value, unit = match.groups()
+    return int(float(value) * _SIZE_UNITS[unit.upper()])
+
+
+def estimate_source_bytes(duration_seconds: float) -> int:
+    return (
+        int(max(duration_seconds, 0.0) * _ESTIMATE_BYTES_PER_SECOND)
+        + _ESTIMATE_OVERHEAD_BYTES
+    )
+
+
+class StagedSource:
+    def __init__(self, area: "StagingArea", path: Path, reserved: int) -> None:
+        self._area = area
+        self.path = path
+        self.source_path: Path | None = None
+        self.reserved = reserved
+        self._released = False
+
+    def record_source(self, source_path: Path) -> None:
+        self.source_path = source_path
+        self._area._resize(self, source_path.stat().st_size)
+
+    def release(self) -> None:
+        self._area._release(self)
+
+    def __enter__(self) -> "StagedSource":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+# Hands out per-source scratch directories under one root (e.g. a tmpfs)
+# and blocks new reservations while the byte budget is exhausted. A
+# reservation larger than the whole budget is still admitted once nothing
+# else is staged, so a single oversized source cannot stall a run.
+class StagingArea:
+    def __init__(
+        self,
+        root: Path | None = None,
+        budget_bytes: int | None = None,
+    ) -> None:
+        self._root = root
+        self._budget = budget_bytes
+        self._used = 0
+        self._cond = threading.Condition()
+
+    @property
+    def used_bytes(self) -> int:
+        with self._cond:
+            return self._used
+
+    def acquire(self, estimated_bytes: int) -> StagedSource:
+        with self._cond:
+            if self._budget is not None:
+                self._cond.wait_for(
+                    lambda: self._used == 0
+                    or self._used + estimated_bytes <= self._budget
+                )
+            self._used += estimated_bytes
+
+        try:
+            if self._root is not None:
+                self._root.mkdir(parents=True, exist_ok=True)
+            path = Path(tempfile.mkdtemp(prefix="ytce-", dir=self._root))
+        except Exception:
+            with self._cond:
+                self._used -= estimated_bytes
+                self._cond.notify_all()
+            raise
+
+        return StagedSource(self, path, estimated_bytes)
+
+    def _resize(self, staged: StagedSource, actual_bytes: int) -> None:
+        with self._cond:
+            if staged._released:
+                return
+            self._used += actual_bytes - staged.reserved
+            staged.reserved = actual_bytes
+            self._cond.notify_all()
+
+    def _release(self, staged: StagedSource) -> None:
+        with self._cond:
+            if staged._released:
+                return
+            staged._released = True
+
+        shutil.rmtree(staged.path, ignore_errors=True)
+
+        with self._cond:
+            self._used -= staged.reserved
+            self._cond.notify_all()
@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+from collections.abc import Container
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from .manifest import ManifestJob, playlist_tasks
+from .models import DownloadTask, PlaylistEntry, PlaylistInfo
+from .sources import MediaSource, parse_source
+from .youtube import extract_playlist_id
+
+# Playlist lookups only wait on the network.
+_MAX_SYNCS = 8
+
+
+def default_registry_path() -> Path:
+    base = os.environ.get("XDG_STATE_HOME") or Path.home() / ".local/state"
+    return Path(base) / "yt-chapter-extractor" / "subscriptions.json"
+
+
+@dataclass(frozen=True)
+class Subscription:
+    playlist_id: str
+    title: str
+    # New videos are added at the top, so a sync can stop at the first
+    # video it has seen before. Other playlists are listed in full.
+    newest_first: bool = False
+    artist: str = ""
+    album: str = ""
+    target_lufs: float | None = None
+    known: frozenset[str] = field(default=frozenset(), repr=False)
+
+    @property
+    def url(self) -> str:
+        return f"https://www.youtube.com/playlist?list={self.playlist_id}"
+
+    def with_known(self, video_ids) -> "Subscription":
+        return Subscription(
+            playlist_id=self.playlist_id,
+            title=self.title,
+            newest_first=self.newest_first,
+            artist=self.artist,
+            album=self.album,
+            target_lufs=self.target_lufs,
+            known=self.known | frozenset(video_ids),
+        )
+
+
+@dataclass(frozen=True)
+class SyncResult:
+    subscription: Subscription
+    title: str
+    entries: tuple[PlaylistEntry, ...] = ()
+    error: str | None = None
+
+
+# The subscribed playlists and the videos already fetched from each, kept
+# in one JSON file.
+class SubscriptionRegistry:
+    def __init__(self, path: Path) -> None:
+        self._path = path
+        self._subs: dict[str, Subscription] = {}
+        if path.exists():
+            self._load()
+
+    def subscriptions(self) -> list[Subscription]:
+        return list(self._subs.values())
+
+    def get(self, playlist_id: str) -> Subscription | None:
+        return self._subs.get(playlist_id)
+
+    def add(self, sub: Subscription) -> None:
+        self._subs[sub.playlist_id] = sub
+
+    def remove(self, playlist_id: str) -> bool:
+        return self._subs.pop(playlist_id, None) is not None
+
+    # With urls, only the entries fetched from those are marked, so the
+    # rest are fetched again by the next sync.
+    def mark_known(
+        self,
+        results: list[SyncResult],
+        urls: Container[str] | None = None,
+    ) -> None:
+        for result in results:
+            sub = self._subs.get(result.subscription.playlist_id)
+            if sub is not None:
+                self._subs[sub.playlist_id] = sub.with_known(
+                    entry.video_id
+                    for entry in result.entries
+                    if urls is None or entry.url in urls
+                )
+
+    def save(self) -> None:
+        data = {
+            "subscriptions": [
+                {
+                    "playlist_id": sub.playlist_id,
+                    "title": sub.title,
+                    "newest_first": sub.newest_first,
+                    "artist": sub.artist,
+                    "album": sub.album,
+                    "target_lufs": sub.target_lufs,
+                    "known": sorted(sub.known),
+                }
+                for sub in self._subs.values()
+            ]
+        }
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(
+            prefix=".subscriptions-", dir=self._path.parent
+        )
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1)
+            os.replace(tmp, self._path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+            for raw in data["subscriptions"]:
+                sub = Subscription(
+                    playlist_id=raw["playlist_id"],
+                    title=raw.get("title", ""),
+                    newest_first=bool(raw.get("newest_first", False)),
+                    artist=raw.get("artist", ""),
+                    album=raw.get("album", ""),
+                    target_lufs=raw.get("target_lufs"),
+                    known=frozenset(raw.get("known", ())),
+                )
+                self._subs[sub.playlist_id] = sub
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"{self._path}: invalid registry ({e})") from None
+
+
+def _sync_one(sub: Subscription, source: MediaSource) -> SyncResult:
+    try:
+        if sub.newest_first:
+            info = source.extract_playlist_head(sub.url, sub.known)
+            entries = info.entries
+        else:
+            info = source.extract_playlist_info(sub.url)
+            entries = tuple(
+                entry
+                for entry in info.entries
+                if entry.video_id not in sub.known
+            )
+    except Exception as e:
+        return SyncResult(sub, sub.title, error=str(e))
+    return SyncResult(sub, info.title or sub.title, entries)
+
+
+# Checks every subscription in parallel. Nothing is recorded as known here;
+# callers mark the results once the downloads are queued or done.
+def sync_subscriptions(
+    subs: list[Subscription], source: MediaSource
+) -> list[SyncResult]:
+    if not subs:
+        return []
+    with ThreadPoolExecutor(max_workers=min(_MAX_SYNCS, len(subs))) as pool:
+        return list(pool.map(lambda sub: _sync_one(sub, source), subs))
+
+
+# The same tasks the playlist flow builds: the album defaults to the
+# playlist title.
+def subscription_tasks(results: list[SyncResult]) -> tuple[DownloadTask, ...]:
+    tasks: list[DownloadTask] = []
+    for result in results:
+        if not result.entries:
+            continue
+        sub = result.subscription
+        job = ManifestJob(
+            url=sub.url,
+            artist=sub.artist,
+            album=sub.album,
+            target_lufs=sub.target_lufs,
+        )
+        info = PlaylistInfo(sub.playlist_id, result.title, result.entries)
+        tasks += playlist_tasks(job, info)
+    return tuple(tasks)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="yt-chapter-extractor-subs")
+    parser.add_argument(
+        "--registry",
+        type=Path,
+        default=None,
+        help=(
+            "subscription file (default: "
+            "~/.local/state/yt-chapter-extractor/subscriptions.json)"
+        ),
+    )
+    parser.add_argument(
+        "--source",
+        default="youtube",
+        help="'youtube' (default), a local directory, or an http(s) mirror",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="subscribe to a playlist")
+    add.add_argument("url")
+    add.add_argument("--artist", default="")
+    add.add_argument(
+        "--album", default="", help="default: the playlist title"
+    )
+    add.add_argument("--target-lufs", type=float, default=None)
+    add.add_argument(
+        "--newest-first",
+        action="store_true",
+        help="new videos appear at the top (e.g. channel uploads)",
+    )
+    add.add_argument(
+        "--from-now",
+        action="store_true",
+        help="treat the videos already in the playlist as fetched",
+    )
+
+    remove = commands.add_parser("remove", help="unsubscribe")
+    remove.add_argument("playlist_id")
+
+    commands.add_parser("list", help="list subscriptions")
+
+    args = parser.parse_args()
+    registry = SubscriptionRegistry(args.registry or default_registry_path())
+
+    if args.command == "list":
+        for sub in registry.subscriptions():
+            order = "newest first" if sub.newest_first else "appended"
+            print(
+                f"{sub.playlist_id}  {sub.title}  "
+                f"({len(sub.known)} fetched, {order})"
+            )
+        return
+
+    if args.command == "remove":
+        if not registry.remove(args.playlist_id):
+            parser.error(f"Not subscribed to {args.playlist_id}")
+        registry.save()
+        return
+
+    playlist_id = extract_playlist_id(args.url)
+    if playlist_id is None:
+        parser.error(f"Could not find a playlist id in: {args.url}")
+    if args.target_lufs is not None and not -70.0 <= args.target_lufs <= 0.0:
+        parser.error("--target-lufs must be between -70.0 and 0.0")
+    try:
+        source = parse_source(args.source)
+        info = source.extract_playlist_info(args.url)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    registry.add(
+        Subscription(
+            playlist_id=playlist_id,
+            title=info.title,
+            newest_first=args.newest_first,
+            artist=args.artist,
+            album=args.album,
+            target_lufs=args.target_lufs,
+            known=(
+                frozenset(entry.video_id for entry in info.entries)
+                if args.from_now
+                else frozenset()
+            ),
+        )
+    )
+    registry.save()
+    print(f"Subscribed to {info.title} ({len(info.entries)} videos)")
+
+
+if __name__ == "__main__":
+    main()
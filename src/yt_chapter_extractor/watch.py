@@ -0,0 +1,377 @@
+import argparse
+import os
+import signal
+import time
+from collections.abc import Iterator
+from pathlib import Path
+
+try:
+    import inotify_simple
+except ImportError:  # pragma: no cover - optional dependency
+    inotify_simple = None
+
+from .concurrency import DEFAULT_LIMIT
+from .processes import terminate_all
+from .shard import DB_NAME, LeaseTable, ShardWorker
+
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_SECONDS = 2.0
+
+_TICK_SECONDS = 1.0
+
+
+def _is_candidate(name: str) -> bool:
+    # Dot files are the usual in-progress names (.song.mp3.part, rsync).
+    return name.lower().endswith(".mp3") and not name.startswith(".")
+
+
+def _list_dir(dir_path: Path) -> list[os.DirEntry] | None:
+    try:
+        with os.scandir(dir_path) as it:
+            return list(it)
+    except OSError:
+        return None
+
+
+def _subdirs(entries: list[os.DirEntry]) -> list[Path]:
+    return [
+        Path(entry.path)
+        for entry in entries
+        if entry.is_dir(follow_symlinks=False)
+    ]
+
+
+def _walk(
+    root: Path, recursive: bool
+) -> Iterator[tuple[Path, list[os.DirEntry]]]:
+    pending = [root]
+    while pending:
+        dir_path = pending.pop()
+        entries = _list_dir(dir_path)
+        if entries is None:
+            continue
+        yield dir_path, entries
+        if recursive:
+            pending += _subdirs(entries)
+
+
+def _mp3_stats(entries: list[os.DirEntry]) -> dict[str, tuple[int, int]]:
+    stats = {}
+    for entry in entries:
+        if not _is_candidate(entry.name):
+            continue
+        try:
+            if entry.is_file():
+                st = entry.stat()
+                stats[entry.name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            continue
+    return stats
+
+
+# Notices MP3s that appear or change by checking only the directories whose
+# mtime moved since the last poll. Creating, renaming or replacing a file
+# touches its directory, so a poll costs one stat per directory plus a
+# listing of the directories that changed. Rewriting a file in place does
+# not touch the directory and is not noticed.
+class PollingWatcher:
+    def __init__(
+        self, root: Path, recursive: bool, interval: float = DEFAULT_POLL_SECONDS
+    ) -> None:
+        self._root = root
+        self._recursive = recursive
+        self._interval = interval
+        self._dirs: dict[Path, int] = {}
+        self._files: dict[Path, dict[str, tuple[int, int]]] = {}
+        self._next_poll = 0.0
+
+    def initial(self) -> list[Path]:
+        found = []
+        for dir_path, entries in _walk(self._root, self._recursive):
+            found += self._record(dir_path, entries)
+        self._next_poll = time.monotonic() + self._interval
+        return found
+
+    def changes(self, timeout: float) -> list[Path]:
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(delay, 0.0))
+        self._next_poll = time.monotonic() + self._interval
+
+        changed = []
+        for dir_path, mtime in list(self._dirs.items()):
+            try:
+                current = dir_path.stat().st_mtime_ns
+            except OSError:
+                del self._dirs[dir_path]
+                self._files.pop(dir_path, None)
+                continue
+            entries = _list_dir(dir_path) if current != mtime else None
+            if entries is None:
+                continue
+            changed += self._record(dir_path, entries)
+            if not self._recursive:
+                continue
+            # New subdirectories are walked in full.
+            for sub in _subdirs(entries):
+                if sub not in self._dirs:
+                    for new_dir, new_entries in _walk(sub, recursive=True):
+                        changed += self._record(new_dir, new_entries)
+        return changed
+
+    def close(self) -> None:
+        pass
+
+    def _record(
+        self, dir_path: Path, entries: list[os.DirEntry]
+    ) -> list[Path]:
+        try:
+            self._dirs[dir_path] = dir_path.stat().st_mtime_ns
+        except OSError:
+            return []
+        stats = _mp3_stats(entries)
+        before = self._files.get(dir_path, {})
+        self._files[dir_path] = stats
+        return [
+            dir_path / name
+            for name, stat in stats.items()
+            if before.get(name) != stat
+        ]
+
+
+# The same interface driven by inotify: the kernel reports each written,
+# created or moved-in file, so idle directories cost nothing. Watches name
+# directories by the path they had when added, so a directory moved away
+# drops its watches, and one moved in is watched under its new path.
+class InotifyWatcher:
+    def __init__(self, root: Path, recursive: bool) -> None:
+        flags = inotify_simple.flags
+        self._flags = flags
+        self._mask = (
+            flags.CLOSE_WRITE
+            | flags.CREATE
+            | flags.MOVED_TO
+            | flags.MOVED_FROM
+            | flags.DELETE_SELF
+        )
+        self._root = root
+        self._recursive = recursive
+        self._inotify = inotify_simple.INotify()
+        self._dirs: dict[int, Path] = {}
+
+    def initial(self) -> list[Path]:
+        return self._watch_tree(self._root)
+
+    def changes(self, timeout: float) -> list[Path]:
+        flags = self._flags
+        changed = []
+        for event in self._inotify.read(timeout=int(timeout * 1000)):
+            if event.mask & flags.Q_OVERFLOW:
+                # Events were dropped; everything may have changed.
+                changed += self._watch_tree(self._root)
+                continue
+            dir_path = self._dirs.get(event.wd)
+            if dir_path is None:
+                continue
+            if event.mask & (flags.DELETE_SELF | flags.IGNORED):
+                self._dirs.pop(event.wd, None)
+                continue
+
+            path = dir_path / event.name
+            if event.mask & flags.ISDIR:
+                if event.mask & flags.MOVED_FROM:
+                    self._unwatch_tree(path)
+                elif self._recursive:
+                    changed += self._watch_tree(path)
+            elif event.mask & flags.MOVED_FROM:
+                continue
+            elif _is_candidate(event.name):
+                changed.append(path)
+        return changed
+
+    def close(self) -> None:
+        self._inotify.close()
+
+    # Watches are added before listing, so a file created in between is
+    # reported at least once.
+    def _watch_tree(self, top: Path) -> list[Path]:
+        found = []
+        pending = [top]
+        while pending:
+            dir_path = pending.pop()
+            try:
+                wd = self._inotify.add_watch(dir_path, self._mask)
+            except OSError:
+                continue
+            self._dirs[wd] = dir_path
+            entries = _list_dir(dir_path)
+            if entries is None:
+                continue
+            found += [dir_path / name for name in _mp3_stats(entries)]
+            if self._recursive:
+                pending += _subdirs(entries)
+        return found
+
+
+    def _unwatch_tree(self, top: Path) -> None:
+        for wd, dir_path in list(self._dirs.items()):
+            if dir_path == top or top in dir_path.parents:
+                del self._dirs[wd]
+                try:
+                    self._inotify.rm_watch(wd)
+                except OSError:
+                    # Already gone with its directory.
+                    pass
+
+
+def open_watcher(root: Path, recursive: bool, polling: bool = False):
+    if inotify_simple is not None and not polling:
+        try:
+            return InotifyWatcher(root, recursive)
+        except OSError:
+            # Not Linux, or out of inotify instances.
+            pass
+    return PollingWatcher(root, recursive)
+
+
+# Files seen changing are held until their size and mtime stay put for
+# settle_seconds, then handed to the lease table. Files the table already
+# has as done with the same size and mtime are left out there, so a restart
+# or our own re-encode does not queue anything again.
+class Settler:
+    def __init__(self, settle_seconds: float = DEFAULT_SETTLE_SECONDS) -> None:
+        self._settle = settle_seconds
+        self._pending: dict[Path, tuple[tuple[int, int], float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, paths: list[Path]) -> None:
+        now = time.monotonic()
+        for path in paths:
+            # A new event restarts the clock.
+            self._pending[path] = ((-1, -1), now)
+
+    def settled(self) -> list[tuple[Path, int, int]]:
+        now = time.monotonic()
+        ready = []
+        for path, (last, since) in list(self._pending.items()):
+            try:
+                st = path.stat()
+            except OSError:
+                # Deleted, or a temp file that was renamed away.
+                del self._pending[path]
+                continue
+            stat = (st.st_size, st.st_mtime_ns)
+            if stat != last:
+                self._pending[path] = (stat, now)
+            elif now - since >= self._settle:
+                del self._pending[path]
+                ready.append((path, *stat))
+        return ready
+
+
+def _interrupt(signum, frame) -> None:
+    raise KeyboardInterrupt
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="yt-chapter-extractor-watch",
+        description="Normalize MP3s as they are added to a directory.",
+    )
+    parser.add_argument("root", type=Path, help="directory to watch")
+    parser.add_argument(
+        "--target-lufs",
+        type=float,
+        default=-16.0,
+        help="target integrated loudness (default: -16.0)",
+    )
+    parser.add_argument(
+        "--recursive", action="store_true", help="include subdirectories"
+    )
+    parser.add_argument(
+        "--state",
+        type=Path,
+        default=None,
+        help=f"file recording what was processed (default: ROOT/{DB_NAME})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_LIMIT,
+        help=f"files processed at once (default: {DEFAULT_LIMIT})",
+    )
+    parser.add_argument(
+        "--settle-seconds",
+        type=float,
+        default=DEFAULT_SETTLE_SECONDS,
+        help=(
+            "how long a file must stay unchanged before it is processed "
+            f"(default: {DEFAULT_SETTLE_SECONDS:.0f})"
+        ),
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="poll directories instead of using inotify",
+    )
+    args = parser.parse_args()
+
+    if not -70.0 <= args.target_lufs <= 0.0:
+        parser.error("--target-lufs must be between -70.0 and 0.0")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if not args.root.is_dir():
+        parser.error(f"{args.root} is not a directory")
+
+    root = args.root.resolve()
+    table = LeaseTable(args.state or root / DB_NAME)
+    worker = ShardWorker(
+        root,
+        table,
+        args.target_lufs,
+        workers=args.workers,
+        follow=True,
+        log=lambda line: print(line, flush=True),
+    )
+    watcher = open_watcher(root, args.recursive, polling=args.poll)
+    settler = Settler(args.settle_seconds)
+
+    # Whatever landed while the daemon was down goes through the same
+    # settling as new files; the table skips the ones already done.
+    settler.add(watcher.initial())
+    mode = "polling" if isinstance(watcher, PollingWatcher) else "inotify"
+    print(f"Watching {root} ({mode}), {len(settler)} files to check", flush=True)
+
+    # Service managers stop daemons with SIGTERM.
+    signal.signal(signal.SIGTERM, _interrupt)
+    worker.start()
+    try:
+        while True:
+            settler.add(watcher.changes(_TICK_SECONDS))
+            ready = settler.settled()
+            if ready and table.sync(
+                (str(path.relative_to(root)), size, mtime_ns)
+                for path, size, mtime_ns in ready
+            ):
+                worker.wake()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.stop()
+        terminate_all()
+        worker.join()
+        watcher.close()
+        table.close()
+
+    print(
+        f"Stopped: {worker.done} normalized, {worker.skipped} on target, "
+        f"{worker.failed} failed"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,144 @@
+import atexit
 import re
-from collections.abc import Callable
+import threading
+from collections.abc import Callable, Container, Iterator
+from contextlib import contextmanager
 from pathlib import Path
 
 import yt_dlp
+from yt_dlp.utils import DownloadCancelled
 
 from .models import Chapter, PlaylistEntry, PlaylistInfo, VideoInfo
 
 ProgressCallback = Callable[[float, str], None]
 
+_VIDEO_ID_PATTERN = re.compile(r"(?:[?&]v=|youtu\.be/)([\w-]{11})")
+_PLAYLIST_ID_PATTERN = re.compile(r"[?&]list=([\w-]+)")
+
+DOWNLOAD_FORMAT = "bestaudio/best"
+
+# Options read when a YoutubeDL is constructed, the same for every call.
+_YDL_PARAMS: dict = {
+    "format": DOWNLOAD_FORMAT,
+    "outtmpl": "%(id)s.%(ext)s",
+    "quiet": True,
+    "no_warnings": True,
+}
+
+# Options read per call, set on a borrowed instance for one call only.
+_YDL_PROFILES: dict[str, dict] = {
+    "video": {},
+    "playlist": {
+        "extract_flat": "in_playlist",
+        "ignoreerrors": True,
+    },
+    # Entries come in as each page is fetched, so a match_filter can stop
+    # paging part way through.
+    "playlist_head": {
+        "extract_flat": "in_playlist",
+        "ignoreerrors": True,
+        "lazy_playlist": True,
+    },
+    "download": {},
+}
+
+_MAX_IDLE = 8
+
+# Progress hooks run on the thread that called extract_info, so the
+# callback for the current download is looked up per thread.
+_progress_state = threading.local()
+
+
+def _dispatch_progress(d: dict) -> None:
+    on_progress = getattr(_progress_state, "callback", None)
+    if on_progress is None or d["status"] != "downloading":
+        return
+
+    total = d.get("total_bytes") or d.get("total_bytes_estimate") or 0
+    downloaded = d.get("downloaded_bytes", 0)
+    pct = (downloaded / total * 100) if total > 0 else 0
+    speed = d.get("_speed_str", "").strip()
+    on_progress(pct, speed)
+
+
+# Constructing a YoutubeDL initializes every extractor and opens a fresh
+# HTTP session, so instances are kept and lent out to one thread at a time.
+# Any instance serves any profile: metadata lookups and downloads draw from
+# the same instances, so each reuses the connections the other opened. All
+# instances share one cookie jar.
+class YoutubeDLPool:
+    def __init__(self, max_idle: int = _MAX_IDLE) -> None:
+        self._max_idle = max_idle
+        self._lock = threading.Lock()
+        self._idle: list[yt_dlp.YoutubeDL] = []
+        self._cookiejar = None
+        self._closed = False
+
+    @contextmanager
+    def borrow(self, profile: str) -> Iterator[yt_dlp.YoutubeDL]:
+        overrides = _YDL_PROFILES[profile]
+        ydl = self._checkout()
+        saved = {key: ydl.params.get(key) for key in overrides}
+        ydl.params.update(overrides)
+        try:
+            yield ydl
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    ydl.params.pop(key, None)
+                else:
+                    ydl.params[key] = value
+            self._checkin(ydl)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+
+        for ydl in idle:
+            ydl.close()
+
+    def _checkout(self) -> yt_dlp.YoutubeDL:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+
+        ydl = yt_dlp.YoutubeDL(dict(_YDL_PARAMS))
+        ydl.add_progress_hook(_dispatch_progress)
+        with self._lock:
+            # The jar is a lazily built property; setting it before the
+            # first request makes the instance use the shared one.
+            if self._cookiejar is None:
+                self._cookiejar = ydl.cookiejar
+            else:
+                vars(ydl)["cookiejar"] = self._cookiejar
+        return ydl
+
+    def _checkin(self, ydl: yt_dlp.YoutubeDL) -> None:
+        with self._lock:
+            if not self._closed and len(self._idle) < self._max_idle:
+                self._idle.append(ydl)
+                return
+
+        ydl.close()
+
+
+_POOL = YoutubeDLPool()
+atexit.register(_POOL.close)
 
-def extract_video_info(url: str) -> VideoInfo:
-    ydl_opts = {
-        "quiet": True,
-        "no_warnings": True,
-    }
 
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+def extract_video_info(url: str) -> VideoInfo:
+    with _POOL.borrow("video") as ydl:
         info = ydl.extract_info(url, download=False)
 
     if info is None:
         raise ValueError(f"Could not extract info from: {url}")
 
+    return video_info_from_dict(info)
+
+
+def video_info_from_dict(info: dict) -> VideoInfo:
     raw_chapters = info.get("chapters") or []
 
     chapters = tuple(
@@ -46,33 +164,14 @@ def download_audio(
     output_dir: Path,
     on_progress: ProgressCallback | None = None,
 ) -> Path:
-    output_template = str(output_dir / "%(id)s.%(ext)s")
-
-    ydl_opts: dict = {
-        "format": "bestaudio/best",
-        "outtmpl": output_template,
-        "quiet": True,
-        "no_warnings": True,
-    }
-
-    if on_progress:
-
-        def hook(d: dict) -> None:
-            if d["status"] == "downloading":
-                total = (
-                    d.get("total_bytes")
-                    or d.get("total_bytes_estimate")
-                    or 0
-                )
-                downloaded = d.get("downloaded_bytes", 0)
-                pct = (downloaded / total * 100) if total > 0 else 0
-                speed = d.get("_speed_str", "").strip()
-                on_progress(pct, speed)
-
-        ydl_opts["progress_hooks"] = [hook]
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(url, download=True)
+    with _POOL.borrow("download") as ydl:
+        ydl.params["paths"] = {"home": str(output_dir)}
+        _progress_state.callback = on_progress
+        try:
+            info = ydl.extract_info(url, download=True)
+        finally:
+            _progress_state.callback = None
+            ydl.params.pop("paths", None)
 
     if info is None:
         raise ValueError(f"Failed to download audio from: {url}")
@@ -90,6 +189,16 @@ def download_audio(
     return output_path
 
 
+def extract_video_id(url: str) -> str | None:
+    match = _VIDEO_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
+def extract_playlist_id(url: str) -> str | None:
+    match = _PLAYLIST_ID_PATTERN.search(url)
+    return match.group(1) if match else None
+
+
 def is_playlist_url(url: str) -> bool:
     return bool(
         re.search(r"youtube\.com/playlist\?list=", url)
@@ -98,19 +207,62 @@ def is_playlist_url(url: str) -> bool:
 
 
 def extract_playlist_info(url: str) -> PlaylistInfo:
-    ydl_opts = {
-        "quiet": True,
-        "no_warnings": True,
-        "extract_flat": "in_playlist",
-        "ignoreerrors": True,
-    }
-
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    with _POOL.borrow("playlist") as ydl:
         info = ydl.extract_info(url, download=False)
 
     if info is None:
         raise ValueError(f"Could not extract playlist info from: {url}")
 
+    return playlist_info_from_dict(info)
+
+
+class _KnownEntryReached(DownloadCancelled):
+    msg = "Reached a playlist entry seen before"
+
+
+# The entries in front of the first known video, for playlists that add new
+# videos at the top (channel uploads, most feeds). Paging stops at the
+# known entry, so a sync with nothing new costs one page request.
+def extract_playlist_head(url: str, known: Container[str]) -> PlaylistInfo:
+    header: dict = {}
+    entries: list[PlaylistEntry] = []
+
+    def match_filter(info, incomplete=False):
+        header.setdefault("id", info.get("playlist_id"))
+        header.setdefault("title", info.get("playlist_title"))
+        if info.get("id") in known:
+            raise _KnownEntryReached()
+        if info.get("id"):
+            entries.append(
+                PlaylistEntry(
+                    video_id=info["id"],
+                    title=info.get("title") or "Unknown",
+                    duration=float(info.get("duration") or 0.0),
+                    index=int(info.get("playlist_index") or 1) - 1,
+                )
+            )
+        return None
+
+    with _POOL.borrow("playlist_head") as ydl:
+        ydl.params["match_filter"] = match_filter
+        try:
+            info = ydl.extract_info(url, download=False)
+        except _KnownEntryReached:
+            info = None
+        finally:
+            ydl.params.pop("match_filter", None)
+
+    if info is None and not header:
+        raise ValueError(f"Could not extract playlist info from: {url}")
+    info = info or {}
+    return PlaylistInfo(
+        playlist_id=header.get("id") or info.get("id", ""),
+        title=header.get("title") or info.get("title", "Unknown Playlist"),
+        entries=tuple(entries),
+    )
+
+
+def playlist_info_from_dict(info: dict) -> PlaylistInfo:
     raw_entries = info.get("entries") or []
     entries = tuple(
         PlaylistEntry(